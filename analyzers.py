@@ -0,0 +1,296 @@
+# analyzers.py
+
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "analyzers")
+TOOLS = ('mypy', 'ruff', 'bandit')
+
+
+# Diretórios de cache com um daemon do dmypy já iniciado (ou encontrado vivo) por este processo
+_mypy_daemons = set()
+_mypy_daemon_lock = threading.Lock()
+
+
+def _status_file(cache_dir):
+    return os.path.join(cache_dir, "dmypy.json")
+
+
+def _mypy_options(cache_dir):
+    # Caminhos absolutos na saída: o daemon relativiza pelo próprio diretório, não pelo de quem pergunta
+    return ["--cache-dir", os.path.join(cache_dir, "mypy"), "--show-absolute-path"]
+
+
+def _plain_mypy_command(paths, cache_dir):
+    return ["mypy", *_mypy_options(cache_dir), *paths]
+
+
+def _ensure_mypy_daemon(cache_dir):
+    """Inicia o daemon do dmypy uma única vez por cache_dir, antes de qualquer verificação.
+
+    Várias primeiras chamadas ao mesmo tempo com `dmypy run` iniciavam um daemon cada uma sobre o
+    mesmo arquivo de status, e os que sobravam ficavam órfãos. Devolve False se não houver dmypy.
+    """
+    with _mypy_daemon_lock:
+        if cache_dir in _mypy_daemons:
+            return True
+        # restart: um daemon deixado por uma execução anterior pode ter outras opções
+        command = ["dmypy", "--status-file", _status_file(cache_dir), "restart", "--", *_mypy_options(cache_dir)]
+        try:
+            started = subprocess.run(command, capture_output=True, text=True, timeout=60)
+        except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"Daemon do mypy indisponível ({e}); usando o mypy tradicional.")
+            return False
+        if started.returncode != 0:
+            logging.warning(f"Daemon do mypy não iniciou: {(started.stdout + started.stderr).strip()}")
+            return False
+        _mypy_daemons.add(cache_dir)
+        return True
+
+
+def _reset_mypy_daemon(cache_dir):
+    # Depois de um erro bloqueante o daemon guarda estado antigo (ou cai): encerra, e a próxima chamada inicia outro
+    with _mypy_daemon_lock:
+        _mypy_daemons.discard(cache_dir)
+        try:
+            subprocess.run(["dmypy", "--status-file", _status_file(cache_dir), "kill"],
+                           capture_output=True, text=True, timeout=30)
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            pass
+
+
+def _mypy_command(paths, cache_dir):
+    # dmypy mantém um daemon aquecido entre chamadas; o status e o cache ficam em cache_dir
+    if _ensure_mypy_daemon(cache_dir):
+        return ["dmypy", "--status-file", _status_file(cache_dir), "check", *paths], True
+    return _plain_mypy_command(paths, cache_dir), False
+
+
+# Threads que leem a saída de cada analisador assim que ele é disparado
+_readers = ThreadPoolExecutor(max_workers=16, thread_name_prefix="analyzer")
+
+
+def _start(command):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return process, time.perf_counter()
+
+
+def _collect(process, started, timeout):
+    try:
+        stdout, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        logging.warning(f"Analisador excedeu o tempo limite: {process.args[0]}")
+        stdout = ""
+    return stdout, time.perf_counter() - started, process.returncode
+
+
+# Linhas do mypy: "arquivo:linha[:coluna]: error: mensagem  [código]"
+_MYPY_LINE = re.compile(r"^(?P<file>.+?):\d+(?::\d+)?: (?P<severity>error|warning|note): (?P<message>.*?)(?:  \[(?P<code>[\w-]+)\])?$")
+
+
+class AnalyzerBatch:
+    """Analisadores disparados sobre um ou mais arquivos; cada ferramenta roda uma única vez para todos."""
+
+    def __init__(self, paths, processes, futures, cache_dir=DEFAULT_CACHE_DIR, timeout=60, mypy_daemon=False,
+                 syntax_errors=()):
+        self.paths = paths
+        self.syntax_errors = set(syntax_errors)  # Arquivos que não compilam: ficam fora do mypy
+        self.mypy_paths = [path for path in paths if path not in self.syntax_errors]
+        self.processes = processes
+        self.futures = futures
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.mypy_daemon = mypy_daemon  # O mypy do lote rodou no daemon (ver collect_batch)
+
+    def cancel(self):
+        """Mata os analisadores ainda em execução (por exemplo, quando o candidato foi rejeitado antes da análise)."""
+        for process, _ in self.processes.values():
+            if process.poll() is None:
+                process.kill()
+        for future in self.futures.values():
+            future.result()  # Espera as threads de leitura liberarem os pipes
+
+
+def _has_syntax_error(path):
+    with open(path, "rb") as f:
+        source = f.read()
+    try:
+        compile(source, path, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError):
+        return True
+    return False
+
+
+def start_analyzers(paths, cache_dir=DEFAULT_CACHE_DIR, timeout=60):
+    """Dispara mypy (via dmypy), ruff e bandit ao mesmo tempo sobre os arquivos, com saída legível por máquina.
+
+    Os achados são atribuídos a cada arquivo pelo caminho absoluto. Os nomes dos módulos também
+    precisam ser distintos entre chamadas (Sandbox dá um nome único a cada candidato): o daemon do
+    mypy confunde dois candidate.py de diretórios diferentes.
+
+    Um erro de sintaxe é um erro bloqueante para o mypy, que então não verifica nenhum outro arquivo
+    do lote: os arquivos que não compilam ficam fora do mypy e recebem o erro diretamente.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    paths = [os.path.abspath(path) for path in paths]
+    os.makedirs(cache_dir, exist_ok=True)
+    commands = {
+        'ruff': ["ruff", "check", "--output-format", "json", "--cache-dir", os.path.join(cache_dir, "ruff"), *paths],
+        'bandit': ["bandit", "-q", "-f", "json", *paths],
+    }
+    syntax_errors = [path for path in paths if _has_syntax_error(path)]
+    mypy_paths = [path for path in paths if path not in syntax_errors]
+    processes = {}
+    mypy_daemon = False
+    if mypy_paths:
+        mypy_command, mypy_daemon = _mypy_command(mypy_paths, cache_dir)
+        try:
+            processes['mypy'] = _start(mypy_command)
+        except FileNotFoundError:
+            # Sem dmypy disponível, volta para o mypy tradicional com o mesmo cache
+            processes['mypy'] = _start(_plain_mypy_command(mypy_paths, cache_dir))
+            mypy_daemon = False
+    for name, command in commands.items():
+        processes[name] = _start(command)
+    futures = {name: _readers.submit(_collect, process, started, timeout) for name, (process, started) in processes.items()}
+    return AnalyzerBatch(paths, processes, futures, cache_dir, timeout, mypy_daemon, syntax_errors)
+
+
+def _mypy_each(batch):
+    # Um mypy por arquivo, fora do daemon: um erro bloqueante num arquivo não esconde os achados dos outros
+    started = [_start(_plain_mypy_command([path], batch.cache_dir)) for path in batch.mypy_paths]
+    outputs = [_collect(process, start, batch.timeout) for process, start in started]
+    return "\n".join(stdout for stdout, _, _ in outputs), max(elapsed for _, elapsed, _ in outputs)
+
+
+def _parse_findings(name, stdout):
+    """Converte a saída de uma ferramenta em pares (arquivo, regra)."""
+    if name == 'mypy':
+        findings = []
+        for line in stdout.splitlines():
+            match = _MYPY_LINE.match(line)
+            if match and match.group('severity') == 'error':
+                findings.append((match.group('file'), match.group('code') or 'error'))
+        return findings
+    try:
+        report = json.loads(stdout) if stdout.strip() else []
+    except json.JSONDecodeError:
+        logging.warning(f"Saída inválida do {name}; achados ignorados.")
+        return []
+    if name == 'ruff':
+        return [(finding['filename'], finding.get('code') or 'syntax-error') for finding in report]
+    return [(finding['filename'], finding['test_id']) for finding in report.get('results', [])]
+
+
+def _score(rules):
+    score = 3.0
+    mypy_errors = sum(rules['mypy'].values())
+    if mypy_errors > 0:
+        score -= 1
+
+    ruff_issues = sum(rules['ruff'].values())
+    if ruff_issues > 0:
+        score -= min(1.0, ruff_issues * 0.1)
+
+    bandit_issues = sum(rules['bandit'].values())
+    if bandit_issues > 0:
+        score -= min(1.0, bandit_issues * 0.2)
+
+    return {
+        'mypy': mypy_errors,
+        'ruff': ruff_issues,
+        'bandit': bandit_issues,
+        'score': score,
+        'rules': rules,
+    }
+
+
+def collect_batch(batch, timings=None):
+    """Aguarda os analisadores e devolve, na ordem de batch.paths, a análise de cada arquivo.
+
+    Cada análise tem o total de achados por ferramenta, a contagem por regra e a pontuação
+    estática (0 a 3). Se `timings` for um dicionário, recebe o tempo de parede de cada analisador.
+    """
+    results = {name: future.result() for name, future in batch.futures.items()}
+    mypy = results.get('mypy')
+    if mypy is not None and mypy[2] not in (0, 1) and (batch.mypy_daemon or len(batch.mypy_paths) > 1):
+        # Erro bloqueante (o mypy para de verificar o lote) ou o daemon caiu; a resposta do daemon pode
+        # até trazer erros antigos no lugar dos deste lote
+        logging.warning("Erro bloqueante no mypy; verificando os arquivos do lote um a um, fora do daemon.")
+        if batch.mypy_daemon:
+            _reset_mypy_daemon(batch.cache_dir)
+        stdout, elapsed = _mypy_each(batch)
+        results['mypy'] = (stdout, mypy[1] + elapsed, None)
+    if timings is not None:
+        timings.update({name: elapsed for name, (_, elapsed, _) in results.items()})
+
+    by_path = {os.path.realpath(path): position for position, path in enumerate(batch.paths)}
+    rules = [{name: {} for name in TOOLS} for _ in batch.paths]
+    for path in batch.syntax_errors:
+        rules[by_path[os.path.realpath(path)]]['mypy']['syntax'] = 1
+    for name, (stdout, _, _) in results.items():
+        for filename, rule in _parse_findings(name, stdout):
+            position = by_path.get(os.path.realpath(filename))
+            if position is None:
+                continue  # Achados em arquivos que não são deste lote (stubs, ou restos de outra verificação)
+            counts = rules[position][name]
+            counts[rule] = counts.get(rule, 0) + 1
+    return [_score(candidate_rules) for candidate_rules in rules]
+
+
+def collect_analyzers(batch, timings=None):
+    """Análise do primeiro (normalmente o único) arquivo do lote."""
+    return collect_batch(batch, timings)[0]
+
+
+def run_analyzers(path, cache_dir=DEFAULT_CACHE_DIR, timeout=60, timings=None):
+    return collect_analyzers(start_analyzers(path, cache_dir, timeout), timings)
+
+
+def write_candidates(codes, directory):
+    """Grava cada programa como candidate_<lote>_<i>.py em `directory` e devolve os caminhos, na mesma ordem.
+
+    O identificador do lote mantém os nomes de módulo únicos entre lotes (ver start_analyzers).
+    """
+    batch_id = uuid.uuid4().hex[:8]
+    paths = []
+    for position, code in enumerate(codes):
+        path = os.path.join(directory, f"candidate_{batch_id}_{position}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        paths.append(path)
+    return paths
+
+
+def analyze_codes(codes, cache_dir=DEFAULT_CACHE_DIR, timeout=60, timings=None):
+    """Analisa vários programas com uma execução de cada ferramenta, numa árvore temporária."""
+    with tempfile.TemporaryDirectory(prefix="rl_llm_analysis_") as scratch:
+        return collect_batch(start_analyzers(write_candidates(codes, scratch), cache_dir, timeout), timings)
+
+
+def stop_mypy_daemon(cache_dir=DEFAULT_CACHE_DIR):
+    """Encerra o daemon do mypy iniciado por start_analyzers."""
+    status_file = _status_file(cache_dir)
+    with _mypy_daemon_lock:
+        _mypy_daemons.discard(cache_dir)
+        if not os.path.exists(status_file):
+            return
+        try:
+            stopped = subprocess.run(["dmypy", "--status-file", status_file, "stop"],
+                                     capture_output=True, text=True, timeout=30).returncode == 0
+        except subprocess.TimeoutExpired:
+            stopped = False
+        if not stopped:
+            # Daemon ocupado ou travado (por exemplo, numa verificação cancelada): mata o processo
+            subprocess.run(["dmypy", "--status-file", status_file, "kill"], capture_output=True, text=True, timeout=30)
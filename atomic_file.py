@@ -0,0 +1,24 @@
+# atomic_file.py
+"""Gravação atômica de arquivos: o conteúdo vai para um nome temporário único e entra no lugar com os.replace."""
+
+import os
+import tempfile
+
+
+def partial_path(target):
+    """Cria um arquivo temporário vazio ao lado de `target` e devolve o caminho.
+
+    O nome é único por chamada (mkstemp), então várias threads ou processos gravando o mesmo
+    destino ao mesmo tempo não escrevem no mesmo arquivo parcial.
+    """
+    directory, name = os.path.split(target)
+    fd, partial = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}.", suffix=".tmp")
+    os.close(fd)
+    return partial
+
+
+def discard(partial):
+    try:
+        os.unlink(partial)
+    except FileNotFoundError:
+        pass
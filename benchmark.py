@@ -0,0 +1,343 @@
+# benchmark.py
+"""Benchmark por etapa do loop de episódios do Environment.
+
+Roda train/test com um backend de LLM falso (latência configurável por papel) e um conjunto
+fixo de programas candidatos, e grava a distribuição de latência de cada etapa em JSON.
+
+    python benchmark.py --episodes 12 --output bench.json
+    python benchmark.py --episodes 12 --save-baseline bench_baseline.json
+    python benchmark.py --episodes 12 --baseline bench_baseline.json --tolerance 0.25
+    python benchmark.py --episodes 0 --test-episodes 0 --import-budget 0.3
+
+O limite fixo de import a frio (IMPORT_BUDGET) é verificado pelos testes; --import-budget
+só repete a medição aqui, com outro limite se for preciso.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import llm_client
+from environment import Environment
+from programmer import Programmer
+from reviewer import Reviewer
+from prompt_master import PromptMaster
+from analyzers import stop_mypy_daemon
+from warm_executor import WarmExecutor
+from gates import DEFAULT_GATES
+from replay_buffer import ReplayBuffer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Limite (s) do import a frio de `environment`, verificado em tests/test_import_time.py (medido: ~0,17s)
+IMPORT_BUDGET = 0.3
+
+CANDIDATES = {
+    'passing': (
+        "import pandas as pd\n\n"
+        "df = pd.read_csv('sales_data.csv')\n"
+        "df = df.dropna().drop_duplicates()\n"
+        "print(df.groupby('Region')['Total_Revenue'].sum())\n"
+    ),
+    'failing': (
+        "import pandas as pd\n\n"
+        "df = pd.read_csv('sales_data.csv')\n"
+        "print(df['Coluna_Inexistente'].mean())\n"
+    ),
+    'slow': (
+        "total = 0\n"
+        "for i in range(20_000_000):\n"
+        "    total += i % 7\n"
+        "print(total)\n"
+    ),
+    'lint_heavy': (
+        "import os, sys, json\n"
+        "import subprocess\n"
+        "def f( x ):\n"
+        "  y=eval( x )\n"
+        "  subprocess.call('echo '+str(y), shell=True)\n"
+        "  return y\n"
+        "print(f('1+1'))\n"
+    ),
+}
+
+REVIEW = ("Revisão de benchmark. {'Total': 70, 'clarity': 70, 'readability': 70, "
+          "'efficiency': 70, 'optimization': 70}")
+REPORT = "Relatório de benchmark. {'Report Quality': 60}"
+COMBINED = json.dumps({
+    'review': "Revisão de benchmark.",
+    'scores': {'Total': 70, 'clarity': 70, 'readability': 70, 'efficiency': 70, 'optimization': 70},
+    'report': "Relatório de benchmark.",
+    'report_quality': 60,
+})
+HINT = ("Dica: <Prefira funções pequenas e nomes descritivos> Ênfase: <70> "
+        "<{'clarity': 2, 'readability': 1, 'efficiency': 1, 'optimization': 1}>")
+
+
+class FakeLLM:
+    """Backend de LLM que devolve respostas prontas após uma latência fixa por papel."""
+
+    def __init__(self, latency, candidates, max_concurrency=4):
+        self.latency = latency
+        self.candidates = candidates
+        self.calls = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="fake-llm")
+
+    def _respond(self, role, format=None):
+        time.sleep(self.latency.get(role, 0.0))
+        if role == 'reviewer' and format == 'json':
+            content = COMBINED
+        elif role == 'programmer':
+            content = self.candidates[self.calls % len(self.candidates)]
+            self.calls += 1
+        elif role == 'reviewer':
+            content = REVIEW
+        elif role == 'reporter':
+            content = REPORT
+        else:
+            content = HINT
+        return {'message': {'role': 'assistant', 'content': content}, 'done': True, 'done_reason': 'stop'}
+
+    def submit(self, model, messages, role=None, **kwargs):
+        return self.executor.submit(self._respond, role, kwargs.get('format'))
+
+    def chat(self, model, messages, role=None, **kwargs):
+        return self.submit(model, messages, role=role, **kwargs).result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        summary = {}
+        for stage, samples in sorted(self.samples.items()):
+            values = np.asarray(samples)
+            summary[stage] = {
+                'count': int(values.size),
+                'mean': float(values.mean()),
+                'p50': float(np.percentile(values, 50)),
+                'p90': float(np.percentile(values, 90)),
+                'p99': float(np.percentile(values, 99)),
+                'max': float(values.max()),
+            }
+        return summary
+
+
+def instrument(env, timer):
+    """Envolve as etapas do episódio com medição de tempo (apenas nesta instância do Environment)."""
+    env.programmer.act = timer.wrap('generation', env.programmer.act)
+    env.reviewer.act = timer.wrap('review', env.reviewer.act)
+    env.reviewer.act_combined = timer.wrap('review', env.reviewer.act_combined)
+    env.programmer.update_policy = timer.wrap('policy_update', env.programmer.update_policy)
+    env.reviewer.update_policy = timer.wrap('policy_update', env.reviewer.update_policy)
+    env.plot_results = timer.wrap('plot_results', env.plot_results)
+
+    # O relatório corre em paralelo com a revisão: mede do disparo até a coleta
+    request_report, collect_report = env.reviewer.request_report, env.reviewer.collect_report
+    started = {}
+
+    def timed_request(code):
+        request = request_report(code)
+        started[id(request)] = time.perf_counter()
+        return request
+
+    def timed_collect(request):
+        try:
+            return collect_report(request)
+        finally:
+            timer.add('report', time.perf_counter() - started.pop(id(request)))
+
+    env.reviewer.request_report = timed_request
+    env.reviewer.collect_report = timed_collect
+
+    evaluate_cached = env._evaluate_cached
+
+    def timed_evaluate(code, data=None):
+        result = evaluate_cached(code, data)
+        for stage, seconds in result['timings'].items():
+            timer.add(stage if stage == 'run_code' else f"eval_code.{stage}", seconds)
+        return result
+
+    env._evaluate_cached = timed_evaluate
+
+
+def run(args):
+    candidates = [CANDIDATES[name] for name in args.candidates]
+    latency = {
+        'programmer': args.generation_latency,
+        'reviewer': args.review_latency,
+        'reporter': args.report_latency,
+        'prompt_master': args.hint_latency,
+    }
+    fake = FakeLLM(latency, candidates)
+    llm_client.set_client(fake)
+
+    data = os.path.join(REPO_DIR, "sales_data.csv")
+    problem = {"question": "Benchmark: limpe e resuma os dados de vendas.", "data": data, "metrics": {}}
+    timer = StageTimer()
+    executor = WarmExecutor() if args.warm_executor else None
+    workdir = tempfile.mkdtemp(prefix="rl_llm_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # Métricas e PNGs ficam no diretório temporário
+    try:
+        prompt_master = PromptMaster()
+
+        def replay():
+            return ReplayBuffer(batches=args.replay_batches, seed=0) if args.replay_batches else None
+
+        reviewer = Reviewer(prompt_master, epsilon=args.epsilon, combined=args.combined_review,
+                            memo_threshold=None if args.no_memo else 0.9, replay=replay(), seed=1)
+        env = Environment(Programmer(prompt_master, epsilon=args.epsilon, replay=replay(), seed=0), reviewer, prompt_master, executor=executor,
+                          gates=() if args.no_gates else DEFAULT_GATES)
+        instrument(env, timer)
+        start = time.perf_counter()
+        for episode in range(args.episodes):
+            with_timer = timer.wrap('episode.train', env.train)
+            with_timer(problem)
+        for episode in range(args.test_episodes):
+            with_timer = timer.wrap('episode.test', env.test)
+            with_timer(problem)
+        if args.episodes or args.test_episodes:
+            env.plot_results()
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        stop_mypy_daemon(os.path.join(workdir, ".cache", "analyzers"))
+        fake.close()
+        if executor is not None:
+            executor.close()
+
+    return {
+        'config': {
+            'episodes': args.episodes,
+            'test_episodes': args.test_episodes,
+            'candidates': args.candidates,
+            'latency': latency,
+            'warm_executor': args.warm_executor,
+            'gates': not args.no_gates,
+            'combined_review': args.combined_review,
+            'review_memo': not args.no_memo,
+            'replay_batches': args.replay_batches,
+        },
+        'elapsed': elapsed,
+        'stages': timer.summary(),
+        'gates': env.gates.stats(),
+        'review_memo': env.reviewer.memo.stats() if env.reviewer.memo else None,
+    }
+
+
+def import_time(module, runs=3):
+    """Menor tempo cumulativo (s) de `import module` num interpretador novo, medido com -X importtime."""
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=REPO_DIR, capture_output=True, text=True, check=True)
+        cumulative = None
+        for line in completed.stderr.splitlines():
+            parts = line.split("|")
+            # A linha do módulo pedido é a única sem recuo na terceira coluna
+            if len(parts) == 3 and parts[2] == f" {module}":
+                cumulative = int(parts[1]) / 1e6
+        if cumulative is None:
+            raise RuntimeError(f"-X importtime não listou o módulo {module}")
+        best = cumulative if best is None else min(best, cumulative)
+    return best
+
+
+def compare(result, baseline, tolerance, metric='p50'):
+    """Lista as etapas cuja métrica piorou mais que `tolerance` em relação à linha de base."""
+    regressions = []
+    for stage, stats in result['stages'].items():
+        reference = baseline['stages'].get(stage)
+        if reference is None or reference[metric] <= 0:
+            continue
+        ratio = stats[metric] / reference[metric]
+        if ratio > 1 + tolerance:
+            regressions.append({'stage': stage, 'baseline': reference[metric], 'current': stats[metric], 'ratio': ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--episodes", type=int, default=8)
+    parser.add_argument("--test-episodes", type=int, default=2)
+    parser.add_argument("--candidates", nargs="+", default=list(CANDIDATES), choices=list(CANDIDATES))
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--generation-latency", type=float, default=0.5)
+    parser.add_argument("--review-latency", type=float, default=0.5)
+    parser.add_argument("--report-latency", type=float, default=0.5)
+    parser.add_argument("--hint-latency", type=float, default=0.2)
+    parser.add_argument("--warm-executor", action="store_true", help="Executa os candidatos pelo WarmExecutor (fork)")
+    parser.add_argument("--combined-review", action="store_true", help="Revisão e relatório numa única chamada (JSON)")
+    parser.add_argument("--no-memo", action="store_true", help="Desliga a memória de revisões e relatórios")
+    parser.add_argument("--replay-batches", type=int, default=0, help="Mini-lotes do buffer de experiência por atualização")
+    parser.add_argument("--no-gates", action="store_true", help="Avalia todas as etapas mesmo para candidatos que falham")
+    parser.add_argument("--output", help="Arquivo JSON com o resultado (padrão: stdout)")
+    parser.add_argument("--save-baseline", help="Grava o resultado como nova linha de base")
+    parser.add_argument("--baseline", help="Compara com uma linha de base gravada anteriormente")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora relativa aceita no p50 de cada etapa")
+    parser.add_argument("--import-budget", type=float, help="Tempo máximo (s) de import a frio dos módulos em --import-modules")
+    parser.add_argument("--import-modules", nargs="+", default=['environment'])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    if args.import_budget is not None:
+        result['import_time'] = {module: import_time(module) for module in args.import_modules}
+        result['import_over_budget'] = [module for module, seconds in result['import_time'].items()
+                                        if seconds > args.import_budget]
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            result['regressions'] = compare(result, json.load(f), args.tolerance)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    failed = False
+    for regression in result.get('regressions', []):
+        logging.error(f"Regressão em {regression['stage']}: {regression['baseline']:.3f}s -> "
+                      f"{regression['current']:.3f}s ({regression['ratio']:.2f}x)")
+        failed = True
+    for module in result.get('import_over_budget', []):
+        logging.error(f"Import de {module} levou {result['import_time'][module]:.3f}s "
+                      f"(limite de {args.import_budget:.3f}s)")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# case_runner.py
+"""Roda todos os casos de teste de um problema num único processo, dentro da sandbox.
+
+Lê do stdin {'filename', 'mode', 'cases', 'case_timeout', 'compare', 'entry'} e imprime, na última
+linha, RESULTS_MARKER seguido do JSON com o resultado de cada caso. Só usa a biblioteca padrão.
+
+Modos:
+    stdio     o candidato é compilado uma vez e reexecutado por caso, com o `input` do caso (JSON) no
+              stdin e a saída (JSON) comparada com `expected`
+    function  o candidato é carregado uma vez e `entry` é chamada com `args`/`kwargs` de cada caso
+    check     o candidato roda uma vez como __main__ e cada caso avalia a expressão `check` sobre as
+              variáveis globais dele (`namespace`, `frames` com os DataFrames, `pd` se instalado)
+"""
+
+import contextlib
+import io
+import json
+import math
+import signal
+import sys
+import time
+import traceback
+
+RESULTS_MARKER = "__CASE_RESULTS__"
+
+
+class CaseTimeout(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def _deadline(seconds):
+    def expire(signum, frame):
+        raise CaseTimeout(f"Tempo limite de {seconds}s excedido.")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _same(actual, expected, compare):
+    if compare == 'sorted':
+        return sorted(actual) == sorted(expected)
+    if compare == 'approx':
+        if isinstance(expected, (list, tuple)):
+            return len(actual) == len(expected) and all(_same(a, e, compare) for a, e in zip(actual, expected))
+        if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+            return math.isclose(actual, expected, rel_tol=1e-6, abs_tol=1e-9)
+    return actual == expected
+
+
+def _exec_script(code, namespace):
+    # Um sys.exit() sem erro no fim do script conta como término normal, como num processo próprio
+    try:
+        exec(code, namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise
+
+
+def _run_stdio(code, case, compare):
+    stdin = io.StringIO(json.dumps(case['input']))
+    stdout = io.StringIO()
+    sys.stdin = stdin
+    try:
+        with contextlib.redirect_stdout(stdout):
+            _exec_script(code, {'__name__': '__main__'})
+    finally:
+        sys.stdin = sys.__stdin__
+    return _same(json.loads(stdout.getvalue()), case['expected'], compare)
+
+
+def _namespace_for_checks(namespace):
+    names = {'namespace': namespace}
+    try:
+        import pandas as pd
+    except ImportError:
+        names['frames'] = []
+        return names
+    names['pd'] = pd
+    names['frames'] = [value for value in namespace.values() if isinstance(value, pd.DataFrame)]
+    return names
+
+
+def run_cases(request):
+    filename = request['filename']
+    mode = request['mode']
+    compare = request.get('compare', 'exact')
+    case_timeout = request.get('case_timeout', 10)
+    with open(filename, encoding="utf-8") as f:
+        code = compile(f.read(), filename, "exec")
+
+    namespace = {'__name__': '__main__' if mode == 'check' else '__candidate__', '__file__': filename}
+    load_error = None
+    if mode in ('function', 'check'):
+        # Carrega o candidato uma única vez; a saída do próprio script não interessa aos casos
+        try:
+            with _deadline(request.get('load_timeout', case_timeout)), contextlib.redirect_stdout(io.StringIO()):
+                _exec_script(code, namespace)
+        except BaseException as e:
+            load_error = f"{type(e).__name__}: {e}"
+    check_names = _namespace_for_checks(namespace) if mode == 'check' and load_error is None else None
+
+    results = []
+    for case in request['cases']:
+        result = {'name': case.get('name'), 'passed': False, 'error': load_error}
+        started = time.perf_counter()
+        if load_error is None:
+            try:
+                with _deadline(case_timeout):
+                    if mode == 'stdio':
+                        result['passed'] = _run_stdio(code, case, compare)
+                    elif mode == 'function':
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            actual = namespace[request['entry']](*case.get('args', []), **case.get('kwargs', {}))
+                        result['passed'] = _same(actual, case['expected'], compare)
+                    else:
+                        result['passed'] = bool(eval(case['check'], dict(check_names)))
+            except BaseException as e:
+                result['error'] = f"{type(e).__name__}: {e}"
+                if not isinstance(e, (CaseTimeout, AssertionError)):
+                    traceback.print_exc(file=sys.stderr)
+        result['elapsed'] = time.perf_counter() - started
+        results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    results = run_cases(json.loads(sys.stdin.read()))
+    sys.stdout.write("\n" + RESULTS_MARKER + json.dumps(results) + "\n")
+    sys.stdout.flush()
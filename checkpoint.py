@@ -0,0 +1,131 @@
+# checkpoint.py
+
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from q_table import QTable
+
+SNAPSHOT = "snapshot.npz"
+UPDATE_LOG = "updates.jsonl"
+
+
+def _atomic_write(path, write):
+    # Escreve num arquivo temporário do mesmo diretório e troca com os.replace
+    directory = os.path.dirname(path) or "."
+    fd, partial = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+class Checkpoint:
+    """Checkpoint incremental do estado aprendido de um agente (tabela Q, pesos e dicas).
+
+    Cada save acrescenta ao log apenas as células da tabela Q que mudaram desde o save anterior;
+    a cada `compact_every` registros o log é compactado num snapshot (.npz, lido sem pickle).
+    Históricos de prompts, códigos e revisões não fazem parte do checkpoint.
+    """
+
+    def __init__(self, directory, compact_every=50):
+        self.directory = directory
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, UPDATE_LOG)
+        self._log_records = self._count_log_records()
+
+    def _count_log_records(self):
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                # Descarta o fim de uma escrita interrompida para que os próximos registros não se misturem a ele
+                f.truncate(content.rfind(b"\n") + 1)
+                logging.warning(f"Registro incompleto removido de {self.log_path}")
+            return content.count(b"\n")
+
+    def save(self, q_table, state):
+        """Grava o que mudou desde o último save; compacta o log quando necessário."""
+        if self._log_records == 0 and not os.path.exists(os.path.join(self.directory, SNAPSHOT)):
+            # Checkpoint novo: o journal da tabela pode não conter tudo, então grava um snapshot completo
+            self.compact(q_table, state)
+            return
+        changes, actions_from, new_actions = q_table.drain_journal()
+        record = {
+            'bins': [q_table.n_bins, q_table.low, q_table.high],
+            'actions_from': actions_from,
+            'new_actions': new_actions,
+            'q': [[row, action_id, value] for (row, action_id), value in changes.items()],
+            'state': state,
+        }
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_records += 1
+        if self._log_records >= self.compact_every:
+            self.compact(q_table, state)
+
+    def compact(self, q_table, state):
+        q_table.drain_journal()
+        meta = {
+            'n_bins': q_table.n_bins,
+            'low': q_table.low,
+            'high': q_table.high,
+            'chunk': q_table.chunk,
+            'actions': q_table.actions,
+            'state': state,
+        }
+        arrays = {
+            'values': q_table.values[:, :len(q_table.actions)],
+            'known': q_table.known[:, :len(q_table.actions)],
+            'meta': np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+        }
+        # Um único arquivo trocado atomicamente: matriz e metadados nunca ficam fora de sincronia
+        _atomic_write(os.path.join(self.directory, SNAPSHOT), lambda f: np.savez_compressed(f, **arrays))
+        # Se o processo cair antes desta troca, o log antigo é reaplicado sem efeito (os valores são absolutos)
+        _atomic_write(self.log_path, lambda f: None)
+        self._log_records = 0
+        logging.info(f"Checkpoint compactado em {self.directory}")
+
+    def load(self):
+        """Devolve (QTable, estado) reconstruídos do snapshot mais o log, ou (None, None) se não há checkpoint."""
+        snapshot_path = os.path.join(self.directory, SNAPSHOT)
+        q_table, state = None, None
+        if os.path.exists(snapshot_path):
+            with np.load(snapshot_path, allow_pickle=False) as arrays:
+                meta = json.loads(arrays['meta'].tobytes().decode("utf-8"))
+                q_table = QTable.from_arrays(arrays['values'], arrays['known'], meta['actions'],
+                                             n_bins=meta['n_bins'], low=meta['low'], high=meta['high'],
+                                             chunk=meta['chunk'])
+            state = meta['state']
+
+        if os.path.exists(self.log_path):
+            with open(self.log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última linha incompleta de uma escrita interrompida
+                        logging.warning(f"Registro incompleto ignorado em {self.log_path}")
+                        break
+                    if q_table is None:
+                        n_bins, low, high = record['bins']
+                        q_table = QTable(n_bins=n_bins, low=low, high=high)
+                    q_table.apply_journal(record['actions_from'], record['new_actions'], record['q'])
+                    state = record['state']
+
+        if q_table is not None:
+            q_table.drain_journal()
+        return q_table, state
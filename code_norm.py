@@ -0,0 +1,83 @@
+# code_norm.py
+"""Normalização do código gerado pelo LLM: cercas de markdown, forma canônica e impressão digital."""
+
+import ast
+import builtins
+import hashlib
+import re
+
+_FENCES = re.compile(r"```python|```")
+_TOKENS = re.compile(r"\w+|[^\w\s]")
+_BUILTINS = frozenset(dir(builtins))
+
+
+def strip_fences(code):
+    """Remove as cercas ```python/``` que o LLM coloca em volta do código."""
+    return _FENCES.sub("", code).strip()
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    # Renomeia identificadores para v0, v1, ... na ordem em que aparecem; atributos, builtins e os
+    # nomes importados (import x / from x import y) ficam como estão, porque mudam o que o programa faz
+    def __init__(self, keep):
+        self.keep = _BUILTINS | keep
+        self.names = {}
+
+    def _rename(self, name):
+        if name is None or name in self.keep:
+            return name
+        if name not in self.names:
+            self.names[name] = f"v{len(self.names)}"
+        return self.names[name]
+
+    def visit_Name(self, node):
+        node.id = self._rename(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self._rename(node.arg)
+        node.annotation = None
+        return node
+
+    def visit_alias(self, node):
+        node.asname = self._rename(node.asname)
+        return node
+
+    def _visit_definition(self, node):
+        node.name = self._rename(node.name)
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]  # Docstrings contam como comentários
+        self.generic_visit(node)
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_definition
+
+
+def canonical_code(code):
+    """Forma canônica do programa: sem comentários, docstrings e formatação própria, com identificadores renomeados.
+
+    Código que não compila é devolvido só sem as cercas e com os espaços normalizados.
+    """
+    code = strip_fences(code)
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return "\n".join(" ".join(line.split()) for line in code.splitlines() if line.strip())
+    if tree.body and isinstance(tree.body[0], ast.Expr) and isinstance(tree.body[0].value, ast.Constant):
+        tree.body = tree.body[1:]
+    imported = {alias.name.split(".")[0] for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))
+                for alias in node.names if alias.asname is None}
+    return ast.unparse(_Canonicalizer(imported).visit(tree))
+
+
+def fingerprint(code):
+    return hashlib.sha256(canonical_code(code).encode("utf-8")).hexdigest()
+
+
+def shingles(canonical, size=5):
+    """Conjunto de sequências de `size` tokens consecutivos da forma canônica."""
+    tokens = _TOKENS.findall(canonical)
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
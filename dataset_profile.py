@@ -0,0 +1,182 @@
+# dataset_profile.py
+"""Perfil dos arquivos de dados dos problemas (esquema, tipos, nulos e estatísticas) e cópia colunar.
+
+O perfil é calculado uma vez por conteúdo de arquivo (hash SHA-256) e fica em cache no disco; um
+resumo curto entra no prompt do Programmer. A cópia em Arrow IPC (Feather sem compressão) é
+copiada em cada sandbox ao lado do arquivo original, e o código gerado pode abri-la com
+pd.read_feather ou pyarrow.memory_map sem reinterpretar o CSV a cada execução.
+
+O arquivo é lido com o leitor padrão do pandas, o mesmo que o código gerado usa com pd.read_csv,
+então os tipos do perfil são os que o candidato vai ver; a cópia Arrow é gravada a partir desse
+mesmo DataFrame e tem os mesmos tipos. Uma cópia que falhou não fica registrada no perfil em disco
+e é tentada de novo na próxima chamada.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+
+from atomic_file import discard, partial_path
+
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+TOP_VALUES = 3
+
+
+def _read_frame(path):
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.csv', '.tsv', '.txt'):
+        return pd.read_csv(path, sep='\t' if extension == '.tsv' else ',')
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    if extension in ('.feather', '.arrow'):
+        return pd.read_feather(path)
+    if extension == '.json':
+        return pd.read_json(path)
+    if extension in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    raise ValueError(f"Formato de dados não suportado: {extension or path}")
+
+
+def _plain(value):
+    # Valores do numpy/pandas para JSON; NaN vira None
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (int, float, bool, str)):
+        return value
+    return str(value)
+
+
+def profile_frame(frame):
+    """Esquema, nulos e estatísticas de um DataFrame, calculados coluna a coluna de forma vetorizada."""
+    nulls = frame.isna().sum()
+    unique = frame.nunique(dropna=True)
+    numeric = frame.select_dtypes("number")
+    stats = numeric.agg(['min', 'max', 'mean', 'std']) if not numeric.empty else None
+    columns = []
+    for name, dtype in frame.dtypes.items():
+        column = {'name': str(name), 'dtype': str(dtype), 'nulls': int(nulls[name]), 'unique': int(unique[name])}
+        if stats is not None and name in stats.columns:
+            column.update({stat_name: _plain(stats.at[stat_name, name]) for stat_name in stats.index})
+        else:
+            column['top'] = [_plain(value) for value in frame[name].value_counts(dropna=True).index[:TOP_VALUES]]
+        columns.append(column)
+    return {'rows': int(len(frame)), 'columns': columns}
+
+
+def summarize(profile, max_columns=40):
+    """Resumo compacto do perfil para o prompt: uma linha por coluna."""
+    header = f"{profile['file']}: {profile['rows']} linhas, {len(profile['columns'])} colunas"
+    if profile.get('columnar'):
+        header += f" (cópia colunar sem reinterpretação: pd.read_feather('{profile['columnar']}'))"
+    lines = [header]
+    for column in profile['columns'][:max_columns]:
+        line = f"- {column['name']}: {column['dtype']}, {column['nulls']} nulos, {column['unique']} distintos"
+        if column.get('mean') is not None:
+            line += f", mín {column['min']:.6g}, máx {column['max']:.6g}, média {column['mean']:.4g}"
+        elif column.get('top'):
+            line += ", ex.: " + ", ".join(repr(value) for value in column['top'])
+        lines.append(line)
+    if len(profile['columns']) > max_columns:
+        lines.append(f"- ... mais {len(profile['columns']) - max_columns} colunas")
+    return "\n".join(lines)
+
+
+class DatasetProfiler:
+    """Perfis e cópias colunares em cache, por hash do conteúdo do arquivo de dados."""
+
+    def __init__(self, cache_dir=DEFAULT_PROFILE_DIR):
+        self.cache_dir = cache_dir
+        self._hashes = {}
+        self._profiles = {}
+        self._columnar_unavailable = False  # pyarrow ausente: não adianta tentar de novo neste processo
+        self._lock = threading.Lock()
+
+    def _hash(self, path):
+        # Recalculado só quando o arquivo muda (mtime ou tamanho)
+        info = os.stat(path)
+        signature = (os.path.abspath(path), info.st_mtime_ns, info.st_size)
+        if signature not in self._hashes:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            self._hashes[signature] = digest.hexdigest()
+        return self._hashes[signature]
+
+    def _entry_dir(self, digest):
+        directory = os.path.join(self.cache_dir, digest[:16])
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def profile(self, path):
+        """Perfil do arquivo (dict serializável em JSON); calcula e grava a cópia colunar na primeira vez."""
+        with self._lock:
+            digest = self._hash(path)
+            profile = self._profiles.get(digest)
+            frame = None
+            changed = False
+            profile_path = os.path.join(self._entry_dir(digest), "profile.json")
+            if profile is None and os.path.exists(profile_path):
+                with open(profile_path, encoding="utf-8") as f:
+                    profile = json.load(f)
+                if profile.get('columnar') is None:
+                    profile.pop('columnar', None)  # Perfis antigos gravavam a falha como null
+            elif profile is None:
+                frame = _read_frame(path)
+                profile = profile_frame(frame)
+                profile.update(file=os.path.basename(path), sha256=digest, bytes=os.path.getsize(path))
+                changed = True
+                logging.info(f"Perfil de {path} calculado: {profile['rows']} linhas, {len(profile['columns'])} colunas")
+            self._profiles[digest] = profile
+            if 'columnar' not in profile and self._needs_columnar(path):
+                # Primeira vez, ou uma tentativa anterior falhou: só o nome de uma cópia gravada vai para o perfil
+                name = self._write_columnar(frame if frame is not None else _read_frame(path), digest, path)
+                if name:
+                    profile['columnar'] = name
+                    changed = True
+            if changed:
+                partial = partial_path(profile_path)
+                with open(partial, "w", encoding="utf-8") as f:
+                    json.dump(profile, f, ensure_ascii=False)
+                os.replace(partial, profile_path)
+            return profile
+
+    def _needs_columnar(self, path):
+        # O original já é colunar, ou pyarrow não está disponível
+        return not self._columnar_unavailable and os.path.splitext(path)[1].lower() not in ('.arrow', '.feather')
+
+    def _write_columnar(self, frame, digest, path):
+        name = os.path.splitext(os.path.basename(path))[0] + ".arrow"
+        target = os.path.join(self._entry_dir(digest), name)
+        partial = partial_path(target)
+        try:
+            frame.to_feather(partial, compression="uncompressed")
+        except ImportError as e:
+            discard(partial)
+            self._columnar_unavailable = True
+            logging.warning(f"Cópia colunar de {path} não gerada: {e}")
+            return None
+        except (OSError, ValueError) as e:
+            discard(partial)
+            logging.warning(f"Cópia colunar de {path} não gerada: {e}; nova tentativa no próximo perfil.")
+            return None
+        os.chmod(partial, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(partial, target)
+        return name
+
+    def columnar_path(self, path):
+        """Caminho da cópia Arrow do arquivo, ou None se não houver."""
+        profile = self.profile(path)
+        if not profile.get('columnar'):
+            return None
+        target = os.path.join(self._entry_dir(profile['sha256']), profile['columnar'])
+        return target if os.path.exists(target) else None
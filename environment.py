@@ -1,105 +1,283 @@
 from programmer import Programmer
 from reviewer import Reviewer
 from prompt_master import PromptMaster
+from analyzers import start_analyzers, collect_analyzers, collect_batch, run_analyzers, write_candidates, DEFAULT_CACHE_DIR
+from sandbox import Sandbox, SandboxPool
+from llm_client import Budget, episode_budget
+from tracing import span, episode, new_episode_id, get_tracer
+from metrics_log import MetricsLog, DEFAULT_METRICS_DIR, render
+from history import BoundedHistory
+from problem_specs import spec_for
+from gates import GatePipeline, DEFAULT_GATES, check_syntax
+from code_norm import strip_fences
+from dataset_profile import DatasetProfiler, DEFAULT_PROFILE_DIR, summarize
+from case_runner import RESULTS_MARKER
 
-import matplotlib.pyplot as plt
 import os
-import subprocess
-import re
-import time
 import json
+import time
+import tempfile
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+CASE_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "case_runner.py")
 
 class Environment:
-    def __init__(self, programmer: Programmer, reviewer: Reviewer, prompt_master: PromptMaster):
+    def __init__(self, programmer: Programmer, reviewer: Reviewer, prompt_master: PromptMaster, analysis_cache_dir=DEFAULT_CACHE_DIR, cache=None,
+                 workers=4, sandbox_limits=None, timeout=100, token_budget=None, time_budget=None,
+                 metrics_dir=DEFAULT_METRICS_DIR, history_size=1000, executor=None, candidates=1, survivors=1,
+                 gates=DEFAULT_GATES, profile_dir=DEFAULT_PROFILE_DIR, resume_metrics=False):
         self.programmer = programmer
         self.reviewer = reviewer
         self.prompt_master = prompt_master
-        self.code_scores = []
-        self.report_scores = []
-        self.programmer_q_values_history = []
-        self.reviewer_q_values_history = []
-
-
-    def eval_code(self, code: str):
-        code = re.sub(r"```python|```", "", code).strip()
-
-        with open("temp_code.py", "w") as temp_file:
-            temp_file.write(code)
-
-        max_score = 3
-        score = 3
-
-        # Mypy
-        mypy_result = subprocess.run(["mypy", "temp_code.py"], capture_output=True, text=True)
-        if "error" in mypy_result.stdout.lower():
-            score -= 1
-
-        # Ruff
-        ruff_result = subprocess.run(["ruff", "temp_code.py"], capture_output=True, text=True)
-        ruff_issues = ruff_result.stdout.count("E") + ruff_result.stdout.count("W")
-        if ruff_issues > 0:
-            score -= min(1.0, ruff_issues * 0.1)
-
-        # Bandit
-        bandit_result = subprocess.run(["bandit", "-r", "temp_code.py"], capture_output=True, text=True)
-        bandit_issues = bandit_result.stdout.count("Issue")
-        if bandit_issues > 0:
-            score -= min(1.0, bandit_issues * 0.2)
-
-        os.remove("temp_code.py")
-
+        # Janela recente em memória; a série completa fica no MetricsLog
+        self.code_scores = BoundedHistory(history_size)
+        self.report_scores = BoundedHistory(history_size)
+        self.programmer_q_values_history = BoundedHistory(history_size)
+        self.reviewer_q_values_history = BoundedHistory(history_size)
+        self.analysis_cache_dir = analysis_cache_dir
+        self.last_analysis = {}
+        self.last_timings = {}  # Tempo de execução e de cada analisador na última avaliação
+        self.cache = cache  # EvalCache opcional para candidatos repetidos
+        self.sandbox_limits = sandbox_limits  # Limites de CPU, memória e processos por candidato
+        self.timeout = timeout
+        self.executor = executor  # WarmExecutor opcional, com pandas/numpy/matplotlib já importados
+        self.candidates = candidates  # Best-of-N: programas gerados por episódio de treino
+        self.survivors = survivors  # Quantos dos melhores candidatos seguem para revisão e relatório
+        self.pool = SandboxPool(workers)
+        self.token_budget = token_budget  # Tokens de LLM por episódio (prompt + geração)
+        self.time_budget = time_budget  # Segundos de LLM por episódio
+        # Histórico persistente para os gráficos, numa execução nova em metrics_dir (ou a mais recente, com resume_metrics)
+        self.metrics = MetricsLog(metrics_dir, resume=resume_metrics) if metrics_dir else None
+        self.gates = GatePipeline(gates)  # Portões por etapa; gates=() avalia tudo sempre
+        self.profiler = DatasetProfiler(profile_dir) if profile_dir else None  # Perfil e cópia Arrow dos dados
+
+
+    def _data_profile(self, data):
+        if self.profiler is None or not data or not os.path.isfile(data):
+            return None
         try:
-            with open("temp_code.py", "w") as temp_file:
-                temp_file.write(code)
-            subprocess.check_output(["python", "temp_code.py"], stderr=subprocess.STDOUT)
+            return self.profiler.profile(data)
+        except (OSError, ValueError, ImportError) as e:
+            logging.warning(f"Não foi possível calcular o perfil de {data}: {e}")
+            return None
+
+    def data_summary(self, data):
+        """Resumo do arquivo de dados do problema para o prompt do Programmer, ou None."""
+        profile = self._data_profile(data)
+        return summarize(profile) if profile is not None else None
+
+    def _columnar_copies(self, data):
+        if self._data_profile(data) is None:
+            return ()
+        columnar = self.profiler.columnar_path(data)
+        return (columnar,) if columnar else ()
+
+    def analyze_code(self, code: str, data=None):
+        """Roda Mypy, Ruff e Bandit em paralelo sobre o código, numa sandbox própria."""
+        code = strip_fences(code)
+        with Sandbox(code, data, self.sandbox_limits, executor=self.executor, extra_data=self._columnar_copies(data)) as sandbox:
+            return run_analyzers(sandbox.path, self.analysis_cache_dir)
+
+    def eval_code(self, code: str, run_result=None, data=None):
+        # Reaproveita a execução já feita por run_code no mesmo passo de train/test
+        if run_result is None:
+            run_result = self.run_code(code, data)
+
+        self.last_analysis = self.analyze_code(code, data)
+
+        success, exec_time, output = run_result
+        if success:
             score = 1.0
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Erro na execução do código: {e.output}")
-            score = 0.0
-        except Exception as e:
-            logging.error(f"Erro inesperado durante a avaliação do código: {e}")
+        else:
+            logging.error(f"Erro na execução do código: {output}")
             score = 0.0
-        finally:
-            if os.path.exists("temp_code.py"):
-                os.remove("temp_code.py")
         return score
 
-    def run_code(self, code: str):
-        code = re.sub(r"```python|```", "", code).strip()
-
-        temp_file_path = "temp_code.py"
-
-        with open(temp_file_path, "w", encoding="utf-8") as temp_file:
-            temp_file.write(code)
-
-        try:
-            start_time = time.time()
-
-            result = subprocess.run(
-                ["python", temp_file_path],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                timeout=100
-            )
-
-            end_time = time.time()
-            execution_time = end_time - start_time
-
-            if result.returncode == 0:
-                # Success
-                return True, execution_time, result.stdout.strip()
+    def run_code(self, code: str, data=None):
+        code = strip_fences(code)
+        with Sandbox(code, data, self.sandbox_limits, executor=self.executor, extra_data=self._columnar_copies(data)) as sandbox:
+            return sandbox.run(timeout=self.timeout)
+
+    def _evaluate(self, code: str, data=None):
+        # Execução e análise estática acontecem na mesma sandbox, ao mesmo tempo; os analisadores são
+        # disparados de forma especulativa e mortos se o portão da execução rejeitar o candidato
+        code = strip_fences(code)
+        timings = {}
+        with Sandbox(code, data, self.sandbox_limits, executor=self.executor, extra_data=self._columnar_copies(data)) as sandbox:
+            processes = start_analyzers(sandbox.path, self.analysis_cache_dir)
+            try:
+                result = self._execute(sandbox, timings)
+            except BaseException:
+                processes.cancel()
+                raise
+            self.gates.observe('execution', timings['run_code'])
+            result['analysis'] = {}
+            result['rejected'] = self.gates.check('execution', result, started=('analysis',))
+            if result['rejected'] is not None:
+                processes.cancel()
             else:
-                # Fail
-                return False, execution_time, result.stderr.strip()
-
-        except Exception as e:
-            return False, 0, str(e)
-
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+                analysis_timings = {}
+                result['analysis'] = collect_analyzers(processes, timings=analysis_timings)
+                timings.update(analysis_timings)
+                self.gates.observe('analysis', max(analysis_timings.values()))
+                result['rejected'] = self.gates.check('analysis', result)
+        return result
+
+    def _syntax_gate(self, code: str):
+        """Portão mais barato: código que não compila nem chega à sandbox. Devolve o resultado da rejeição ou None.
+
+        Código vazio (orçamento do episódio esgotado ou resposta vazia do LLM) nunca é executado, mesmo sem
+        portões: um arquivo vazio rodaria com sucesso e ganharia recompensa.
+        """
+        started = time.perf_counter()
+        empty = not code.strip()
+        if empty:
+            syntax_ok, error = False, "Nenhum código gerado (orçamento do episódio esgotado ou resposta vazia)."
+        else:
+            syntax_ok, error = check_syntax(code)
+        elapsed = time.perf_counter() - started
+        self.gates.observe('syntax', elapsed)
+        result = {
+            'syntax_ok': syntax_ok,
+            'success': False,
+            'exec_time': 0.0,
+            'output': error or "",
+            'code_score': 0.0,
+            'analysis': {},
+            'timings': {'syntax': elapsed},
+            'cpu_time': None,
+            'timed_out': False,
+        }
+        result['rejected'] = self.gates.check('syntax', result)
+        return result if result['rejected'] is not None or empty else None
+
+    def _from_cache(self, cached):
+        result = dict(cached, syntax_ok=True, code_score=1.0 if cached['success'] else 0.0, timings={}, cpu_time=None, timed_out=False)
+        result['rejected'] = self.gates.check('execution', result) or self.gates.check('analysis', result)
+        return result
+
+    def _execute(self, sandbox, timings):
+        start_time = time.perf_counter()
+        success, exec_time, output = sandbox.run(timeout=self.timeout)
+        timings['run_code'] = time.perf_counter() - start_time
+        if not success:
+            logging.error(f"Erro na execução do código: {output}")
+        return {
+            'syntax_ok': True,
+            'success': success,
+            'exec_time': exec_time,
+            'output': output,
+            'code_score': 1.0 if success else 0.0,
+            'timings': timings,
+            'cpu_time': sandbox.last_cpu_time,
+            'timed_out': sandbox.last_timed_out,
+        }
+
+    def _execute_code(self, code: str, data=None):
+        with Sandbox(code, data, self.sandbox_limits, executor=self.executor, extra_data=self._columnar_copies(data)) as sandbox:
+            return self._execute(sandbox, {})
+
+    def _evaluate_cached(self, code: str, data=None):
+        with span('evaluate') as attrs:
+            code = strip_fences(code)
+            result = self._syntax_gate(code)
+            key = self.cache.key(code, data) if self.cache is not None and result is None else None
+            cached = self.cache.get(key) if key is not None else None
+            if result is not None:
+                pass
+            elif cached is not None:
+                logging.info("Resultado da avaliação encontrado no cache.")
+                result = self._from_cache(cached)
+            else:
+                result = self._evaluate(code, data)
+                # Um tempo limite depende da carga da máquina, não só do código: não vai para o cache
+                if key is not None and not result['timed_out']:
+                    self.cache.put(key, result['success'], result['exec_time'], result['output'], result['analysis'])
+            attrs.update(
+                cache_hit=cached is not None if key is not None else None,
+                success=result['success'],
+                exec_time=result['exec_time'],
+                cpu_time=result['cpu_time'],
+                timings=result['timings'],
+                rejected=result['rejected'].name if result['rejected'] is not None else None,
+            )
+        return result
+
+    def evaluate_candidate(self, code: str, data=None):
+        """Executa e analisa o código, consultando o cache antes de lançar qualquer subprocesso."""
+        result = self._evaluate_cached(code, data)
+        self.last_analysis = result['analysis']
+        self.last_timings = result['timings']
+        return result['success'], result['exec_time'], result['output'], result['code_score']
+
+    def evaluate_many(self, codes, data=None):
+        """Avalia vários candidatos ao mesmo tempo: execuções no pool de sandboxes e uma única
+        rodada de mypy/ruff/bandit sobre todos os candidatos que não estão no cache."""
+        codes = [strip_fences(code) for code in codes]
+        if len(codes) == 1:
+            return [self._evaluate_cached(codes[0], data)]
+        results = [self._syntax_gate(code) for code in codes]
+        keys = [self.cache.key(code, data) if self.cache is not None and result is None else None
+                for code, result in zip(codes, results)]
+        hits = [False] * len(codes)
+        for position, key in enumerate(keys):
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                results[position] = self._from_cache(cached)
+                hits[position] = True
+        misses = [position for position, result in enumerate(results) if result is None]
+
+        started = time.time()
+        with span('evaluate_batch', candidates=len(codes), cache_hits=sum(hits)) as attrs:
+            if misses:
+                analysis_timings = {}
+                with tempfile.TemporaryDirectory(prefix="rl_llm_analysis_") as scratch:
+                    # Como em _evaluate: a análise do lote começa junto com as execuções e é morta se o portão
+                    # da execução rejeitar todos os candidatos; os achados dos rejeitados são descartados
+                    batch = start_analyzers(write_candidates([codes[position] for position in misses], scratch),
+                                            self.analysis_cache_dir)
+                    try:
+                        executions = dict(zip(misses, self.pool.map(lambda position: self._execute_code(codes[position], data), misses)))
+                    except BaseException:
+                        batch.cancel()
+                        raise
+                    for result in executions.values():
+                        self.gates.observe('execution', result['timings']['run_code'])
+                        result['analysis'] = {}
+                        result['rejected'] = self.gates.check('execution', result, started=('analysis',))
+                    analyzed = [position for position in misses if executions[position]['rejected'] is None]
+                    if not analyzed:
+                        batch.cancel()
+                    else:
+                        analyses = dict(zip(misses, collect_batch(batch, timings=analysis_timings)))
+                        # As ferramentas rodaram uma vez para o lote; o custo por candidato é a fração dele
+                        self.gates.observe('analysis', max(analysis_timings.values()) / len(misses))
+                        for position in analyzed:
+                            analysis = analyses[position]
+                            result = executions[position]
+                            result['timings'].update(analysis_timings)
+                            result['analysis'] = analysis
+                            result['rejected'] = self.gates.check('analysis', result)
+                attrs['analyzer_timings'] = analysis_timings
+                for position, result in executions.items():
+                    results[position] = result
+                    if keys[position] is not None and not result['timed_out']:
+                        self.cache.put(keys[position], result['success'], result['exec_time'], result['output'], result['analysis'])
+
+        # Um span 'evaluate' por candidato mantém as contagens de cache e de CPU iguais às de _evaluate_cached
+        for hit, key, result in zip(hits, keys, results):
+            get_tracer().record('evaluate', started, result['timings'].get('run_code', 0.0),
+                                cache_hit=hit if key is not None else None,
+                                success=result['success'], exec_time=result['exec_time'],
+                                cpu_time=result['cpu_time'], timings=result['timings'],
+                                rejected=result['rejected'].name if result['rejected'] is not None else None)
+        return results
+
+    def _reward(self, code_score, report_score, gate=None):
+        # Candidato rejeitado por um portão recebe a penalidade fixa dele
+        return gate.penalty if gate is not None else self.calculate_reward(code_score, report_score)
 
     def calculate_reward(self, code_score, report_score):
         # Calcula a recompensa baseada na pontuação do código e do relatório
@@ -115,39 +293,229 @@ class Environment:
 
         logging.info(f"\n--- Treinando com o problema: {question} ---")
 
-        # Passo 1: Agente Codificador gera o código
-        code = self.programmer.act(question, training=True)
+        if self.candidates > 1:
+            with episode(), span('episode.train', candidates=self.candidates):
+                self._train_best_of(question, data)
+            get_tracer().flush()
+            return
+
+        with episode(), span('episode.train'):
+            with episode_budget(self._new_budget()):
+                code = self._generate_step(question, training=True, data=data)
+                evaluation = self._evaluate_step(code, data)
+                review = self._review_step(code, training=True, evaluation=evaluation)
+            self._update_step(code, evaluation, review)
+        get_tracer().flush()
+
+    def _train_best_of(self, question, data):
+        """Gera N candidatos do mesmo prompt, avalia todos em paralelo e revisa só os `survivors` melhores.
+
+        Todos os N alimentam a tabela Q do Programmer; os que não passaram pela revisão entram
+        com pontuação de relatório 0, já que nenhum relatório foi gerado para eles, e os
+        rejeitados por um portão recebem a penalidade dele.
+        """
+        with episode_budget(self._new_budget()):
+            with span('generation', candidates=self.candidates):
+                codes = self.programmer.act_many(question, self.candidates, training=True, data_summary=self.data_summary(data))
+            evaluations = self.evaluate_many(codes, data)
+            ranking = sorted(range(len(codes)), key=lambda i: self._rank_key(evaluations[i]), reverse=True)
+            survivors = [i for i in ranking[:self.survivors] if evaluations[i]['rejected'] is None]
+            logging.info(f"Best-of-{len(codes)}: candidatos {survivors} seguem para revisão "
+                         f"({sum(1 for evaluation in evaluations if evaluation['success'])} executaram com sucesso)")
+            reviews = {i: self._review_step(codes[i], training=True, evaluation=evaluations[i]) for i in survivors}
+
+        state = self.programmer.get_state()
+        with span('policy_update', candidates=len(codes)):
+            for i, code in enumerate(codes):
+                action, report_score, gate = reviews.get(i, (None, 0, evaluations[i]['rejected']))
+                reward = self._reward(evaluations[i]['code_score'], report_score, gate)
+                self.programmer.update_policy(state=state, action=code, reward=reward)
+                if action is not None:
+                    self.reviewer.update_policy(state=self.reviewer.get_state(stage='REVIEW'), action=action, reward=reward)
+
+        best = ranking[0]
+        self._record_metrics('train', evaluations[best]['code_score'], reviews[best][1] if best in reviews else 0)
+
+    @staticmethod
+    def _rank_key(evaluation):
+        # Execução bem-sucedida primeiro, depois a análise estática e, por fim, o menor tempo
+        return (evaluation['success'], evaluation['analysis'].get('score', 0), -evaluation['exec_time'])
+
+    def _new_budget(self):
+        if self.token_budget is None and self.time_budget is None:
+            return None
+        return Budget(max_tokens=self.token_budget, max_seconds=self.time_budget)
+
+    @staticmethod
+    def _in_episode(episode_id, budget, step, *args):
+        # As etapas de train_many rodam em outras threads; o episódio e seu orçamento vão junto
+        with episode(episode_id), episode_budget(budget):
+            return step(*args)
+
+    def _generate_step(self, question, training, data=None):
+        # Passo 1: Agente Codificador gera o código, sabendo o formato do arquivo de dados
+        data_summary = self.data_summary(data)
+        with span('generation'):
+            code = self.programmer.act(question, training=training, data_summary=data_summary)
         logging.info(f"Código Gerado:\n{code}")
-
-        # Passo 2: Executar e avaliar o código
-        success, exec_time, output = self.run_code(code)
-        code_score = self.eval_code(code)
-        logging.info(f"Execução do Código: {'Sucesso' if success else 'Falha'}, Tempo: {exec_time}, Output: {output}")
-        logging.info(f"Pontuação do Código: {code_score}")
+        return code
+
+    def _evaluate_step(self, code, data):
+        # Passo 2: Executar e avaliar o código (portões de sintaxe, execução e análise)
+        evaluation = self._evaluate_cached(code, data)
+        self.last_analysis = evaluation['analysis']
+        self.last_timings = evaluation['timings']
+        logging.info(f"Execução do Código: {'Sucesso' if evaluation['success'] else 'Falha'}, "
+                     f"Tempo: {evaluation['exec_time']}, Output: {evaluation['output']}")
+        logging.info(f"Pontuação do Código: {evaluation['code_score']}")
+        return evaluation
+
+    def _review_step(self, code, training, evaluation=None):
+        """Revisão e relatório; devolve (action, report_score, gate), com gate sendo o portão que rejeitou o candidato.
+
+        Candidatos já rejeitados na avaliação não chegam ao LLM: action é None e report_score é 0.
+        """
+        if evaluation is not None and evaluation['rejected'] is not None:
+            return None, 0, evaluation['rejected']
+        state = dict(evaluation or {})
+        if self.reviewer.combined:
+            return self._combined_review_step(code, training, state)
+
+        # Passos 3 e 4 dependem só do código: o relatório é disparado antes e gerado junto com a revisão,
+        # a não ser que um portão na revisão possa dispensá-lo
+        report_started = time.perf_counter()
+        report_request = None if self.gates.gated('review') else self.reviewer.request_report(code)
 
         # Passo 3: Agente Revisor revisa o código
-        action, review, review_score = self.reviewer.act(code, training=True)
+        with span('review') as attrs:
+            review_started = time.perf_counter()
+            action, review, review_score = self.reviewer.act(code, training=training)
+            self.gates.observe('review', time.perf_counter() - review_started)
+            if self.reviewer.memo is not None:
+                attrs['cache_hit'] = self.reviewer.last_memo['review'] is not None
         logging.info(f"Revisão:\n{review}")
         logging.info(f"Pontuação da Revisão: {review_score}")
+        state.update(review=review, review_score=review_score)
+        gate = self.gates.check('review', state)
+        if gate is not None:
+            return action, 0, gate
 
         # Passo 4: Gerar e avaliar o relatório
-        report, report_score = self.reviewer.generate_report(code)
+        if report_request is None:
+            report_started = time.perf_counter()
+            report_request = self.reviewer.request_report(code)
+        with span('report') as attrs:
+            report, report_score = self.reviewer.collect_report(report_request)
+            attrs['total_seconds'] = time.perf_counter() - report_started
+            if self.reviewer.memo is not None:
+                attrs['cache_hit'] = self.reviewer.last_memo['report'] is not None
+        self.gates.observe('report', attrs['total_seconds'])
+        logging.info(f"Relatório:\n{report}")
+        logging.info(f"Pontuação do Relatório: {report_score}")
+        state['report_score'] = report_score
+        return action, report_score, self.gates.check('report', state)
+
+    def _combined_review_step(self, code, training, state):
+        # Passos 3 e 4 numa única chamada ao LLM, com resposta em JSON
+        with span('review', combined=True) as attrs:
+            review_started = time.perf_counter()
+            action, review, review_score, report, report_score = self.reviewer.act_combined(code, training=training)
+            self.gates.observe('review', time.perf_counter() - review_started)
+            if self.reviewer.memo is not None:
+                attrs['cache_hit'] = self.reviewer.last_memo['review'] is not None and self.reviewer.last_memo['report'] is not None
+        logging.info(f"Revisão:\n{review}")
+        logging.info(f"Pontuação da Revisão: {review_score}")
         logging.info(f"Relatório:\n{report}")
         logging.info(f"Pontuação do Relatório: {report_score}")
+        state.update(review=review, review_score=review_score, report_score=report_score)
+        gate = self.gates.check('review', state)
+        if gate is not None:
+            return action, 0, gate
+        return action, report_score, self.gates.check('report', state)
+
+    def _update_step(self, code, evaluation, review):
+        action, report_score, gate = review
+        code_score = evaluation['code_score']
 
         # Passo 5: Calcular recompensa
-        reward = self.calculate_reward(code_score, report_score)
+        reward = self._reward(code_score, report_score, gate)
         logging.info(f"Recompensa Calculada: {reward}")
 
         # Passo 6: Atualizar políticas dos agentes com base na recompensa
-        self.programmer.update_policy(state=self.programmer.get_state(), action=code, reward=reward)
-        self.reviewer.update_policy(state=self.reviewer.get_state(stage='REVIEW'), action=action, reward=reward)
+        with span('policy_update', reward=reward):
+            self.programmer.update_policy(state=self.programmer.get_state(), action=code, reward=reward)
+            if action is not None:
+                self.reviewer.update_policy(state=self.reviewer.get_state(stage='REVIEW'), action=action, reward=reward)
 
         # Armazenar valores para plotagem
+        self._record_metrics('train', code_score, report_score)
+
+    def _record_metrics(self, phase, code_score, report_score):
+        programmer_q = self.programmer.get_average_q_value()
+        reviewer_q = self.reviewer.get_average_q_value()
         self.code_scores.append(code_score)
         self.report_scores.append(report_score)
-        self.programmer_q_values_history.append(self.programmer.get_average_q_value())
-        self.reviewer_q_values_history.append(self.reviewer.get_average_q_value())
+        self.programmer_q_values_history.append(programmer_q)
+        self.reviewer_q_values_history.append(reviewer_q)
+        if self.metrics is not None:
+            self.metrics.append(phase, code_score=code_score, report_score=report_score,
+                                programmer_q=programmer_q, reviewer_q=reviewer_q)
+
+    def train_many(self, problems, epochs=1, max_in_flight=2, on_epoch_end=None):
+        """Treina sobre vários problemas com os episódios em pipeline.
+
+        A geração do próximo episódio acontece enquanto o anterior é executado e revisado.
+        Programmer e Reviewer continuam agindo um episódio por vez, na ordem dos problemas,
+        e as atualizações das tabelas Q são aplicadas sempre na mesma ordem.
+
+        A política fica atrasada e o atraso não é determinístico: a ação de um episódio é escolhida
+        (nas threads de geração e de revisão) enquanto a thread principal ainda pode estar aplicando
+        as atualizações dos até max_in_flight - 1 episódios anteriores, então quais delas a escolha
+        já vê depende do tempo de cada etapa. As tabelas Q têm lock, e a escolha nunca lê uma
+        atualização pela metade. max_in_flight=1 reproduz a ordem de train. Cada agente sorteia a
+        exploração com o próprio gerador (seed no construtor).
+        """
+        episodes = [(epoch, problem) for epoch in range(epochs) for problem in problems]
+        generator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generate")
+        reviewer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="review")
+        in_flight = deque()
+        start_time = time.time()
+
+        def finish_oldest():
+            epoch, episode_id, started, code_request, evaluation, review = in_flight.popleft()
+            self._in_episode(episode_id, None, self._update_step, code_request.result(), evaluation.result(), review.result())
+            get_tracer().record('episode.train', started[0], time.perf_counter() - started[1], episode=episode_id)
+            get_tracer().flush()
+            if on_epoch_end and (not in_flight or in_flight[0][0] != epoch):
+                on_epoch_end(epoch)
+
+        try:
+            for epoch, problem in episodes:
+                if len(in_flight) >= max_in_flight:
+                    finish_oldest()
+                logging.info(f"\n--- Treinando com o problema: {problem['question']} (epoch {epoch + 1}) ---")
+                budget = self._new_budget()
+                episode_id = new_episode_id()
+                started = (time.time(), time.perf_counter())
+                code_request = generator.submit(self._in_episode, episode_id, budget, self._generate_step, problem["question"], True, problem["data"])
+                evaluation = self.pool.submit(
+                    lambda c=code_request, d=problem["data"], e=episode_id: self._in_episode(e, None, self._evaluate_step, c.result(), d))
+                # Com portões antes da revisão, ela espera a avaliação do mesmo episódio para saber se roda
+                review = reviewer.submit(
+                    lambda c=code_request, v=evaluation, b=budget, e=episode_id: self._in_episode(
+                        e, b, self._review_step, c.result(), True,
+                        v.result() if self.gates.gated('syntax', 'execution', 'analysis') else None))
+                in_flight.append((epoch, episode_id, started, code_request, evaluation, review))
+            while in_flight:
+                finish_oldest()
+        finally:
+            generator.shutdown(wait=True)
+            reviewer.shutdown(wait=True)
+
+        elapsed = time.time() - start_time
+        episodes_per_hour = len(episodes) / elapsed * 3600 if elapsed > 0 else 0.0
+        logging.info(f"{len(episodes)} episódios em {elapsed:.1f}s ({episodes_per_hour:.1f} episódios/hora)")
+        return {'episodes': len(episodes), 'elapsed': elapsed, 'episodes_per_hour': episodes_per_hour}
 
     def test(self, problem):
         question = problem["question"]
@@ -155,149 +523,96 @@ class Environment:
         metrics = problem["metrics"]
 
         logging.info(f"\n--- Testando com o problema: {question} ---")
+        with episode(), span('episode.test'):
+            self._test_episode(question, data)
+        get_tracer().flush()
+
+    def _test_episode(self, question, data):
+        budget = self._new_budget()
 
         # Passo 1: Agente Codificador gera o código
-        code = self.programmer.act(question, training=False)
-        logging.info(f"Código Gerado:\n{code}")
+        with episode_budget(budget):
+            code = self._generate_step(question, training=False, data=data)
 
         # Passo 2: Executar e avaliar o código
-        success, exec_time, output = self.run_code(code)
-        code_score = self.eval_code(code)
-        logging.info(f"Execução do Código: {'Sucesso' if success else 'Falha'}, Tempo: {exec_time}, Output: {output}")
-        logging.info(f"Pontuação do Código: {code_score}")
+        evaluation = self._evaluate_step(code, data)
 
-        # Passo 3: Agente Revisor revisa o código
-        # Aqui precisamos obter (action, review, review_score) mesmo no teste
-        action, review, review_score = self.reviewer.act(code, training=False)
-        logging.info(f"Revisão:\n{review}")
-        logging.info(f"Pontuação da Revisão: {review_score}")
-
-        # Passo 4: Gerar e avaliar o relatório
-        report, report_score = self.reviewer.generate_report(code)
-        logging.info(f"Relatório:\n{report}")
-        logging.info(f"Pontuação do Relatório: {report_score}")
+        # Passos 3 e 4: revisão e relatório, também no teste
+        with episode_budget(budget):
+            action, report_score, gate = self._review_step(code, training=False, evaluation=evaluation)
 
         # Calcular recompensa (poderíamos não precisar nessa fase, mas mantemos)
-        reward = self.calculate_reward(code_score, report_score)
+        reward = self._reward(evaluation['code_score'], report_score, gate)
         logging.info(f"Recompensa Calculada: {reward}")
 
-        # Armazenar os valores atuais nas listas de histórico
-        self.code_scores.append(code_score)
-        self.report_scores.append(report_score)
-        self.programmer_q_values_history.append(self.programmer.get_average_q_value())
-        self.reviewer_q_values_history.append(self.reviewer.get_average_q_value())
-
-        # Após o teste, gerar gráficos
-        self.plot_results()
-
-    def plot_results(self):
-        # Gera gráficos a partir das listas code_scores, report_scores, programmer_q_values_history e reviewer_q_values_history
-
-        # 1. Gráfico de pontuação do código ao longo do tempo
-        plt.figure(figsize=(10,6))
-        plt.plot(self.code_scores, label='Pontuação do Código')
-        plt.xlabel('Iterações')
-        plt.ylabel('Pontuação do Código (0 a 1)')
-        plt.title('Evolução da Pontuação do Código')
-        plt.legend()
-        plt.savefig('evolucao_codigo.png')
-        plt.close()
-
-        # 2. Gráfico de pontuação do relatório ao longo do tempo
-        plt.figure(figsize=(10,6))
-        plt.plot(self.report_scores, label='Pontuação do Relatório')
-        plt.xlabel('Iterações')
-        plt.ylabel('Pontuação do Relatório (0 a 100)')
-        plt.title('Evolução da Pontuação do Relatório')
-        plt.legend()
-        plt.savefig('evolucao_relatorio.png')
-        plt.close()
-
-        # 3. Gráfico da média da Q-table do Programmer
-        plt.figure(figsize=(10,6))
-        plt.plot(self.programmer_q_values_history, label='Média Q-table Programmer')
-        plt.xlabel('Iterações')
-        plt.ylabel('Média Q-table')
-        plt.title('Evolução da Média da Q-table do Programmer')
-        plt.legend()
-        plt.savefig('evolucao_q_programmer.png')
-        plt.close()
-
-        # 4. Gráfico da média da Q-table do Reviewer
-        plt.figure(figsize=(10,6))
-        plt.plot(self.reviewer_q_values_history, label='Média Q-table Reviewer')
-        plt.xlabel('Iterações')
-        plt.ylabel('Média Q-table')
-        plt.title('Evolução da Média da Q-table do Reviewer')
-        plt.legend()
-        plt.savefig('evolucao_q_reviewer.png')
-        plt.close()
-
-        logging.info("Gráficos salvos: evolucao_codigo.png, evolucao_relatorio.png, evolucao_q_programmer.png, evolucao_q_reviewer.png")
-
-    def create_test_cases(self, question):
-        """Create test cases based on the question."""
-        # This function should generate test inputs and expected outputs (gabarito)
-        # For demonstration, we'll define them manually
-        if "two numbers such that they add up to target" in question.lower():
-            test_cases = [
-                {
-                    "nums": [2, 7, 11, 15],
-                    "target": 9,
-                    "expected": [0, 1]
-                },
-                {
-                    "nums": [3, 2, 4],
-                    "target": 6,
-                    "expected": [1, 2]
-                },
-                {
-                    "nums": [3, 3],
-                    "target": 6,
-                    "expected": [0, 1]
-                }
-            ]
-            return test_cases
-        # Add more problem types as needed
-        else:
-            return []
+        # Armazenar os valores atuais no histórico; os gráficos são gerados sob demanda (plot_results)
+        self._record_metrics('test', evaluation['code_score'], report_score)
 
-    def evaluate_tests(self, code: str, test_cases: list):
-        """Evaluate the code against the test cases."""
-        # Save the code to a temporary file
-        code = re.sub(r"```python|```", "", code).strip()
-        temp_file_path = "temp_code.py"
-
-        with open(temp_file_path, "w", encoding="utf-8") as temp_file:
-            temp_file.write(code)
+    def plot_results(self, directory=".", max_points=2000):
+        """Gera os gráficos de evolução a partir do histórico gravado (ou das listas em memória).
 
-        all_passed = True
-        for test in test_cases:
-            nums = test['nums']
-            target = test['target']
-            expected = test['expected']
-
-            try:
-                result = subprocess.run(
-                    ["python", temp_file_path],
-                    input=json.dumps({"nums": nums, "target": target}),
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode != 0:
-                    all_passed = False
-                    break
-                output = json.loads(result.stdout)
-                if sorted(output) != sorted(expected):
-                    all_passed = False
-                    break
-            except Exception as e:
-                all_passed = False
-                break
-
-        os.remove(temp_file_path)
-        return all_passed
+        Históricos longos são reduzidos a `max_points` janelas com média, mínimo e máximo.
+        """
+        with span('plot'):
+            if self.metrics is not None:
+                columns = self.metrics.columns()
+            else:
+                columns = {
+                    'code_score': list(self.code_scores),
+                    'report_score': list(self.report_scores),
+                    'programmer_q': list(self.programmer_q_values_history),
+                    'reviewer_q': list(self.reviewer_q_values_history),
+                }
+            return render(columns, directory, max_points)
+
+    def create_test_cases(self, problem):
+        """Especificação de testes do problema (dict de `problems` ou a pergunta), vinda de problem_specs."""
+        return spec_for(problem)
+
+    def run_tests(self, code: str, spec: dict, data=None, case_timeout=10):
+        """Roda todos os casos da especificação num único processo, dentro da sandbox do candidato."""
+        code = strip_fences(code)
+        request = {
+            'mode': spec['mode'],
+            'compare': spec.get('compare', 'exact'),
+            'entry': spec.get('entry'),
+            'cases': spec['cases'],
+            'case_timeout': spec.get('case_timeout', case_timeout),
+        }
+        # Carregar o candidato conta como mais um caso no prazo do processo
+        timeout = request['case_timeout'] * (len(spec['cases']) + 1)
+        with span('tests') as attrs, Sandbox(code, data, self.sandbox_limits, executor=self.executor, extra_data=self._columnar_copies(data)) as sandbox:
+            sandbox.add_file(CASE_RUNNER)
+            request['filename'] = sandbox.filename
+            success, exec_time, output = sandbox.run(timeout=timeout, input=json.dumps(request),
+                                                     script=os.path.basename(CASE_RUNNER))
+            cases = None
+            if success:
+                lines = [line for line in output.splitlines() if line.startswith(RESULTS_MARKER)]
+                if lines:
+                    cases = json.loads(lines[-1][len(RESULTS_MARKER):])
+            if cases is None:
+                logging.error(f"Falha ao rodar os casos de teste: {output}")
+                cases = [{'name': case.get('name'), 'passed': False, 'error': output} for case in spec['cases']]
+            passed = sum(1 for case in cases if case['passed'])
+            attrs.update(passed=passed, total=len(cases), exec_time=exec_time, cpu_time=sandbox.last_cpu_time)
+        logging.info(f"Casos de teste: {passed}/{len(cases)} aprovados")
+        return {'passed': passed, 'total': len(cases), 'exec_time': exec_time, 'cases': cases}
+
+    def evaluate_tests(self, code: str, test_cases, data=None):
+        """Evaluate the code against the test cases."""
+        if isinstance(test_cases, list):
+            # Formato antigo: lista de {'nums', 'target', 'expected'} lida do stdin
+            test_cases = {
+                'mode': 'stdio',
+                'compare': 'sorted',
+                'cases': [{'input': {'nums': test['nums'], 'target': test['target']}, 'expected': test['expected']}
+                          for test in test_cases],
+            }
+        if not test_cases or not test_cases['cases']:
+            return True
+        result = self.run_tests(code, test_cases, data)
+        return result['passed'] == result['total']
 
 if __name__ == '__main__':
 
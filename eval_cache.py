@@ -0,0 +1,151 @@
+# eval_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from code_norm import strip_fences
+
+
+def normalize_code(code):
+    """Remove cercas de markdown e espaços irrelevantes para que o mesmo programa gere a mesma chave."""
+    lines = [line.rstrip() for line in strip_fences(code).splitlines()]
+    return "\n".join(lines)
+
+
+class EvalCache:
+    """Cache persistente (SQLite) dos resultados de execução e análise estática dos candidatos.
+
+    Sucessos valem desde a primeira execução. Uma falha só é servida do cache depois de se repetir
+    `failure_runs` vezes seguidas, para que um erro ocasional (disco, memória, rede) não fique
+    gravado para sempre; tempos limite nem chegam aqui (ver Environment._evaluate_cached).
+    """
+
+    def __init__(self, path=os.path.join(".cache", "eval_cache.sqlite"), max_bytes=64 * 1024 * 1024, failure_runs=2):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.failure_runs = failure_runs
+        self.hits = 0
+        self.misses = 0
+        self._file_hashes = {}
+        self._lock = threading.Lock()  # a conexão é compartilhada pelos workers do SandboxPool
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " success INTEGER NOT NULL,"
+            " exec_time REAL NOT NULL,"
+            " output TEXT NOT NULL,"
+            " analysis TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " runs INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        if 'runs' not in columns:
+            # Caches criados antes da contagem: as falhas já gravadas precisam se repetir mais uma vez
+            self.conn.execute("ALTER TABLE results ADD COLUMN runs INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self.conn.commit()
+
+    def _data_hash(self, data):
+        # Hash do arquivo de dados do problema, recalculado apenas quando o arquivo muda
+        if not data or not os.path.isfile(data):
+            return hashlib.sha256(str(data).encode("utf-8")).hexdigest()
+        stat = os.stat(data)
+        cached = self._file_hashes.get(data)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self._file_hashes[data] = ((stat.st_mtime_ns, stat.st_size), digest.hexdigest())
+        return digest.hexdigest()
+
+    def key(self, code, data=None):
+        with self._lock:
+            data_hash = self._data_hash(data)
+        digest = hashlib.sha256(normalize_code(code).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(data_hash.encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        row = self.conn.execute(
+            "SELECT success, exec_time, output, analysis, runs FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (not row[0] and row[4] < self.failure_runs):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        success, exec_time, output, analysis, _ = row
+        return {
+            'success': bool(success),
+            'exec_time': exec_time,
+            'output': output,
+            'analysis': json.loads(analysis),
+        }
+
+    def put(self, key, success, exec_time, output, analysis):
+        with self._lock:
+            self._put(key, success, exec_time, output, analysis)
+
+    def _put(self, key, success, exec_time, output, analysis):
+        analysis_text = json.dumps(analysis)
+        size = len(key) + len(output.encode("utf-8")) + len(analysis_text) + 32
+        runs = 1
+        if not success:
+            # Falhas seguidas do mesmo código são contadas; um sucesso no meio zera a contagem
+            previous = self.conn.execute("SELECT success, runs FROM results WHERE key = ?", (key,)).fetchone()
+            if previous is not None and not previous[0]:
+                runs = previous[1] + 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, success, exec_time, output, analysis, size, last_access, runs)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, int(success), exec_time, output, analysis_text, size, time.time(), runs),
+        )
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        # Remove as entradas menos recentemente usadas até caber em max_bytes
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        logging.info(f"Cache de avaliação: {removed} entradas removidas (LRU).")
+
+    def stats(self):
+        with self._lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': total,
+        }
+
+    def close(self):
+        self.conn.close()
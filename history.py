@@ -0,0 +1,166 @@
+# history.py
+
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+
+_INDEX_ENTRY = struct.Struct("<QI")  # (posição no arquivo de dados, tamanho comprimido)
+
+
+def archive_path(history_dir, agent, name):
+    return os.path.join(history_dir, agent, name) if history_dir else None
+
+
+class HistoryArchive:
+    """Arquivo só de acréscimo com registros JSON comprimidos e um índice de tamanho fixo.
+
+    `<nome>.zlog` guarda os registros (zlib), `<nome>.idx` guarda posição e tamanho de cada um;
+    o acesso por posição lê só o registro pedido, e a iteração é preguiçosa.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data_path = path + ".zlog"
+        self.index_path = path + ".idx"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._count = self._repair()
+
+    def _repair(self):
+        # O registro é gravado antes da entrada do índice: uma queda no meio deixa só bytes sobrando no fim
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        count = index_size // _INDEX_ENTRY.size
+        end = 0
+        if count:
+            with open(self.index_path, "rb") as f:
+                f.seek((count - 1) * _INDEX_ENTRY.size)
+                offset, length = _INDEX_ENTRY.unpack(f.read(_INDEX_ENTRY.size))
+            end = offset + length
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        if index_size > count * _INDEX_ENTRY.size or data_size > end:
+            for path, size in ((self.index_path, count * _INDEX_ENTRY.size), (self.data_path, end)):
+                if os.path.exists(path):
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+            logging.warning(f"Registro incompleto removido de {self.data_path}")
+        return count
+
+    def append(self, item):
+        blob = zlib.compress(json.dumps(item, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock:
+            with open(self.data_path, "ab") as data:
+                offset = data.tell()
+                data.write(blob)
+            with open(self.index_path, "ab") as index:
+                index.write(_INDEX_ENTRY.pack(offset, len(blob)))
+            self._count += 1
+
+    def _read(self, data, offset, length):
+        data.seek(offset)
+        return json.loads(zlib.decompress(data.read(length)).decode("utf-8"))
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        with open(self.index_path, "rb") as index, open(self.data_path, "rb") as data:
+            index.seek(position * _INDEX_ENTRY.size)
+            return self._read(data, *_INDEX_ENTRY.unpack(index.read(_INDEX_ENTRY.size)))
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, start):
+        """Registros a partir da posição `start`, lidos sob demanda."""
+        count = self._count
+        if start >= count:
+            return
+        with open(self.index_path, "rb") as index, open(self.data_path, "rb") as data:
+            index.seek(start * _INDEX_ENTRY.size)
+            for _ in range(start, count):
+                yield self._read(data, *_INDEX_ENTRY.unpack(index.read(_INDEX_ENTRY.size)))
+
+    def __len__(self):
+        return self._count
+
+
+class BoundedHistory:
+    """Histórico com as últimas `maxlen` entradas em memória; as mais antigas vão para o HistoryArchive.
+
+    len(), a indexação e a iteração veem as mesmas entradas: todas as desta execução com arquivo,
+    só as `maxlen` mais recentes sem ele (as antigas são descartadas). `count` é o total já
+    acrescentado, com ou sem arquivo; iter_all() inclui também as execuções anteriores do arquivo.
+    """
+
+    def __init__(self, maxlen=10, archive_path=None):
+        self.maxlen = maxlen
+        self.archive_path = archive_path
+        self.recent = deque(maxlen=maxlen)
+        self.count = 0
+        self._archive = None
+
+    @property
+    def archive(self):
+        if self._archive is None and self.archive_path:
+            self._archive = HistoryArchive(self.archive_path)
+        return self._archive
+
+    def append(self, item):
+        if len(self.recent) == self.maxlen and self.archive is not None:
+            self.archive.append(self.recent[0])
+        self.recent.append(item)
+        self.count += 1
+
+    def _archived(self):
+        # Entradas desta execução que já saíram da memória para o arquivo
+        return self.count - len(self.recent) if self.archive_path else 0
+
+    def __getitem__(self, position):
+        size = len(self)
+        if position < 0:
+            position += size
+        if not 0 <= position < size:
+            raise IndexError(position)
+        archived = self._archived()
+        if position >= archived:
+            return self.recent[position - archived]
+        # O arquivo pode ter entradas de execuções anteriores antes das desta
+        return self.archive[len(self.archive) - archived + position]
+
+    def __len__(self):
+        return self._archived() + len(self.recent)
+
+    def __iter__(self):
+        archived = self._archived()
+        if archived:
+            yield from self.archive.iter_from(len(self.archive) - archived)
+        yield from list(self.recent)
+
+    def iter_all(self):
+        if self.archive is not None:
+            yield from self.archive
+        yield from self.recent
+
+    def clear(self):
+        # Descarta só a memória; o arquivo em disco é só de acréscimo
+        self.recent.clear()
+        self.count = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_archive'] = None
+        return state
+
+    @classmethod
+    def from_list(cls, items, maxlen=10, archive_path=None):
+        history = cls(maxlen, archive_path)
+        for item in items:
+            history.append(item)
+        return history
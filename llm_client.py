@@ -0,0 +1,305 @@
+# llm_client.py
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import random
+import threading
+import time
+import logging
+
+from tracing import trace_llm_request
+
+# ollama e httpx só são importados quando o primeiro cliente abre conexão (ver LLMClient._setup)
+
+DEFAULT_HOST = 'http://localhost:11434'
+
+# Variáveis de ambiente lidas por client_config() ao construir o cliente compartilhado
+ENV_CONFIG = {
+    'RL_LLM_MODE': 'mode',
+    'RL_LLM_HOST': 'host',  # Aceita vários hosts separados por vírgula
+    'RL_LLM_STORE': 'store_path',
+    'RL_LLM_MISS_POLICY': 'miss_policy',
+    'RL_LLM_MAX_CONCURRENCY': 'max_concurrency',
+    'RL_LLM_MAX_CONNECTIONS': 'max_connections',
+    'RL_LLM_MAX_RETRIES': 'max_retries',
+}
+INT_OPTIONS = ('max_concurrency', 'max_connections', 'max_retries')
+STOP_TRIGGERS = '}>'
+
+_current_budget = contextvars.ContextVar('llm_budget', default=None)
+
+
+class Budget:
+    """Orçamento de tokens e de tempo de um episódio, somado entre todas as chamadas ao LLM."""
+
+    def __init__(self, max_tokens=None, max_seconds=None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.tokens_used = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, tokens):
+        with self._lock:
+            self.tokens_used += tokens
+
+    def remaining_tokens(self):
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.tokens_used)
+
+    def expired(self):
+        return self.max_seconds is not None and time.monotonic() - self.started >= self.max_seconds
+
+    def exhausted(self):
+        return self.remaining_tokens() == 0 or self.expired()
+
+
+@contextlib.contextmanager
+def episode_budget(budget):
+    """Associa o orçamento às chamadas ao LLM feitas nesta thread dentro do bloco."""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def _is_transient(error):
+    import httpx
+    from ollama import ResponseError
+
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, ResponseError) and error.status_code >= 500
+
+
+def backoff_delay(attempt, base, cap):
+    """Espera antes da tentativa `attempt` (0 = primeira repetição): exponencial limitada, com jitter."""
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _response(model, content, done_reason):
+    return {
+        'model': model,
+        'message': {'role': 'assistant', 'content': content},
+        'done': True,
+        'done_reason': done_reason,
+    }
+
+
+class LLMClient:
+    """Cliente assíncrono do Ollama compartilhado pelos agentes.
+
+    Mantém um pool de conexões keep-alive e limita o número de requisições simultâneas.
+    As chamadas rodam num event loop próprio, em uma thread de fundo, para que o código
+    síncrono dos agentes possa disparar várias requisições e esperar por elas depois.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, max_concurrency=4, max_connections=8, keepalive_expiry=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_cap=8.0):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._transport = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+        return self._loop
+
+    async def _setup(self):
+        # O AsyncClient e o semáforo precisam ser criados dentro do loop que os usa
+        import httpx
+        from ollama import AsyncClient
+
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        # O pool de conexões é nosso: o AsyncClient do ollama só o recebe, e close() o fecha
+        self._transport = httpx.AsyncHTTPTransport(limits=limits)
+        self._client = AsyncClient(host=self.host, transport=self._transport)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def achat(self, model, messages, stop_when=None, budget=None, role=None, **kwargs):
+        """Chama /api/chat em streaming.
+
+        Só repete a chamada em falhas de transporte (ou 5xx do servidor), com backoff
+        exponencial limitado. Uma geração que termina por tamanho não é descartada.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._stream_chat(model, messages, stop_when, budget, **kwargs)
+            except Exception as e:
+                if not _is_transient(e) or attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                logging.warning(f"Falha de transporte no LLM ({e}); nova tentativa em {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def _stream_chat(self, model, messages, stop_when, budget, options=None, **kwargs):
+        if budget is not None and budget.exhausted():
+            logging.warning("Orçamento do episódio esgotado; chamada ao LLM ignorada.")
+            return _response(model, "", 'budget')
+
+        options = dict(options or {})
+        remaining = budget.remaining_tokens() if budget is not None else None
+        if remaining is not None:
+            options['num_predict'] = min(options.get('num_predict', remaining), remaining)
+
+        parts = []
+        tokens = 0
+        last = {}
+        done_reason = None
+        async with self._semaphore:
+            stream = await self._client.chat(model=model, messages=messages, stream=True, options=options, **kwargs)
+            try:
+                async for chunk in stream:
+                    piece = chunk['message']['content']
+                    parts.append(piece)
+                    tokens += 1
+                    last = chunk
+                    if chunk.get('done'):
+                        # Último chunk: o laço termina sozinho, e a resposta lida até o fim devolve a conexão ao pool
+                        done_reason = chunk.get('done_reason')
+                        continue
+                    # O predicado só é avaliado quando chega um fechamento de '}' ou '>'
+                    if stop_when is not None and any(c in piece for c in STOP_TRIGGERS) and stop_when("".join(parts)):
+                        done_reason = 'early_stop'
+                        break
+                    if budget is not None and budget.expired():
+                        done_reason = 'budget'
+                        break
+            finally:
+                # Fechar o stream encerra a conexão, e o Ollama para de gerar
+                await stream.aclose()
+
+        if budget is not None:
+            if last.get('done'):
+                budget.consume(last.get('prompt_eval_count', 0) + last.get('eval_count', 0))
+            else:
+                budget.consume(tokens)
+        response = _response(model, "".join(parts), done_reason)
+        if last.get('done'):
+            response.update({key: value for key, value in last.items() if key not in response})
+        else:
+            # Interrompida antes do fim: o Ollama não envia os contadores, cada chunk é ~1 token
+            response['eval_count'] = tokens
+        return response
+
+    def submit(self, model, messages, stop_when=None, role=None, **kwargs):
+        """Dispara a chamada sem bloquear e devolve um concurrent.futures.Future com a resposta."""
+        loop = self._ensure_loop()
+        coroutine = self.achat(model, messages, stop_when=stop_when, budget=_current_budget.get(), role=role, **kwargs)
+        return trace_llm_request(asyncio.run_coroutine_threadsafe(coroutine, loop), role, model)
+
+    def chat(self, model, messages, stop_when=None, role=None, **kwargs):
+        return self.submit(model, messages, stop_when=stop_when, role=role, **kwargs).result()
+
+    async def _shutdown(self):
+        await self._transport.aclose()
+        # Finaliza os geradores de streams interrompidos antes que o loop pare
+        await self._loop.shutdown_asyncgens()
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+        logging.info("Cliente LLM encerrado.")
+
+
+_shared_client = None
+_shared_config = {}
+_shared_lock = threading.Lock()
+
+
+def client_config(**overrides):
+    """Configuração do cliente compartilhado: variáveis RL_LLM_* (ou OLLAMA_HOST), depois configure_client, depois overrides."""
+    config = {}
+    if os.environ.get('OLLAMA_HOST'):
+        config['host'] = os.environ['OLLAMA_HOST']
+    for variable, option in ENV_CONFIG.items():
+        value = os.environ.get(variable)
+        if value:
+            config[option] = int(value) if option in INT_OPTIONS else value
+    config.update(_shared_config)
+    config.update(overrides)
+    return config
+
+
+def configure_client(**config):
+    """Define as opções de make_client usadas pelo cliente compartilhado; um cliente já criado é descartado."""
+    global _shared_client
+    with _shared_lock:
+        _shared_config.clear()
+        _shared_config.update(config)
+        previous, _shared_client = _shared_client, None
+    if previous is not None:
+        previous.close()
+
+
+def get_client():
+    """Devolve o cliente compartilhado por Programmer, Reviewer e PromptMaster, criado no primeiro uso."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = make_client(**client_config())
+        return _shared_client
+
+
+def _live_client(host, **kwargs):
+    # Vários hosts (lista ou "http://a:11434,http://b:11434") viram um SchedulingClient
+    hosts = [h.strip() for h in host.split(",")] if isinstance(host, str) else list(host)
+    hosts = [h for h in hosts if h]
+    if len(hosts) > 1:
+        from llm_scheduler import SchedulingClient
+        return SchedulingClient(hosts, **kwargs)
+    return LLMClient(host=hosts[0] if hosts else DEFAULT_HOST, **kwargs)
+
+
+def make_client(mode='live', host=DEFAULT_HOST, store_path=None, miss_policy='error', **kwargs):
+    """Cria o backend de LLM: 'live' (Ollama), 'record' (Ollama + gravação) ou 'replay' (só o que foi gravado).
+
+    `host` pode ser uma lista de servidores Ollama; os pedidos são então distribuídos entre eles (llm_scheduler).
+    """
+    if mode == 'live':
+        return _live_client(host, **kwargs)
+
+    from llm_replay import LLMStore, RecordingClient, ReplayClient
+    store = LLMStore(store_path) if store_path else LLMStore()
+    if mode == 'record':
+        return RecordingClient(_live_client(host, **kwargs), store)
+    if mode == 'replay':
+        fallback = _live_client(host, **kwargs) if miss_policy == 'fallthrough' else None
+        return ReplayClient(store, miss_policy=miss_policy, fallback=fallback)
+    raise ValueError(f"Modo de cliente LLM desconhecido: {mode}")
+
+
+def set_client(client):
+    """Substitui o cliente compartilhado (por exemplo, apontando para um servidor de teste)."""
+    global _shared_client
+    with _shared_lock:
+        _shared_client = client
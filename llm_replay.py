@@ -0,0 +1,172 @@
+# llm_replay.py
+
+import difflib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import Future
+
+from tracing import trace_llm_request
+
+MISS_POLICIES = ('error', 'nearest', 'fallthrough')
+
+
+class ReplayMiss(KeyError):
+    """Nenhuma resposta gravada para a chamada pedida."""
+
+
+def _prompt_text(messages):
+    return "\n".join(message.get('content', '') for message in messages)
+
+
+class LLMStore:
+    """Armazena pares (role, model, messages, options) -> resposta em SQLite, com o JSON comprimido."""
+
+    def __init__(self, path=os.path.join(".cache", "llm_store.sqlite")):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " role TEXT,"
+            " model TEXT NOT NULL,"
+            " prompt BLOB NOT NULL,"
+            " response BLOB NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_role_model ON responses (role, model)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(role, model, messages, options):
+        payload = json.dumps([role, model, messages, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def put(self, role, model, messages, options, response):
+        key = self.key(role, model, messages, options)
+        prompt = zlib.compress(_prompt_text(messages).encode("utf-8"))
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, role, model, prompt, response) VALUES (?, ?, ?, ?, ?)",
+                (key, role, model, prompt, blob),
+            )
+            self.conn.commit()
+
+    def get(self, role, model, messages, options):
+        key = self.key(role, model, messages, options)
+        with self._lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def nearest(self, role, model, messages):
+        """Resposta gravada cujo prompt mais se parece com o pedido, para o mesmo role e modelo."""
+        target = _prompt_text(messages)
+        best_ratio, best = 0.0, None
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT prompt, response FROM responses WHERE role IS ? AND model = ?", (role, model)
+            ).fetchall()
+        for prompt, response in rows:
+            matcher = difflib.SequenceMatcher(None, target, zlib.decompress(prompt).decode("utf-8"), autojunk=False)
+            if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best_ratio, best = ratio, response
+        if best is None:
+            return None
+        return json.loads(zlib.decompress(best))
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def _call_options(kwargs):
+    # stop_when é um callable local e não faz parte da identidade da chamada
+    return {key: value for key, value in kwargs.items() if key != 'stop_when'}
+
+
+class RecordingClient:
+    """Repassa as chamadas para outro cliente e grava cada resposta no LLMStore."""
+
+    def __init__(self, client, store):
+        self.client = client
+        self.store = store
+
+    def submit(self, model, messages, role=None, **kwargs):
+        request = self.client.submit(model, messages, role=role, **kwargs)
+        options = _call_options(kwargs)
+
+        def record(done):
+            if done.exception() is None:
+                self.store.put(role, model, messages, options, done.result())
+
+        request.add_done_callback(record)
+        return request
+
+    def chat(self, model, messages, role=None, **kwargs):
+        return self.submit(model, messages, role=role, **kwargs).result()
+
+    def close(self):
+        self.client.close()
+
+
+class ReplayClient:
+    """Serve respostas gravadas sem acessar nenhum servidor.
+
+    miss_policy define o que fazer quando a chamada não foi gravada: 'error' levanta ReplayMiss,
+    'nearest' devolve a resposta com o prompt mais parecido e 'fallthrough' chama o cliente
+    ao vivo (gravando a resposta nova).
+    """
+
+    def __init__(self, store, miss_policy='error', fallback=None):
+        if miss_policy not in MISS_POLICIES:
+            raise ValueError(f"miss_policy deve ser um de {MISS_POLICIES}")
+        if miss_policy == 'fallthrough' and fallback is None:
+            raise ValueError("miss_policy 'fallthrough' precisa de um cliente de fallback")
+        self.store = store
+        self.miss_policy = miss_policy
+        self.fallback = RecordingClient(fallback, store) if fallback is not None else None
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, model, messages, role=None, **kwargs):
+        response = self.store.get(role, model, messages, _call_options(kwargs))
+        if response is None:
+            self.misses += 1
+            if self.miss_policy == 'fallthrough':
+                return self.fallback.submit(model, messages, role=role, **kwargs)
+            if self.miss_policy == 'nearest':
+                response = self.store.nearest(role, model, messages)
+            if response is None:
+                logging.error(f"Nenhuma resposta gravada para a chamada do papel '{role}'.")
+                future = Future()
+                future.set_exception(ReplayMiss(role))
+                return trace_llm_request(future, role, model, cache_hit=False)
+        else:
+            self.hits += 1
+        future = Future()
+        future.set_result(response)
+        return trace_llm_request(future, role, model, cache_hit=True)
+
+    def chat(self, model, messages, role=None, **kwargs):
+        return self.submit(model, messages, role=role, **kwargs).result()
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+        self.store.close()
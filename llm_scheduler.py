@@ -0,0 +1,196 @@
+# llm_scheduler.py
+"""Distribui as chamadas dos agentes entre vários servidores Ollama.
+
+Cada pedido vai para o endpoint com o menor tempo de espera estimado, (em andamento + 1) / tokens por
+segundo observados. Um papel (programmer, reviewer, ...) continua no endpoint que usou por último
+enquanto ele não estiver muito pior que o melhor, para aproveitar o cache de prefixo do servidor.
+Falhas de transporte (ou 5xx) tiram o endpoint de circulação por um tempo crescente, e o pedido é
+refeito em outro endpoint depois de um backoff com jitter (o mesmo do LLMClient); se nenhum
+endpoint estiver disponível, a nova tentativa espera o primeiro sair da pausa.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from llm_client import LLMClient, _is_transient, backoff_delay
+
+
+class Endpoint:
+    def __init__(self, host, client):
+        self.host = host
+        self.client = client
+        self.in_flight = 0
+        self.tokens_per_second = None  # Média móvel exponencial; None até a primeira resposta
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+    def expected_wait(self, default_speed):
+        return (self.in_flight + 1) / (self.tokens_per_second or default_speed)
+
+
+class SchedulingClient:
+    """Mesma interface de LLMClient (submit/chat/close), sobre uma lista de hosts."""
+
+    def __init__(self, hosts, affinity_slack=0.5, cooldown=5.0, max_cooldown=120.0, smoothing=0.3,
+                 max_retries=3, **client_kwargs):
+        if not hosts:
+            raise ValueError("SchedulingClient precisa de pelo menos um host")
+        # As novas tentativas são feitas em outros endpoints; cada cliente falha logo
+        client_kwargs['max_retries'] = 0
+        self.endpoints = [Endpoint(host, LLMClient(host=host, **client_kwargs)) for host in hosts]
+        self.backoff_base = self.endpoints[0].client.backoff_base
+        self.backoff_cap = self.endpoints[0].client.backoff_cap
+        self.affinity_slack = affinity_slack  # Quanto o endpoint do papel pode ser pior que o melhor e continuar
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.smoothing = smoothing
+        self.max_retries = max_retries
+        self.affinity = {}  # papel -> último endpoint usado
+        self._lock = threading.Lock()
+        self._pending = {}  # Novas tentativas agendadas (timer -> Future do pedido), canceladas em close()
+        self._closed = False
+
+    def _choose(self, role, exclude):
+        now = time.monotonic()
+        # Prefere endpoints ainda não tentados neste pedido, mas um já tentado e saudável vem antes de um em pausa
+        healthy = ([endpoint for endpoint in self.endpoints if endpoint not in exclude and endpoint.healthy(now)]
+                   or [endpoint for endpoint in self.endpoints if endpoint.healthy(now)])
+        if not healthy:
+            # Nenhum disponível: tenta o que volta primeiro (a nova tentativa já esperou por ele, ver _retry_delay)
+            return min(self.endpoints, key=lambda endpoint: endpoint.unhealthy_until)
+        speeds = [endpoint.tokens_per_second for endpoint in self.endpoints if endpoint.tokens_per_second]
+        default_speed = sum(speeds) / len(speeds) if speeds else 1.0
+        best = min(healthy, key=lambda endpoint: endpoint.expected_wait(default_speed))
+        preferred = self.affinity.get(role)
+        if (preferred in healthy and preferred is not best
+                and preferred.expected_wait(default_speed) <= best.expected_wait(default_speed) * (1 + self.affinity_slack)):
+            return preferred
+        return best
+
+    def submit(self, model, messages, stop_when=None, role=None, **kwargs):
+        """Dispara a chamada no endpoint escolhido e devolve um concurrent.futures.Future com a resposta."""
+        result = Future()
+        # Orçamento e episódio (contextvars) valem também para as novas tentativas, feitas em outra thread
+        context = contextvars.copy_context()
+        self._attempt(result, context, set(), 0, model, messages, stop_when, role, kwargs)
+        return result
+
+    def _retry_delay(self, attempt):
+        # Backoff com jitter; sem endpoint disponível, espera pelo menos até o primeiro voltar
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+        now = time.monotonic()
+        with self._lock:
+            if not any(endpoint.healthy(now) for endpoint in self.endpoints):
+                delay = max(delay, min(endpoint.unhealthy_until for endpoint in self.endpoints) - now)
+        return delay
+
+    def _schedule(self, delay, result, *args):
+        def run():
+            with self._lock:
+                self._pending.pop(timer, None)
+                closed = self._closed
+            if closed:
+                result.set_exception(RuntimeError("SchedulingClient encerrado"))
+            else:
+                self._attempt(result, *args)
+
+        timer = threading.Timer(delay, run)
+        timer.daemon = True
+        with self._lock:
+            if self._closed:
+                result.set_exception(RuntimeError("SchedulingClient encerrado"))
+                return
+            self._pending[timer] = result
+        timer.start()
+
+    def _attempt(self, result, context, tried, attempt, model, messages, stop_when, role, kwargs):
+        with self._lock:
+            endpoint = self._choose(role, tried)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            if role is not None:
+                self.affinity[role] = endpoint
+        tried.add(endpoint)
+        started = time.perf_counter()
+        try:
+            request = context.copy().run(endpoint.client.submit, model, messages, stop_when=stop_when, role=role, **kwargs)
+        except Exception as e:
+            with self._lock:
+                endpoint.in_flight -= 1
+            result.set_exception(e)
+            return
+
+        def done(request):
+            error = request.exception()
+            with self._lock:
+                endpoint.in_flight -= 1
+                if error is None:
+                    self._observe(endpoint, request.result(), time.perf_counter() - started)
+                elif _is_transient(error):
+                    self._mark_unhealthy(endpoint, error)
+            if error is None:
+                result.set_result(request.result())
+            elif _is_transient(error) and attempt < self.max_retries:
+                delay = self._retry_delay(attempt)
+                logging.warning(f"Falha no endpoint {endpoint.host} ({error}); refazendo o pedido em outro endpoint em {delay:.1f}s.")
+                self._schedule(delay, result, context, tried, attempt + 1, model, messages, stop_when, role, kwargs)
+            else:
+                result.set_exception(error)
+
+        request.add_done_callback(done)
+
+    def _observe(self, endpoint, response, elapsed):
+        endpoint.consecutive_failures = 0
+        endpoint.unhealthy_until = 0.0
+        tokens = response.get('eval_count')
+        seconds = (response.get('eval_duration') or 0) / 1e9 or elapsed
+        if not tokens or seconds <= 0:
+            return
+        speed = tokens / seconds
+        if endpoint.tokens_per_second is None:
+            endpoint.tokens_per_second = speed
+        else:
+            endpoint.tokens_per_second += self.smoothing * (speed - endpoint.tokens_per_second)
+
+    def _mark_unhealthy(self, endpoint, error):
+        endpoint.failures += 1
+        if not endpoint.healthy(time.monotonic()):
+            return  # Pedidos que já estavam em andamento quando o endpoint caiu não aumentam a pausa
+        endpoint.consecutive_failures += 1
+        pause = min(self.max_cooldown, self.cooldown * 2 ** (endpoint.consecutive_failures - 1))
+        endpoint.unhealthy_until = time.monotonic() + pause
+        logging.warning(f"Endpoint {endpoint.host} fora de circulação por {pause:.0f}s: {error}")
+
+    def chat(self, model, messages, stop_when=None, role=None, **kwargs):
+        return self.submit(model, messages, stop_when=stop_when, role=role, **kwargs).result()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'host': endpoint.host,
+                'healthy': endpoint.healthy(now),
+                'in_flight': endpoint.in_flight,
+                'tokens_per_second': endpoint.tokens_per_second,
+                'requests': endpoint.requests,
+                'failures': endpoint.failures,
+            } for endpoint in self.endpoints]
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for timer, result in pending.items():
+            timer.cancel()
+            if not result.done():
+                result.set_exception(RuntimeError("SchedulingClient encerrado"))
+        for endpoint in self.endpoints:
+            endpoint.client.close()
@@ -0,0 +1,163 @@
+# metrics_log.py
+"""Métricas de treino/teste gravadas em colunas (um arquivo float64 por métrica) e gráficos sob demanda.
+
+Cada execução grava num subdiretório próprio (data, hora e pid), para que os gráficos de uma
+execução não misturem as anteriores; resume=True continua a execução mais recente.
+
+    python metrics_log.py .cache/metrics --output graficos/            # execução mais recente
+    python metrics_log.py .cache/metrics --run 20240101-120000-4242
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_METRICS_DIR = os.path.join(".cache", "metrics")
+
+COLUMNS = ('phase', 'code_score', 'report_score', 'programmer_q', 'reviewer_q')
+PHASES = {'train': 0.0, 'test': 1.0}
+
+# (coluna, arquivo, rótulo, eixo y, título) — os mesmos gráficos que Environment.plot_results sempre gerou
+PLOTS = (
+    ('code_score', 'evolucao_codigo.png', 'Pontuação do Código', 'Pontuação do Código (0 a 1)',
+     'Evolução da Pontuação do Código'),
+    ('report_score', 'evolucao_relatorio.png', 'Pontuação do Relatório', 'Pontuação do Relatório (0 a 100)',
+     'Evolução da Pontuação do Relatório'),
+    ('programmer_q', 'evolucao_q_programmer.png', 'Média Q-table Programmer', 'Média Q-table',
+     'Evolução da Média da Q-table do Programmer'),
+    ('reviewer_q', 'evolucao_q_reviewer.png', 'Média Q-table Reviewer', 'Média Q-table',
+     'Evolução da Média da Q-table do Reviewer'),
+)
+
+
+def runs(directory):
+    """Execuções gravadas em `directory`, da mais antiga para a mais recente."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+
+def _new_run(directory):
+    # Data, hora e pid; um sufixo separa execuções criadas no mesmo segundo pelo mesmo processo
+    base = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    run, suffix = base, 1
+    while os.path.exists(os.path.join(directory, run)):
+        suffix += 1
+        run = f"{base}-{suffix}"
+    return run
+
+
+class MetricsLog:
+    """Log de métricas só de acréscimo: cada coluna é um arquivo binário de float64.
+
+    Acrescentar uma iteração escreve 8 bytes por coluna; a leitura usa np.fromfile,
+    então carregar dezenas de milhares de iterações não passa por nenhum parser.
+    """
+
+    def __init__(self, directory=DEFAULT_METRICS_DIR, resume=False, run=None):
+        existing = runs(directory) if resume and run is None else []
+        self.run = run or (existing[-1] if existing else _new_run(directory))
+        self.directory = os.path.join(directory, self.run)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._repair()
+
+    def _column_path(self, column):
+        return os.path.join(self.directory, f"{column}.f8")
+
+    def _repair(self):
+        # Uma queda no meio do append deixa colunas com tamanhos diferentes (ou bytes soltos);
+        # corta todas no último registro completo para que os próximos appends continuem alinhados
+        sizes = {column: os.path.getsize(self._column_path(column)) if os.path.exists(self._column_path(column)) else 0
+                 for column in COLUMNS}
+        complete = min(sizes.values()) // 8 * 8
+        for column, size in sizes.items():
+            if size > complete:
+                with open(self._column_path(column), "r+b") as f:
+                    f.truncate(complete)
+                logging.warning(f"Métrica '{column}' cortada em {complete // 8} iterações após escrita incompleta.")
+
+    def append(self, phase, **values):
+        row = dict(values, phase=PHASES[phase])
+        with self._lock:
+            for column in COLUMNS:
+                value = row.get(column)
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    value = np.nan
+                with open(self._column_path(column), "ab") as f:
+                    f.write(np.float64(value).tobytes())
+
+    def columns(self):
+        """Devolve {coluna: array} com uma posição por iteração."""
+        with self._lock:
+            arrays = {}
+            for column in COLUMNS:
+                path = self._column_path(column)
+                arrays[column] = np.fromfile(path, dtype=np.float64) if os.path.exists(path) else np.empty(0)
+        length = min(len(values) for values in arrays.values())
+        return {column: values[:length] for column, values in arrays.items()}
+
+    def __len__(self):
+        return len(self.columns()['phase'])
+
+
+def downsample(values, max_points=2000):
+    """Agrupa a série em no máximo `max_points` janelas e devolve (x, média, mínimo, máximo)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= max_points:
+        x = np.arange(len(values))
+        return x, values, values, values
+    window = -(-len(values) // max_points)
+    starts = np.arange(0, len(values), window)
+    counts = np.diff(np.append(starts, len(values)))
+    x = starts + (counts - 1) / 2
+    mean = np.add.reduceat(values, starts) / counts
+    return x, mean, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def render(columns, directory=".", max_points=2000):
+    """Gera os quatro gráficos de evolução; matplotlib só é importado aqui."""
+    import matplotlib.pyplot as plt
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for column, filename, label, ylabel, title in PLOTS:
+        x, mean, low, high = downsample(columns[column], max_points)
+        plt.figure(figsize=(10, 6))
+        if len(columns[column]) > max_points:
+            plt.fill_between(x, low, high, alpha=0.25, label='Mínimo/Máximo da janela')
+        plt.plot(x, mean, label=label)
+        plt.xlabel('Iterações')
+        plt.ylabel(ylabel)
+        plt.title(title)
+        plt.legend()
+        path = os.path.join(directory, filename)
+        plt.savefig(path)
+        plt.close()
+        paths.append(path)
+    logging.info(f"Gráficos salvos: {', '.join(paths)}")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default=DEFAULT_METRICS_DIR)
+    parser.add_argument("--run", help="Execução a desenhar (padrão: a mais recente)")
+    parser.add_argument("--output", default=".", help="Diretório onde os PNGs são gravados")
+    parser.add_argument("--max-points", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.run is None and not runs(args.directory):
+        parser.error(f"Nenhuma execução com métricas em {args.directory}")
+    render(MetricsLog(args.directory, resume=True, run=args.run).columns(), args.output, args.max_points)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# problem_specs.py
+"""Registro declarativo dos casos de teste de cada problema (ver case_runner.py para os modos).
+
+O problema escolhe a especificação por `metrics['unit_tests']`:
+    True          procura no registro a especificação cujo `match` aparece na pergunta
+    "nome"        usa PROBLEM_SPECS["nome"]
+    {...}         especificação declarada no próprio problema
+    False/ausente sem testes
+"""
+
+import logging
+
+PROBLEM_SPECS = {
+    'two_sum': {
+        'match': "two numbers such that they add up to target",
+        'mode': 'stdio',
+        'compare': 'sorted',
+        'cases': [
+            {'input': {'nums': [2, 7, 11, 15], 'target': 9}, 'expected': [0, 1]},
+            {'input': {'nums': [3, 2, 4], 'target': 6}, 'expected': [1, 2]},
+            {'input': {'nums': [3, 3], 'target': 6}, 'expected': [0, 1]},
+        ],
+    },
+    'limpeza_vendas': {
+        'match': "limpeza de dados",
+        'mode': 'check',
+        'cases': [
+            {'name': 'gera_dataframe', 'check': "len(frames) > 0"},
+            {'name': 'sem_nulos', 'check': "any(frame.notna().all().all() for frame in frames)"},
+            {'name': 'sem_duplicatas', 'check': "any(not frame.duplicated().any() for frame in frames)"},
+            {'name': 'limpo_e_nao_vazio',
+             'check': "any(len(frame) > 0 and frame.notna().all().all() and not frame.duplicated().any() for frame in frames)"},
+        ],
+    },
+}
+
+
+def register(name, spec):
+    PROBLEM_SPECS[name] = spec
+
+
+def spec_for(problem):
+    """Especificação de testes do problema (dict da lista `problems` ou só a pergunta), ou None."""
+    if isinstance(problem, str):
+        problem = {'question': problem, 'metrics': {'unit_tests': True}}
+    unit_tests = (problem.get('metrics') or {}).get('unit_tests')
+    if not unit_tests:
+        return None
+    if isinstance(unit_tests, dict):
+        return unit_tests
+    if isinstance(unit_tests, str):
+        if unit_tests not in PROBLEM_SPECS:
+            logging.warning(f"Especificação de testes '{unit_tests}' não registrada.")
+        return PROBLEM_SPECS.get(unit_tests)
+    question = problem.get('question', '').lower()
+    for spec in PROBLEM_SPECS.values():
+        if spec.get('match') and spec['match'].lower() in question:
+            return spec
+    return None
@@ -1,6 +1,9 @@
 # programmer.py
 
-from ollama import Client
+from llm_client import get_client
+from q_table import QTable
+from checkpoint import Checkpoint
+from history import BoundedHistory, archive_path
 import ast
 import re
 import logging
@@ -8,11 +11,9 @@ import random
 import pickle
 import os
 
-client = Client(host='http://localhost:11434')
-
 class Programmer:
-    def __init__(self, prompt_master, epsilon=0.1):
-        self.q_table = {}
+    def __init__(self, prompt_master, epsilon=0.1, history_dir=None, history_size=10, replay=None, seed=None):
+        self.q_table = QTable()
         self.prompt = (
             "Você é um programador experiente em ciência de dados. Escreva apenas o código, sem texto adicional, "
             "rótulos de linguagem, cabeçalhos ou explicações. Você pode adicionar comentários para legibilidade. "
@@ -21,29 +22,80 @@ class Programmer:
         self.current_prompt = ""
         self.hints = ""
         self.weights = {'clarity':1, 'readability':1, 'efficiency':1, 'optimization':1}
-        self.prompt_history = []
-        self.code_history = []
-        self.reward_history = []
+        # Só as últimas `history_size` entradas ficam em memória; com history_dir, as antigas vão para disco
+        self.history_dir = history_dir
+        self.history_size = history_size
+        self.prompt_history = BoundedHistory(history_size, archive_path(history_dir, 'programmer', 'prompts'))
+        self.code_history = BoundedHistory(history_size, archive_path(history_dir, 'programmer', 'code'))
+        self.reward_history = BoundedHistory(history_size, archive_path(history_dir, 'programmer', 'rewards'))
         self.max_attempts = 10
         self.epsilon = epsilon  # Probabilidade de explorar ações
-        self.q_table = {}  # Tabela Q para armazenar valores de ações
+        # Gerador próprio do agente: em train_many, Programmer e Reviewer escolhem ações em threads
+        # diferentes, e o random global misturaria os sorteios dos dois entre execuções
+        self.rng = random.Random(seed)
         self.prompt_master = prompt_master  # Instância de PromptMaster
+        # ReplayBuffer opcional: cada transição também é reaplicada em mini-lotes (ver update_policy)
+        self.replay = replay
         self.programmer_reward_history = []
         self.programmer_weights_history = []
 
-    def _set_current_prompt(self, question, hint=None):
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.q_table, dict):
+            # Agentes salvos antes da QTable guardavam a tabela como dicionário aninhado
+            self.q_table = QTable.from_dict(self.q_table)
+        if 'replay' not in state:
+            self.replay = None
+        if 'rng' not in state:
+            self.rng = random.Random()
+        if isinstance(self.code_history, list):
+            # Agentes salvos antes do histórico limitado guardavam listas completas
+            self.history_dir = None
+            self.history_size = 10
+            for name in ('prompt_history', 'code_history', 'reward_history'):
+                setattr(self, name, BoundedHistory.from_list(getattr(self, name), self.history_size))
+
+    def _set_current_prompt(self, question, hint=None, data_summary=None):
         self.current_prompt = self.prompt + "\n\n"
+        # O resumo dos dados só muda com o arquivo do problema; fica logo após o texto fixo
+        if data_summary:
+            self.current_prompt += f"O arquivo de dados está no diretório de execução. Resumo:\n{data_summary}\n\n"
         self.current_prompt += f"Considere os seguintes pesos ao escrever o código:\n{self.weights}\n\n"
         if hint:
             self.current_prompt += f"Dica: {hint}\n\n"
         self.current_prompt += f"Agora, seguindo todas as regras anteriores, escreva um código para responder à seguinte questão:\n{question}"
         self.prompt_history.append(self.current_prompt)
 
-    def act(self, question, training=True):
+    def act(self, question, training=True, data_summary=None):
+        self._prepare_prompt(question, training, data_summary)
+        
+        # Gerar o código com o prompt completo
+        response = self.generate_code(self.current_prompt)
+        code = response['message']['content']
+        self.code_history.append(code)
+        return code
+
+    def act_many(self, question, n, training=True, data_summary=None):
+        """Gera n candidatos para a mesma ação: um único prompt, amostrado com sementes diferentes.
+
+        Os pedidos saem juntos e têm o mesmo prefixo, que o Ollama reaproveita do cache de KV.
+        """
+        self._prepare_prompt(question, training, data_summary)
+        first_seed = self.code_history.count
+        options = [{'seed': first_seed + i} for i in range(n)]
+        requests = [self._request_code(self.current_prompt, option) for option in options]
+        codes = []
+        for request, option in zip(requests, options):
+            code = self._complete_code(self.current_prompt, request, option)['message']['content']
+            self.code_history.append(code)
+            codes.append(code)
+        return codes
+
+    def _prepare_prompt(self, question, training, data_summary=None):
         state = self.get_state()
         
         # Seleção de ação baseada na política epsilon-greedy
-        if training and random.random() < self.epsilon:
+        if training and self.rng.random() < self.epsilon:
             hint, hint_strength, weights = self.prompt_master.create_hint('CODE', '', '', self.get_last_score(), self.weights)
             action = f"Dica: {hint}"
             logging.info(f"Programador explorando com ação: {action}")
@@ -57,25 +109,33 @@ class Programmer:
             self.weights = weights
         
         # Configurar o prompt com a dica
-        self._set_current_prompt(question, hint)
-        
-        # Gerar o código com o prompt completo
-        response = self.generate_code(self.current_prompt)
-        code = response['message']['content']
-        self.code_history.append(code)
-        return code
+        self._set_current_prompt(question, hint, data_summary)
+
+    def generate_code(self, prompt, options=None):
+        return self._complete_code(prompt, None, options)
 
-    def generate_code(self, prompt):
+    def _request_code(self, prompt, options=None):
+        kwargs = {'options': options} if options else {}
+        return get_client().submit(model='llama3.1', role='programmer', messages=[
+            {
+                'role': 'user',
+                'content': prompt,
+            },
+        ], **kwargs)
+
+    def _complete_code(self, prompt, request, options=None):
+        # Pede a continuação enquanto o modelo interromper o código com '...'
         attempts = 0
-        response = {'done_reason': None}
         full_code = ""
         while attempts < self.max_attempts:
-            response = client.chat(model='llama3.1', messages=[
-                {
-                    'role': 'user',
-                    'content': prompt,
-                },
-            ])
+            if request is None:
+                request = self._request_code(prompt, options)
+            response = request.result()
+            request = None
+            if response.get('done_reason') == 'budget':
+                # Código cortado (ou nem gerado) pelo orçamento do episódio não é avaliado: vira um candidato vazio
+                logging.warning("Orçamento do episódio esgotado durante a geração; código descartado.")
+                return {'message': {'content': ""}, 'done_reason': 'budget'}
             content = response['message']['content']
             if '...' in content:
                 full_code += content.replace('...', '')
@@ -98,16 +158,16 @@ class Programmer:
         # Seleciona uma ação (prompt) aleatória da tabela Q
         if not self.q_table:
             return self.prompt_master.get_random_action('CODE')
-        state = self.get_state()
-        if state in self.q_table and self.q_table[state]:
-            return max(self.q_table[state], key=self.q_table[state].get)
+        action = self.q_table.best(self.get_state())
+        if action is not None:
+            return action
         else:
             return self.prompt_master.get_random_action('CODE')
 
     def exploit(self, state):
         # Seleciona a melhor ação conhecida para o estado atual
-        if state in self.q_table and self.q_table[state]:
-            action = max(self.q_table[state], key=self.q_table[state].get)
+        action = self.q_table.best(state)
+        if action is not None:
             return action
         else:
             return self.explore()
@@ -117,19 +177,12 @@ class Programmer:
         alpha = 0.1  # Taxa de aprendizado
         gamma = 0.9  # Fator de desconto
 
-        if state not in self.q_table:
-            self.q_table[state] = {}
+        self.q_table.update(state, action, reward, alpha, gamma)
+        if self.replay is not None:
+            self.replay.add(state, action, reward)
+            self.replay.replay(self.q_table, alpha, gamma)
 
-        if action not in self.q_table[state]:
-            self.q_table[state][action] = 0
-
-        max_future_q = max(self.q_table.get(state, {}).values()) if self.q_table.get(state, {}) else 0
-
-        current_q = self.q_table[state][action]
-        new_q = current_q + alpha * (reward + gamma * max_future_q - current_q)
-        self.q_table[state][action] = new_q
-
-        logging.info(f"Atualizado Q({state}, {action}) = {self.q_table[state][action]} com recompensa {reward}")
+        logging.info(f"Atualizado Q({state}, {action}) = {self.q_table.get(state, action)} com recompensa {reward}")
 
     def get_last_score(self):
         return self.reward_history[-1] if self.reward_history else 0
@@ -162,9 +215,9 @@ class Programmer:
 
     def reset(self):
         # Resetar histórico após um ciclo de treinamento
-        self.prompt_history = []
-        self.code_history = []
-        self.reward_history = []
+        self.prompt_history.clear()
+        self.code_history.clear()
+        self.reward_history.clear()
 
     def save(self, filepath):
         """Salva o estado atual do agente Programmer em um arquivo."""
@@ -184,11 +237,25 @@ class Programmer:
             logging.warning(f"Arquivo {filepath} não encontrado. Inicializando um novo Programador.")
             return None
     
+    def save_checkpoint(self, directory):
+        """Salva apenas o estado aprendido (tabela Q, pesos e dicas) num checkpoint incremental."""
+        if getattr(self, '_checkpoint', None) is None or self._checkpoint.directory != directory:
+            self._checkpoint = Checkpoint(directory)
+        self._checkpoint.save(self.q_table, {'weights': self.weights, 'hints': self.hints, 'epsilon': self.epsilon})
+        logging.info(f"Programador salvo em {directory}")
+
+    def load_checkpoint(self, directory):
+        """Restaura o estado aprendido de um checkpoint criado por save_checkpoint."""
+        q_table, state = Checkpoint(directory).load()
+        if q_table is None:
+            logging.warning(f"Checkpoint {directory} não encontrado. Mantendo o estado atual do Programador.")
+            return False
+        self.q_table = q_table
+        self.weights = state['weights']
+        self.hints = state['hints']
+        self.epsilon = state['epsilon']
+        logging.info(f"Programador carregado de {directory}")
+        return True
+
     def get_average_q_value(self):
-        values = []
-        for state_actions in self.q_table.values():
-            values.extend(state_actions.values())
-        if values:
-            return sum(values)/len(values)
-        else:
-            return 0.0
\ No newline at end of file
+        return self.q_table.mean()
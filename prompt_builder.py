@@ -0,0 +1,84 @@
+# prompt_builder.py
+
+import math
+from collections import deque
+
+
+def estimate_tokens(text):
+    # Aproximação barata (~4 caracteres por token) para acompanhar o tamanho do prompt antes de enviá-lo
+    return math.ceil(len(text) / 4)
+
+
+class ScoreHistory:
+    """Histórico de (pontuação, pesos) com janela fixa e um resumo agregado por vetor de pesos.
+
+    Guarda apenas as últimas `window` entradas e, para cada vetor de pesos já usado,
+    contagem, soma e melhor pontuação; o tamanho do prompt não cresce com o treino.
+    """
+
+    def __init__(self, window=5, summary_size=5):
+        self.window = deque(maxlen=window)
+        self.summary_size = summary_size
+        self.stats = {}
+        self.count = 0
+
+    def append(self, score, weights):
+        self.window.append((score, weights))
+        self.count += 1
+        try:
+            value = float(score)
+        except (TypeError, ValueError):
+            return
+        key = str(weights)
+        count, total, best = self.stats.get(key, (0, 0.0, value))
+        self.stats[key] = (count + 1, total + value, max(best, value))
+
+    def last_score(self):
+        return self.window[-1][0] if self.window else 0
+
+    def summary_lines(self):
+        best_first = sorted(self.stats.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            f"Pesos: {key} Usos: {count} Melhor: {best:.2f} Média: {total / count:.2f}"
+            for key, (count, total, best) in best_first[:self.summary_size]
+        ]
+
+    def window_lines(self):
+        return [f"Pontuação: {score} Pesos: {weights}" for score, weights in self.window]
+
+    def __len__(self):
+        return self.count
+
+
+class PromptBuilder:
+    """Monta as mensagens com o texto estático longo como prefixo idêntico entre chamadas.
+
+    O texto fixo vai na mensagem de sistema; a mensagem do usuário começa pelo estágio,
+    segue com o histórico resumido e termina com as partes voláteis (código, revisão),
+    para que o cache de prefixo do Ollama aproveite o máximo possível do prompt.
+    """
+
+    def __init__(self, system_text):
+        self.system_text = system_text
+        self.last_prompt_tokens = 0
+
+    def build(self, stage, sections, history=None, history_title=None):
+        parts = [stage] if stage else []
+        if history is not None and len(history):
+            parts.append(
+                (history_title or "Histórico de pesos e pontuações:")
+                + "\nResumo (melhores vetores de pesos):\n" + "\n".join(history.summary_lines())
+                + "\nÚltimas rodadas:\n" + "\n".join(history.window_lines())
+            )
+        for title, content in sections:
+            parts.append(f"{title}\n\n{content}")
+        user_text = "\n\n".join(parts)
+        self.last_prompt_tokens = estimate_tokens(self.system_text) + estimate_tokens(user_text)
+        return [
+            {'role': 'system', 'content': self.system_text},
+            {'role': 'user', 'content': user_text},
+        ]
+
+
+def messages_text(messages):
+    return "\n\n".join(message['content'] for message in messages)
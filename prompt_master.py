@@ -1,17 +1,17 @@
 # prompt_master.py
 
-from ollama import Client
+from llm_client import get_client
+from prompt_builder import PromptBuilder, ScoreHistory, messages_text
 import ast
 import re
 import random
 import logging
-
-client = Client(host='http://localhost:11434')
+import threading
 
 class PromptMaster:
     def __init__(self, epsilon=0.1):
         self.prompt = (
-            "\nPreste atenção na primeira palavra deste prompt, pois ela ditará seu papel e abordagem. Se o prompt começar com 'CODE', "
+            "\nPreste atenção na primeira palavra da mensagem do usuário, pois ela ditará seu papel e abordagem. Se a mensagem começar com 'CODE', "
             "você está guiando o programador. Se começar com 'REVIEW', você está guiando o revisor. Aja de acordo com a primeira palavra e siga as instruções específicas abaixo."
 
             "\n\nCODE: Você é um mestre de prompts responsável por fornecer uma dica geral e duradoura que ajudará o programador a melhorar iterativamente seu código, "
@@ -32,10 +32,12 @@ class PromptMaster:
             "<{'clarity': weight, 'readability': weight, 'efficiency': weight, 'optimization': weight}> #formato de dicionário python"
         )
         self.current_prompt = ""
-        self.programmer_weights_history = []
-        self.reviewer_weights_history = []
-        self.programmer_reward_history = []
-        self.reviewer_reward_history = []
+        self.current_messages = []
+        self.builder = PromptBuilder(self.prompt)
+        # Histórico limitado de (pontuação, pesos) por estágio, com resumo agregado
+        self.programmer_history = ScoreHistory()
+        self.reviewer_history = ScoreHistory()
+        self.last_prompt_tokens = {}
         self.max_attempts = 10
         self.epsilon = epsilon  # Probabilidade de explorar novas dicas
 
@@ -45,63 +47,88 @@ class PromptMaster:
             'REVIEW': {}
         }
 
+        # Programmer e Reviewer podem pedir dicas em threads diferentes (Environment.train_many)
+        self._lock = threading.Lock()
+
         # Configurar logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    def _set_current_prompt(self, stage, code, review):
-        self.current_prompt = stage + self.prompt
-        self.current_prompt += "\n\nO código é:\n\n" + code
-        self.current_prompt += "\n\nA revisão foi:\n\n" + review
-
-        self.current_prompt += "\n\nPara referência, estes são os pesos que o " + stage + " usou e a pontuação subsequente que alcançou:" 
+    def _history(self, stage):
+        return self.programmer_history if stage == 'CODE' else self.reviewer_history
 
-        if stage == 'CODE':
-            for reward, weight in zip(self.programmer_reward_history, self.programmer_weights_history):
-                self.current_prompt += "\n" + "Pontuação: "+ str(reward) + " Pesos: " + str(weight)
-        elif stage == 'REVIEW':
-            for reward, weight in zip(self.reviewer_reward_history, self.reviewer_weights_history):
-                self.current_prompt += "\n" + "Pontuação: "+ str(reward) + " Pesos: " + str(weight)
+    def _set_current_prompt(self, stage, code, review):
+        self.current_messages = self.builder.build(
+            stage,
+            [("O código é:", code), ("A revisão foi:", review)],
+            history=self._history(stage) if stage in ('CODE', 'REVIEW') else None,
+            history_title="Para referência, estes são os pesos que o " + stage + " usou e a pontuação subsequente que alcançou:",
+        )
+        self.current_prompt = messages_text(self.current_messages)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        if 'programmer_history' not in state:
+            # Objetos salvos antes do histórico limitado guardavam listas completas
+            self.current_messages = []
+            self.builder = PromptBuilder(self.prompt)
+            self.last_prompt_tokens = {}
+            self.programmer_history = ScoreHistory()
+            self.reviewer_history = ScoreHistory()
+            for score, weights in zip(state.get('programmer_reward_history', []), state.get('programmer_weights_history', [])):
+                self.programmer_history.append(score, weights)
+            for score, weights in zip(state.get('reviewer_reward_history', []), state.get('reviewer_weights_history', [])):
+                self.reviewer_history.append(score, weights)
+            for name in ('programmer_reward_history', 'programmer_weights_history',
+                         'reviewer_reward_history', 'reviewer_weights_history'):
+                self.__dict__.pop(name, None)
 
     def create_hint(self, stage, code, review, score, weights):
-        if stage == 'CODE':
-            self.programmer_reward_history.append(score)
-            self.programmer_weights_history.append(weights)
-        elif stage == 'REVIEW':
-            self.reviewer_reward_history.append(score)
-            self.reviewer_weights_history.append(weights)
-
-        self._set_current_prompt(stage, code, review)
-
-        response = self.generate_hint(stage)
+        # O lock protege só o estado compartilhado (históricos, prompt atual, action_values); a chamada
+        # ao LLM fica fora dele, para Programmer e Reviewer poderem pedir dicas ao mesmo tempo
+        with self._lock:
+            if stage in ('CODE', 'REVIEW'):
+                self._history(stage).append(score, weights)
+            self._set_current_prompt(stage, code, review)
+            messages = self.current_messages
+            estimated_tokens = self.builder.last_prompt_tokens
+
+        response = self.generate_hint(stage, messages)
         hint, hint_strength, weights = self.extract_info(response['message']['content'])
 
-        if hint and hint_strength:
-            action = f"Dica: {hint}"
-            if action not in self.action_values[stage]:
-                self.action_values[stage][action] = 0
-            try:
-                self.action_values[stage][action] += float(hint_strength)
-                logging.info(f"Adicionado/Atualizado ação '{action}' com força {hint_strength} no estágio '{stage}'.")
-            except ValueError:
-                logging.error(f"Pontuação de força inválida '{hint_strength}' para a ação '{action}'. Deve ser um número.")
+        with self._lock:
+            self.last_prompt_tokens = {
+                'estimated': estimated_tokens,
+                'prompt_eval_count': response.get('prompt_eval_count'),
+            }
+            if hint and hint_strength:
+                action = f"Dica: {hint}"
+                if action not in self.action_values[stage]:
+                    self.action_values[stage][action] = 0
+                try:
+                    self.action_values[stage][action] += float(hint_strength)
+                    logging.info(f"Adicionado/Atualizado ação '{action}' com força {hint_strength} no estágio '{stage}'.")
+                except ValueError:
+                    logging.error(f"Pontuação de força inválida '{hint_strength}' para a ação '{action}'. Deve ser um número.")
 
-        else:
-            logging.warning(f"Falha ao extrair dica ou força da resposta: {response['message']['content']}")
+            else:
+                logging.warning(f"Falha ao extrair dica ou força da resposta: {response['message']['content']}")
 
         return hint, hint_strength, weights
 
-    def generate_hint(self, stage):
-        attempts = 0
-        response = {'done_reason': None}
-        while response['done_reason'] != 'stop' and attempts < self.max_attempts:
-            response = client.chat(model='llama3.1', messages=[
-                {
-                    'role': 'user',
-                    'content': self.current_prompt,
-                },
-            ])
-            attempts += 1
-        return response
+    def generate_hint(self, stage, messages=None):
+        return get_client().chat(model='llama3.1', role='prompt_master',
+                                 messages=self.current_messages if messages is None else messages,
+                                 stop_when=self._hint_complete)
+
+    def _hint_complete(self, text):
+        # Dica, ênfase e pesos já chegaram: não há motivo para continuar gerando
+        return len(re.findall(r"<(.*?)>", text)) >= 3
 
     def safe_extract_data_structure(self, model_output, fallback_value=None):
         if fallback_value is None:
@@ -162,16 +189,12 @@ class PromptMaster:
 
     def get_state(self, stage):
         """Define o estado atual baseado na última recompensa."""
-        if stage == 'CODE':
-            return self.programmer_reward_history[-1] if self.programmer_reward_history else 0
-        elif stage == 'REVIEW':
-            return self.reviewer_reward_history[-1] if self.reviewer_reward_history else 0
+        if stage in ('CODE', 'REVIEW'):
+            return self._history(stage).last_score()
         return 0
 
     def reset_history(self):
         """Reseta os históricos após um episódio."""
-        self.programmer_reward_history = []
-        self.programmer_weights_history = []
-        self.reviewer_reward_history = []
-        self.reviewer_weights_history = []
+        self.programmer_history = ScoreHistory()
+        self.reviewer_history = ScoreHistory()
         logging.info("Históricos do PromptMaster resetados.")
@@ -0,0 +1,215 @@
+# q_table.py
+
+import functools
+import threading
+
+import numpy as np
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class QTable:
+    """Tabela Q tabular compartilhada por Programmer e Reviewer.
+
+    Estados contínuos (a última recompensa, entre 0 e 1) são discretizados em `n_bins` faixas.
+    Cada ação (o texto da dica) recebe um id inteiro, e os valores ficam numa matriz NumPy
+    (estados x ações) que cresce em blocos. Soma, contagem e a melhor ação de cada estado
+    são mantidas a cada atualização, então média e argmax não percorrem a tabela.
+
+    Leituras e escritas passam por um lock: em Environment.train_many a escolha da ação do próximo
+    episódio (em outra thread) pode acontecer durante a atualização do episódio anterior.
+    """
+
+    def __init__(self, n_bins=10, low=0.0, high=1.0, chunk=64):
+        self.n_bins = n_bins
+        self.low = low
+        self.high = high
+        self.chunk = chunk
+        self.action_ids = {}
+        self.actions = []
+        self.values = np.zeros((n_bins, chunk))
+        self.known = np.zeros((n_bins, chunk), dtype=bool)
+        self.best_action = np.full(n_bins, -1, dtype=np.int64)
+        self.total = 0.0
+        self.count = 0
+        # Células alteradas e ações novas desde o último checkpoint (ver checkpoint.Checkpoint)
+        self._journal = {}
+        self._journal_actions_from = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def state_index(self, state):
+        try:
+            value = float(state)
+        except (TypeError, ValueError):
+            return 0
+        position = (value - self.low) / (self.high - self.low) * self.n_bins
+        return int(min(max(position, 0), self.n_bins - 1))
+
+    def state_indices(self, states):
+        """Versão vetorizada de state_index para um array de estados (NaN cai na primeira faixa)."""
+        position = (np.asarray(states, dtype=float) - self.low) / (self.high - self.low) * self.n_bins
+        return np.clip(np.nan_to_num(position, nan=0.0), 0, self.n_bins - 1).astype(np.int64)
+
+    @_locked
+    def action_id(self, action):
+        action_id = self.action_ids.get(action)
+        if action_id is None:
+            action_id = len(self.actions)
+            self.action_ids[action] = action_id
+            self.actions.append(action)
+            if action_id >= self.values.shape[1]:
+                self.values = np.hstack([self.values, np.zeros((self.n_bins, self.chunk))])
+                self.known = np.hstack([self.known, np.zeros((self.n_bins, self.chunk), dtype=bool)])
+        return action_id
+
+    @_locked
+    def get(self, state, action, default=0.0):
+        action_id = self.action_ids.get(action)
+        row = self.state_index(state)
+        if action_id is None or not self.known[row, action_id]:
+            return default
+        return float(self.values[row, action_id])
+
+    def _set(self, row, action_id, value):
+        old_value = self.values[row, action_id]
+        if self.known[row, action_id]:
+            self.total += value - old_value
+        else:
+            self.known[row, action_id] = True
+            self.total += value
+            self.count += 1
+        self.values[row, action_id] = value
+        self._journal[(row, action_id)] = float(value)
+
+        best = self.best_action[row]
+        if best == action_id and value < old_value:
+            # A melhor ação piorou: recalcula o argmax só desta linha
+            masked = np.where(self.known[row], self.values[row], -np.inf)
+            self.best_action[row] = int(np.argmax(masked))
+        elif best < 0 or value > self.values[row, best]:
+            self.best_action[row] = action_id
+
+    @_locked
+    def update(self, state, action, reward, alpha=0.1, gamma=0.9):
+        """Q(s,a) = Q(s,a) + alpha * (reward + gamma * max(Q(s,a')) - Q(s,a)); devolve o novo valor."""
+        row = self.state_index(state)
+        action_id = self.action_id(action)
+        if not self.known[row, action_id]:
+            self._set(row, action_id, 0.0)
+        max_future_q = self.values[row, self.best_action[row]]
+        current_q = self.values[row, action_id]
+        new_q = float(current_q + alpha * (reward + gamma * max_future_q - current_q))
+        self._set(row, action_id, new_q)
+        return new_q
+
+    @_locked
+    def update_batch(self, rows, action_ids, rewards, next_rows, alpha=0.1, gamma=0.9):
+        """Uma atualização Q-learning sobre um mini-lote de transições, toda em NumPy.
+
+        Os alvos usam a tabela de antes do lote: reward + gamma * max(Q(s',a')). Células repetidas
+        no lote recebem a média dos seus passos.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        action_ids = np.asarray(action_ids, dtype=np.int64)
+        unknown = ~self.known[rows, action_ids]
+        if unknown.any():
+            cells = np.unique(np.stack([rows[unknown], action_ids[unknown]]), axis=1)
+            self._set_many(cells[0], cells[1], np.zeros(cells.shape[1]))
+        next_q = np.where(self.known[next_rows], self.values[next_rows], -np.inf).max(axis=1)
+        next_q[np.isneginf(next_q)] = 0.0
+        steps = alpha * (np.asarray(rewards, dtype=float) + gamma * next_q - self.values[rows, action_ids])
+        cells, inverse = np.unique(rows * self.values.shape[1] + action_ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=steps)
+        counts = np.bincount(inverse)
+        cell_rows, cell_actions = np.divmod(cells, self.values.shape[1])
+        self._set_many(cell_rows, cell_actions, self.values[cell_rows, cell_actions] + totals / counts)
+
+    def _set_many(self, rows, action_ids, values):
+        # _set para células distintas de uma vez; o argmax é recalculado nas linhas tocadas
+        known = self.known[rows, action_ids]
+        self.total += float(values.sum() - self.values[rows, action_ids][known].sum())
+        self.count += int((~known).sum())
+        self.known[rows, action_ids] = True
+        self.values[rows, action_ids] = values
+        self._journal.update(zip(zip(rows.tolist(), action_ids.tolist()), values.tolist()))
+        touched = np.unique(rows)
+        masked = np.where(self.known[touched], self.values[touched], -np.inf)
+        self.best_action[touched] = np.argmax(masked, axis=1)
+
+    @_locked
+    def best(self, state):
+        """Melhor ação conhecida para o estado, ou None se o estado ainda não tem ações."""
+        action_id = self.best_action[self.state_index(state)]
+        return self.actions[action_id] if action_id >= 0 else None
+
+    @_locked
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __len__(self):
+        return self.count
+
+    @_locked
+    def as_dict(self):
+        table = {}
+        for row, action_id in zip(*np.nonzero(self.known)):
+            table.setdefault(int(row), {})[self.actions[action_id]] = float(self.values[row, action_id])
+        return table
+
+    @_locked
+    def drain_journal(self):
+        """Devolve e limpa as alterações pendentes: (células, índice da primeira ação nova, ações novas)."""
+        changes = self._journal
+        actions_from = self._journal_actions_from
+        self._journal = {}
+        self._journal_actions_from = len(self.actions)
+        return changes, actions_from, self.actions[actions_from:]
+
+    @_locked
+    def apply_journal(self, actions_from, new_actions, changes):
+        """Reaplica um registro de drain_journal; aplicar o mesmo registro duas vezes não muda nada."""
+        for offset, action in enumerate(new_actions):
+            if actions_from + offset >= len(self.actions):
+                self.action_id(action)
+        for row, action_id, value in changes:
+            self._set(int(row), int(action_id), float(value))
+
+    @classmethod
+    def from_arrays(cls, values, known, actions, **kwargs):
+        table = cls(**kwargs)
+        for action in actions:
+            table.action_id(action)
+        for row, action_id in zip(*np.nonzero(known)):
+            table._set(int(row), int(action_id), float(values[row, action_id]))
+        return table
+
+    @classmethod
+    def from_dict(cls, q_table, **kwargs):
+        """Importa uma tabela no formato antigo {estado: {ação: valor}}.
+
+        Estados antigos que caem na mesma faixa têm os valores de cada ação combinados pela média.
+        """
+        table = cls(**kwargs)
+        merged = {}
+        for state, actions in q_table.items():
+            row = table.state_index(state)
+            for action, value in actions.items():
+                merged.setdefault((row, action), []).append(value)
+        for (row, action), values in merged.items():
+            table._set(row, table.action_id(action), float(np.mean(values)))
+        return table
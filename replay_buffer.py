@@ -0,0 +1,135 @@
+# replay_buffer.py
+"""Buffer de experiência de um agente: transições (estado, ação, recompensa, próximo estado).
+
+Cada transição gerada pelo LLM é reaproveitada em vários mini-lotes (QTable.update_batch) em vez
+de ser usada uma única vez. Com `path`, as transições também vão para um arquivo JSONL, e
+retrain() reconstrói uma tabela Q a partir dele sem nenhuma chamada ao LLM.
+
+O próximo estado de uma transição é o estado observado pelo agente na transição seguinte; a
+última, ainda sem sucessora, usa o próprio estado, como a atualização online.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from q_table import QTable
+
+
+def _as_state(state):
+    try:
+        return float(state)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class ReplayBuffer:
+    def __init__(self, path=None, capacity=10000, batch_size=32, batches=1, seed=None):
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.batches = batches  # Mini-lotes reaplicados a cada nova transição
+        self.rng = np.random.default_rng(seed)
+        self.actions = []  # Vocabulário de ações do buffer; as transições guardam o índice
+        self.action_ids = {}
+        self.states = np.full(capacity, np.nan)
+        self.next_states = np.full(capacity, np.nan)
+        self.rewards = np.zeros(capacity)
+        self.action_index = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.position = 0  # Próxima posição do anel
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        return self.size
+
+    def _load(self, path):
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+        skipped = 0
+        for line in lines[-self.capacity:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1  # Fim de uma escrita interrompida
+                continue
+            self._append(record['state'], record['action'], record['reward'])
+        if skipped:
+            logging.warning(f"{skipped} transições ilegíveis ignoradas em {path}")
+        logging.info(f"{self.size} transições carregadas de {path}")
+
+    def _append(self, state, action, reward):
+        action_id = self.action_ids.get(action)
+        if action_id is None:
+            action_id = self.action_ids[action] = len(self.actions)
+            self.actions.append(action)
+        state = _as_state(state)
+        if self.size:
+            previous = (self.position - 1) % self.capacity
+            self.next_states[previous] = state
+        self.states[self.position] = state
+        self.next_states[self.position] = np.nan
+        self.rewards[self.position] = reward
+        self.action_index[self.position] = action_id
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add(self, state, action, reward):
+        """Guarda a transição (e a grava no arquivo, se houver)."""
+        self._append(state, action, reward)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({'state': _as_state(state), 'action': action, 'reward': reward}, ensure_ascii=False) + "\n")
+
+    def _arrays(self, q_table, indices):
+        # Ações do buffer -> ids da tabela (ações novas são registradas na tabela)
+        used, inverse = np.unique(self.action_index[indices], return_inverse=True)
+        table_ids = np.array([q_table.action_id(self.actions[i]) for i in used], dtype=np.int64)[inverse]
+        states = self.states[indices]
+        next_states = self.next_states[indices]
+        next_states = np.where(np.isnan(next_states), states, next_states)
+        return (q_table.state_indices(states), table_ids,
+                self.rewards[indices], q_table.state_indices(next_states))
+
+    def replay(self, q_table, alpha=0.1, gamma=0.9, batches=None, batch_size=None):
+        """Reaplica `batches` mini-lotes sorteados do buffer na tabela Q."""
+        if not self.size:
+            return 0
+        batches = self.batches if batches is None else batches
+        batch_size = min(self.batch_size if batch_size is None else batch_size, self.size)
+        for _ in range(batches):
+            indices = self.rng.choice(self.size, size=batch_size, replace=False)
+            q_table.update_batch(*self._arrays(q_table, indices), alpha=alpha, gamma=gamma)
+        return batches * batch_size
+
+    def retrain(self, q_table=None, epochs=20, batch_size=None, alpha=0.1, gamma=0.9):
+        """Treina uma tabela Q (nova, se não for dada) só com as transições guardadas.
+
+        Cada época percorre o buffer inteiro em mini-lotes, em ordem aleatória.
+        """
+        q_table = q_table if q_table is not None else QTable()
+        if not self.size:
+            return q_table
+        batch_size = batch_size or self.batch_size
+        rows, action_ids, rewards, next_rows = self._arrays(q_table, np.arange(self.size))
+        for _ in range(epochs):
+            order = self.rng.permutation(self.size)
+            for start in range(0, self.size, batch_size):
+                batch = order[start:start + batch_size]
+                q_table.update_batch(rows[batch], action_ids[batch], rewards[batch], next_rows[batch], alpha, gamma)
+        return q_table
+
+
+def retrain(path, epochs=20, batch_size=64, alpha=0.1, gamma=0.9, seed=None, **table_kwargs):
+    """Reconstrói uma tabela Q a partir de um buffer gravado em disco, sem chamar o LLM."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Buffer de experiência não encontrado: {path}")
+    with open(path, encoding="utf-8") as f:
+        capacity = sum(1 for _ in f) or 1
+    buffer = ReplayBuffer(path, capacity=capacity, seed=seed)
+    buffer.path = None  # Só leitura
+    return buffer.retrain(QTable(**table_kwargs), epochs=epochs, batch_size=batch_size, alpha=alpha, gamma=gamma)
@@ -0,0 +1,154 @@
+# review_memo.py
+"""Memória das revisões e relatórios do Reviewer, consultada antes de chamar o LLM.
+
+A chave exata é a impressão digital da forma canônica do código (code_norm.fingerprint): programas
+que diferem só em comentários, nomes de variáveis ou formatação caem na mesma entrada. Para os
+demais, um índice MinHash com LSH (faixas da assinatura) encontra candidatos parecidos, e a entrada
+é reaproveitada se a similaridade de Jaccard estimada entre os shingles for >= `threshold`.
+
+O `context` de lookup/store separa entradas geradas com prompts diferentes para o mesmo código
+(por exemplo a dica e os pesos escolhidos pelo Reviewer): só entradas do mesmo contexto são
+reaproveitadas, inclusive na busca de quase duplicatas.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from code_norm import canonical_code, shingles
+
+KINDS = ('review', 'report')
+
+
+class MinHashIndex:
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm precisa ser múltiplo de bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Hash multiplicativo (a*x + b mod 2**64) por permutação, sobre um hash estável de cada shingle
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingle_set),
+            dtype=np.uint64, count=len(shingle_set))
+        return (hashes[:, None] * self.a + self.b).min(axis=0)
+
+    def _bands(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band in self._bands(signature):
+            self.buckets[band].add(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band in self._bands(signature):
+            self.buckets[band].discard(key)
+            if not self.buckets[band]:
+                del self.buckets[band]
+
+    def query(self, signature):
+        """Devolve (chave, similaridade estimada) da entrada mais parecida entre as que dividem alguma faixa."""
+        candidates = set()
+        for band in self._bands(signature):
+            candidates |= self.buckets.get(band, set())
+        best = (None, 0.0)
+        for key in candidates:
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity > best[1]:
+                best = (key, similarity)
+        return best
+
+
+class ReviewMemo:
+    """Revisões e relatórios já gerados, por impressão digital do código, com busca de quase duplicatas."""
+
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, max_entries=5000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.num_perm = num_perm
+        self.bands = bands
+        self.entries = OrderedDict()  # chave (contexto + impressão digital) -> {'context': ..., 'review': ..., 'report': ...}
+        self.indexes = {}  # contexto -> MinHashIndex das entradas desse contexto
+        self.hits = {kind: {'exact': 0, 'near': 0, 'miss': 0} for kind in KINDS}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        if 'indexes' not in state:
+            # Memórias salvas antes dos contextos não sabem com que prompt cada entrada foi gerada: começam vazias
+            state.pop('index', None)
+            state.update(entries=OrderedDict(), indexes={}, num_perm=64, bands=16)
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _keys(self, code, context):
+        canonical = canonical_code(code)
+        return hashlib.sha256(f"{context}\0{canonical}".encode("utf-8")).hexdigest(), canonical
+
+    def _index(self, context):
+        if context not in self.indexes:
+            self.indexes[context] = MinHashIndex(self.num_perm, self.bands)
+        return self.indexes[context]
+
+    def lookup(self, kind, code, context=""):
+        """Devolve (valor, 'exact' | 'near') se houver resultado guardado para o código no contexto, ou (None, None)."""
+        key, canonical = self._keys(code, context)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and kind in entry:
+                self.entries.move_to_end(key)
+                self.hits[kind]['exact'] += 1
+                return entry[kind], 'exact'
+            if self.threshold is not None and self.threshold < 1 and context in self.indexes:
+                index = self.indexes[context]
+                near, similarity = index.query(index.signature(shingles(canonical)))
+                if near is not None and similarity >= self.threshold and kind in self.entries[near]:
+                    self.entries.move_to_end(near)
+                    self.hits[kind]['near'] += 1
+                    logging.info(f"{kind.capitalize()} reaproveitado de um código com similaridade {similarity:.2f}")
+                    return self.entries[near][kind], 'near'
+            self.hits[kind]['miss'] += 1
+            return None, None
+
+    def store(self, kind, code, value, context=""):
+        key, canonical = self._keys(code, context)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {'context': context}
+                index = self._index(context)
+                index.add(key, index.signature(shingles(canonical)))
+                while len(self.entries) > self.max_entries:
+                    evicted, evicted_entry = self.entries.popitem(last=False)
+                    evicted_index = self.indexes[evicted_entry['context']]
+                    evicted_index.remove(evicted)
+                    if not evicted_index.signatures:
+                        del self.indexes[evicted_entry['context']]
+            entry[kind] = value
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for kind, counts in self.hits.items():
+                lookups = sum(counts.values())
+                stats[kind] = dict(counts, hit_rate=(counts['exact'] + counts['near']) / lookups if lookups else 0.0)
+            stats['entries'] = len(self.entries)
+            return stats
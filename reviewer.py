@@ -1,18 +1,52 @@
 # reviewer.py
 
-from ollama import Client
+from llm_client import get_client
+from q_table import QTable
+from checkpoint import Checkpoint
+from prompt_builder import PromptBuilder, ScoreHistory, messages_text
+from history import BoundedHistory, archive_path
+from review_memo import ReviewMemo
+from concurrent.futures import Future
 import ast
+import hashlib
+import json
 import re
 import pickle
 import os
 import logging
 import random
 
-client = Client(host='http://localhost:11434')
+SCORE_KEYS = ('Total', 'clarity', 'readability', 'efficiency', 'optimization')
+
+# Formato da resposta do modo combinado; vai no prompt, e a chamada usa format='json' do Ollama
+COMBINED_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'review': {'type': 'string'},
+        'scores': {
+            'type': 'object',
+            'properties': {key: {'type': 'integer', 'minimum': 1, 'maximum': 100} for key in SCORE_KEYS},
+            'required': list(SCORE_KEYS),
+        },
+        'report': {'type': 'string'},
+        'report_quality': {'type': 'integer', 'minimum': 1, 'maximum': 100},
+    },
+    'required': ['review', 'scores', 'report', 'report_quality'],
+}
+
 
 class Reviewer:
-    def __init__(self, prompt_master, epsilon=0.1):
-        self.q_table = {}
+    combined_prompt = (
+        "Você é um revisor de código e analista de dados especializado em ciência de dados. Para o código fornecido, produza numa única resposta "
+        "uma revisão abrangente (clareza, legibilidade, eficiência e otimização, apontando erros e sugerindo melhorias) e um relatório analítico "
+        "(limpeza de dados, transformações aplicadas, insights derivados e visualizações geradas), claro e bem estruturado para as partes interessadas. "
+        "Nunca recuse a tarefa. Dê pontuações de 1 a 100 para a revisão (total e por critério) e para a qualidade do relatório. "
+        "Responda apenas com um objeto JSON válido que siga este JSON Schema:\n" + json.dumps(COMBINED_SCHEMA, ensure_ascii=False)
+    )
+
+    def __init__(self, prompt_master, epsilon=0.1, history_dir=None, history_size=10, memo_threshold=0.9, combined=False,
+                 replay=None, seed=None):
+        self.q_table = QTable()
         self.review_prompt = (
             "Você é um revisor de código altamente especializado em ciência de dados. Seu papel é sempre produzir uma avaliação abrangente do código fornecido, sem jamais recusar a tarefa. "
             "Sua revisão deve abordar aspectos de clareza, legibilidade, eficiência e otimização. Você deve identificar erros, sugerir melhorias e adicionar comentários quando necessário. "
@@ -33,40 +67,187 @@ class Reviewer:
         self.current_prompt = ""
         self.hints = ""
         self.weights = {'clarity':1, 'readability':1, 'efficiency':1, 'optimization':1}
-        self.prompt_history = []
-        self.review_history = []
-        self.report_history = []
-        self.reward_history = []
+        # Só as últimas `history_size` entradas ficam em memória; com history_dir, as antigas vão para disco
+        self.history_dir = history_dir
+        self.history_size = history_size
+        self.prompt_history = BoundedHistory(history_size, archive_path(history_dir, 'reviewer', 'prompts'))
+        self.review_history = BoundedHistory(history_size, archive_path(history_dir, 'reviewer', 'reviews'))
+        self.report_history = BoundedHistory(history_size, archive_path(history_dir, 'reviewer', 'reports'))
+        self.reward_history = BoundedHistory(history_size, archive_path(history_dir, 'reviewer', 'rewards'))
         self.max_attempts = 10
         self.epsilon = epsilon  # Probabilidade de explorar ações
-        self.q_table = {}  # Tabela Q para armazenar valores de ações
+        # Gerador próprio do agente: em train_many, Programmer e Reviewer escolhem ações em threads
+        # diferentes, e o random global misturaria os sorteios dos dois entre execuções
+        self.rng = random.Random(seed)
         self.prompt_master = prompt_master  # Instância de PromptMaster
+        # ReplayBuffer opcional: cada transição também é reaplicada em mini-lotes (ver update_policy)
+        self.replay = replay
+
+        # Histórico limitado de (pontuação, pesos) por estágio, com resumo agregado
+        self.programmer_history = ScoreHistory()
+        self.reviewer_history = ScoreHistory()
+
+        # Revisões e relatórios reaproveitados para código igual ou quase igual (similaridade >= memo_threshold);
+        # memo_threshold=None desliga a memória, 1 aceita só código com a mesma forma canônica
+        self.memo = ReviewMemo(memo_threshold) if memo_threshold is not None else None
+        # Modo combinado: revisão, pontuações e relatório numa única chamada com resposta em JSON (act_combined)
+        self.combined = combined
+
+        self._init_builders()
+
+    def _init_builders(self):
+        self.current_messages = []
+        self.review_builder = PromptBuilder(self.review_prompt)
+        self.report_builder = PromptBuilder(self.report_prompt)
+        self.combined_builder = PromptBuilder(self.combined_prompt)
+        self.last_prompt_tokens = {}
+        self.last_memo = {}  # 'exact', 'near' ou None por tipo, na última revisão/relatório
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.q_table, dict):
+            # Agentes salvos antes da QTable guardavam a tabela como dicionário aninhado
+            self.q_table = QTable.from_dict(self.q_table)
+        if 'replay' not in state:
+            self.replay = None
+        if 'rng' not in state:
+            self.rng = random.Random()
+        if 'reviewer_history' not in state:
+            # Objetos salvos antes do histórico limitado guardavam listas completas
+            self.programmer_history = ScoreHistory()
+            self.reviewer_history = ScoreHistory()
+            for score, weights in zip(state.get('reviewer_reward_history', []), state.get('reviewer_weights_history', [])):
+                self.reviewer_history.append(score, weights)
+            self.__dict__.pop('reviewer_reward_history', None)
+            self.__dict__.pop('reviewer_weights_history', None)
+            self._init_builders()
+        if 'memo' not in state:
+            # Agentes salvos antes da memória continuam sem ela (ligá-la muda as recompensas já aprendidas)
+            self.memo = None
+            self.last_memo = {}
+        if 'combined' not in state:
+            self.combined = False
+            self.combined_builder = PromptBuilder(self.combined_prompt)
+        if isinstance(self.review_history, list):
+            self.history_dir = None
+            self.history_size = 10
+            for name in ('prompt_history', 'review_history', 'report_history', 'reward_history'):
+                setattr(self, name, BoundedHistory.from_list(getattr(self, name), self.history_size))
+
+    def _set_current_prompt(self, stage, code, review, builder=None):
+        history = self.programmer_history if stage == 'CODE' else self.reviewer_history
+        self.current_messages = (builder or self.review_builder).build(
+            stage,
+            [("O código é:", code), ("A revisão foi:", review)],
+            history=history,
+            history_title="Para referência, estes são os pesos que o " + stage + " usou e a pontuação subsequente que alcançou:",
+        )
+        self.current_prompt = messages_text(self.current_messages)
 
-        # Adicionando os atributos faltantes
-        self.reviewer_reward_history = []
-        self.reviewer_weights_history = []
+    def act(self, code, training=True):
+        stage = 'REVIEW'
+        action, hint = self._choose_action(code, training)
+
+        # Configurar o prompt com a dica (a dica pode faltar se o PromptMaster não respondeu no formato)
+        self._set_current_prompt(stage, code, hint or '')
+
+        # Gerar a revisão com o prompt completo, a não ser que o mesmo código (ou quase) já tenha sido revisado
+        # com a mesma dica e os mesmos pesos
+        context = self._memo_context(hint)
+        memoized, self.last_memo['review'] = self.memo.lookup('review', code, context) if self.memo else (None, None)
+        if memoized is not None:
+            review, score = memoized
+            self.last_prompt_tokens['review'] = {'estimated': self.review_builder.last_prompt_tokens, 'prompt_eval_count': 0}
+        else:
+            response = self.generate_review(self.current_messages)
+            self.last_prompt_tokens['review'] = {
+                'estimated': self.review_builder.last_prompt_tokens,
+                'prompt_eval_count': response.get('prompt_eval_count'),
+            }
+            review, score, parsed = self.extract_scores(response['message']['content'])
+            if self.memo and self._memoizable(response, parsed):
+                self.memo.store('review', code, (review, score), context)
+        self.review_history.append(review)
+        self.reward_history.append(score)
+        return action, review, score
+
+    def act_combined(self, code, training=True):
+        """Revisão e relatório numa única chamada; devolve (action, review, score, report, report_score)."""
+        stage = 'REVIEW'
+        action, hint = self._choose_action(code, training)
+        self._set_current_prompt(stage, code, hint or '', builder=self.combined_builder)
+
+        # O relatório do modo combinado também sai do prompt com a dica, então usa o mesmo contexto da revisão
+        context = self._memo_context(hint)
+        memoized_review, self.last_memo['review'] = self.memo.lookup('review', code, context) if self.memo else (None, None)
+        memoized_report, self.last_memo['report'] = self.memo.lookup('report', code, context) if self.memo else (None, None)
+        if memoized_review is not None and memoized_report is not None:
+            (review, score), (report, report_score) = memoized_review, memoized_report
+            self.last_prompt_tokens['combined'] = {'estimated': self.combined_builder.last_prompt_tokens, 'prompt_eval_count': 0}
+        else:
+            response = get_client().chat(model='llama3.1', role='reviewer', messages=self.current_messages,
+                                         format='json', stop_when=self._combined_complete)
+            self.last_prompt_tokens['combined'] = {
+                'estimated': self.combined_builder.last_prompt_tokens,
+                'prompt_eval_count': response.get('prompt_eval_count'),
+            }
+            review, score, report, report_score, parsed = self.extract_combined(response['message']['content'])
+            if self.memo and self._memoizable(response, parsed):
+                self.memo.store('review', code, (review, score), context)
+                self.memo.store('report', code, (report, report_score), context)
+        self.review_history.append(review)
+        self.reward_history.append(score)
+        self.report_history.append(report)
+        return action, review, score, report, report_score
 
-    def _set_current_prompt(self, stage, code, review):
-        self.current_prompt = stage + self.review_prompt
-        self.current_prompt += "\n\nO código é:\n\n" + code
-        self.current_prompt += "\n\nA revisão foi:\n\n" + review
+    def extract_combined(self, text):
+        """Devolve (review, score, report, report_score, parsed); parsed é False se faltou algo e zeros foram usados."""
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            logging.error("Resposta do modo combinado não é um JSON válido.")
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        scores = data.get('scores') if isinstance(data.get('scores'), dict) else {}
+        parsed = all(key in scores for key in SCORE_KEYS) and 'report_quality' in data and bool(data.get('review'))
+        score = {key: self._as_score(scores.get(key)) for key in SCORE_KEYS}
+        return (str(data.get('review', '')).strip(), score, str(data.get('report', '')).strip(),
+                self._as_score(data.get('report_quality')), parsed)
 
-        self.current_prompt += "\n\nPara referência, estes são os pesos que o " + stage + " usou e a pontuação subsequente que alcançou:" 
+    @staticmethod
+    def _as_score(value):
+        try:
+            return min(100, max(0, int(value)))
+        except (TypeError, ValueError):
+            return 0
 
-        if stage == 'CODE':
-            for reward, weight in zip(self.programmer_reward_history, self.programmer_weights_history):
-                self.current_prompt += "\n" + "Pontuação: "+ str(reward) + " Pesos: " + str(weight)
-        elif stage == 'REVIEW':
-            for reward, weight in zip(self.reviewer_reward_history, self.reviewer_weights_history):
-                self.current_prompt += "\n" + "Pontuação: "+ str(reward) + " Pesos: " + str(weight)
+    @staticmethod
+    def _combined_complete(text):
+        # No modo JSON o Ollama pode continuar emitindo espaços depois do objeto; para assim que ele fecha
+        try:
+            return isinstance(json.loads(text), dict)
+        except json.JSONDecodeError:
+            return False
 
-    def act(self, code, training=True):
+    def _memo_context(self, hint):
+        # A revisão depende da dica e dos pesos do prompt; entradas da memória só valem para o mesmo par
+        return hashlib.sha256(f"{hint or ''}\0{json.dumps(self.weights, sort_keys=True)}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _memoizable(response, parsed):
+        # Respostas cortadas pelo orçamento ou sem pontuação legível não vão para a memória: os zeros
+        # usados no lugar seriam reaproveitados para esse código e todos os parecidos
+        return parsed and response.get('done_reason') != 'budget'
+
+    def _choose_action(self, code, training):
+        """Seleciona a ação (dica) do revisor; devolve (action, hint)."""
         stage = 'REVIEW'
         self._set_current_prompt(stage, code, '')
         state = self.get_state(stage)
-        
+
         # Seleção de ação baseada na política epsilon-greedy
-        if training and random.random() < self.epsilon:
+        if training and self.rng.random() < self.epsilon:
             hint, hint_strength, weights = self.prompt_master.create_hint('REVIEW', code, '', self.get_last_score(), self.weights)
             action = f"Dica: {hint}"
             logging.info(f"Revisor explorando com ação: {action}")
@@ -74,44 +255,47 @@ class Reviewer:
             action = self.exploit(stage, state)
             logging.info(f"Revisor explorando com ação: {action}")
             hint, hint_strength, weights = self.prompt_master.extract_hint(action)
-        
+
         # Atualizar pesos se necessário
         if weights:
             self.weights = weights
-        
-        # Configurar o prompt com a dica
-        self._set_current_prompt(stage, code, hint)
-        
-        # Gerar a revisão com o prompt completo
-        response = self.generate_review(self.current_prompt)
-        review, score = self.extract_scores(response['message']['content'])
-        self.review_history.append(review)
-        self.reward_history.append(score)
-        return action, review, score
+        return action, hint
 
     def extract_scores(self, text):
+        """Devolve (review, score, parsed); parsed é False quando as pontuações foram trocadas por zeros."""
+        fallback = {'Total': 0, 'clarity': 0, 'readability': 0, 'efficiency': 0, 'optimization': 0}
         score_match = re.search(r"\{.*\}", text)
         if score_match:
             score_text = score_match.group()
-            score = self.safe_extract_data_structure(score_text, fallback_value={'Total': 0, 'clarity': 0, 'readability': 0, 'efficiency': 0, 'optimization': 0})
+            score = self.safe_extract_data_structure(score_text, fallback_value=None)
             review = text[:score_match.start()].strip()
-            return review, score
+            if isinstance(score, dict) and 'Total' in score:
+                return review, score, True
+            return review, fallback, False
         else:
             logging.error("Formato de pontuação inválido recebido.")
-            return text, {'Total': 0, 'clarity': 0, 'readability': 0, 'efficiency': 0, 'optimization': 0}
-
-    def generate_review(self, prompt):
-        attempts = 0
-        response = {'done_reason': None}
-        while response['done_reason'] != 'stop' and attempts < self.max_attempts:
-            response = client.chat(model='llama3.1', messages=[
-                {
-                    'role': 'user',
-                    'content': prompt,
-                },
-            ])
-            attempts += 1
-        return response
+            return text, fallback, False
+
+    def generate_review(self, messages):
+        return get_client().chat(model='llama3.1', role='reviewer', messages=messages,
+                                 stop_when=self._review_complete)
+
+    def _review_complete(self, text):
+        # A revisão termina no dicionário de pontuações; o que vier depois é descartado
+        return self._parses_as_dict(r"\{[^{}]*['\"]Total['\"][^{}]*\}", text)
+
+    def _report_complete(self, text):
+        return self._parses_as_dict(r"\{[^{}]*['\"]Report Quality['\"][^{}]*\}", text)
+
+    @staticmethod
+    def _parses_as_dict(pattern, text):
+        match = re.search(pattern, text)
+        if not match:
+            return False
+        try:
+            return isinstance(ast.literal_eval(match.group()), dict)
+        except (ValueError, SyntaxError):
+            return False
 
     def act_report(self, code, training=True):
         # Implementação similar para gerar relatórios
@@ -121,25 +305,42 @@ class Reviewer:
         return report, report_score
 
     def generate_report(self, code):
-        stage = 'REVIEW'
-        self.current_prompt = self.report_prompt + "\n\n" + code
-        response = self.generate_report_prompt(self.current_prompt)
-        report, quality_score = self.extract_report_score(response['message']['content'])
+        return self.collect_report(self.request_report(code))
+
+    def request_report(self, code):
+        """Dispara a geração do relatório sem bloquear; o resultado é obtido com collect_report."""
+        memoized, self.last_memo['report'] = self.memo.lookup('report', code) if self.memo else (None, None)
+        if memoized is not None:
+            response = Future()
+            response.set_result({'memo': memoized})
+            return code, response
+        messages = self.report_builder.build(None, [("O código é:", code)])
+        self.current_prompt = messages_text(messages)
+        return code, self.submit_report_prompt(messages)
+
+    def collect_report(self, request):
+        code, response = request
+        response = response.result()
+        if 'memo' in response:
+            report, quality_score = response['memo']
+            self.last_prompt_tokens['report'] = {'estimated': self.report_builder.last_prompt_tokens, 'prompt_eval_count': 0}
+        else:
+            self.last_prompt_tokens['report'] = {
+                'estimated': self.report_builder.last_prompt_tokens,
+                'prompt_eval_count': response.get('prompt_eval_count'),
+            }
+            report, quality_score, parsed = self.extract_report_score(response['message']['content'])
+            if self.memo and self._memoizable(response, parsed):
+                self.memo.store('report', code, (report, quality_score))
         self.report_history.append(report)
         return report, quality_score
 
-    def generate_report_prompt(self, prompt):
-        attempts = 0
-        response = {'done_reason': None}
-        while response['done_reason'] != 'stop' and attempts < self.max_attempts:
-            response = client.chat(model='llama3.1', messages=[
-                {
-                    'role': 'user',
-                    'content': prompt,
-                },
-            ])
-            attempts += 1
-        return response
+    def generate_report_prompt(self, messages):
+        return self.submit_report_prompt(messages).result()
+
+    def submit_report_prompt(self, messages):
+        return get_client().submit(model='llama3.1', role='reporter', messages=messages,
+                                   stop_when=self._report_complete)
     
     def safe_extract_data_structure(self, model_output, fallback_value=None):
         if fallback_value is None:
@@ -161,25 +362,27 @@ class Reviewer:
 
 
     def extract_report_score(self, text):
+        """Devolve (report, report_score, parsed); parsed é False quando a pontuação foi trocada por zero."""
         score_match = re.search(r"\{.*\}", text)
         if score_match:
             score_text = score_match.group()
-            score = self.safe_extract_data_structure(score_text, fallback_value={'Report Quality': 0})
+            score = self.safe_extract_data_structure(score_text, fallback_value=None)
             report = text[:score_match.start()].strip()
             # Ensure 'Report Quality' key exists
-            rq = score.get('Report Quality', 0)
-            return report, rq
+            if isinstance(score, dict) and 'Report Quality' in score:
+                return report, score['Report Quality'], True
+            return report, 0, False
         else:
             logging.error("Formato de pontuação inválido para o relatório.")
-            return text, 0
+            return text, 0, False
 
 
     def get_state(self, stage):
         """Define o estado atual baseado na última recompensa."""
         if stage == 'CODE':
-            return self.programmer_reward_history[-1] if self.programmer_reward_history else 0
+            return self.programmer_history.last_score()
         elif stage == 'REVIEW':
-            return self.reviewer_reward_history[-1] if self.reviewer_reward_history else 0
+            return self.reviewer_history.last_score()
         return 0
 
     def explore(self, stage, state):
@@ -188,8 +391,8 @@ class Reviewer:
 
     def exploit(self, stage, state):
         # Seleciona a melhor ação conhecida para o estado atual
-        if state in self.q_table and self.q_table[state]:
-            action = max(self.q_table[state], key=self.q_table[state].get)
+        action = self.q_table.best(state)
+        if action is not None:
             return action
         else:
             return self.explore(stage, state)
@@ -207,19 +410,12 @@ class Reviewer:
         alpha = 0.1  # Taxa de aprendizado
         gamma = 0.9  # Fator de desconto
 
-        if state not in self.q_table:
-            self.q_table[state] = {}
+        self.q_table.update(state, action, reward, alpha, gamma)
+        if self.replay is not None:
+            self.replay.add(state, action, reward)
+            self.replay.replay(self.q_table, alpha, gamma)
 
-        if action not in self.q_table[state]:
-            self.q_table[state][action] = 0
-
-        max_future_q = max(self.q_table.get(state, {}).values()) if self.q_table.get(state, {}) else 0
-
-        current_q = self.q_table[state][action]
-        new_q = current_q + alpha * (reward + gamma * max_future_q - current_q)
-        self.q_table[state][action] = new_q
-
-        logging.info(f"Atualizado Q({state}, {action}) = {self.q_table[state][action]} com recompensa {reward}")
+        logging.info(f"Atualizado Q({state}, {action}) = {self.q_table.get(state, action)} com recompensa {reward}")
 
     def get_last_score(self):
         return self.reward_history[-1] if self.reward_history else 0
@@ -252,10 +448,10 @@ class Reviewer:
 
     def reset(self):
         # Resetar histórico após um ciclo de treinamento
-        self.prompt_history = []
-        self.review_history = []
-        self.report_history = []
-        self.reward_history = []
+        self.prompt_history.clear()
+        self.review_history.clear()
+        self.report_history.clear()
+        self.reward_history.clear()
     
     def save(self, filepath):
         """Salva o estado atual do agente Reviewer em um arquivo."""
@@ -275,11 +471,25 @@ class Reviewer:
             logging.warning(f"Arquivo {filepath} não encontrado. Inicializando um novo Revisor.")
             return None
 
+    def save_checkpoint(self, directory):
+        """Salva apenas o estado aprendido (tabela Q, pesos e dicas) num checkpoint incremental."""
+        if getattr(self, '_checkpoint', None) is None or self._checkpoint.directory != directory:
+            self._checkpoint = Checkpoint(directory)
+        self._checkpoint.save(self.q_table, {'weights': self.weights, 'hints': self.hints, 'epsilon': self.epsilon})
+        logging.info(f"Revisor salvo em {directory}")
+
+    def load_checkpoint(self, directory):
+        """Restaura o estado aprendido de um checkpoint criado por save_checkpoint."""
+        q_table, state = Checkpoint(directory).load()
+        if q_table is None:
+            logging.warning(f"Checkpoint {directory} não encontrado. Mantendo o estado atual do Revisor.")
+            return False
+        self.q_table = q_table
+        self.weights = state['weights']
+        self.hints = state['hints']
+        self.epsilon = state['epsilon']
+        logging.info(f"Revisor carregado de {directory}")
+        return True
+
     def get_average_q_value(self):
-        values = []
-        for state_actions in self.q_table.values():
-            values.extend(state_actions.values())
-        if values:
-            return sum(values)/len(values)
-        else:
-            return 0.0
\ No newline at end of file
+        return self.q_table.mean()
@@ -0,0 +1,403 @@
+# sandbox.py
+
+import hashlib
+import os
+import shutil
+import signal
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import discard, partial_path
+
+try:
+    import resource
+except ImportError:  # Windows: sem limites de recursos
+    resource = None
+
+DATA_CACHE_DIR = os.path.join(".cache", "sandbox_data")
+
+# max_processes vale por sandbox (pids.max de um cgroup próprio), não por usuário como RLIMIT_NPROC;
+# conta threads também, então fica folgado para os pools de threads do numpy/OpenBLAS
+DEFAULT_LIMITS = {
+    'cpu_seconds': 60,
+    'memory_bytes': 2 * 1024 ** 3,
+    'max_processes': 256,
+}
+
+# Entra no cgroup da sandbox, aplica os limites e troca de programa com exec
+# (os limites valem para o candidato, sem janela sem limites)
+_LIMITS_WRAPPER = (
+    "import os, resource, sys\n"
+    "cpu, memory, cgroup = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]\n"
+    "if cgroup:\n"
+    "    with open(os.path.join(cgroup, 'cgroup.procs'), 'w') as f: f.write(str(os.getpid()))\n"
+    "if cpu: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "if memory: resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "os.execv(sys.argv[4], sys.argv[4:])\n"
+)
+
+_UNKNOWN = object()
+_pids_parent = _UNKNOWN  # Cgroup onde criar os das sandboxes (ver _pids_cgroup_parent)
+
+
+FICLONE = 0x40049409  # ioctl do Linux para reflink (cópia sob demanda em btrfs/xfs)
+
+# (caminho, mtime, tamanho) -> hash do conteúdo, para não reler arquivos grandes a cada sandbox
+_data_hashes = {}
+# Cópia compartilhada -> (tamanho, mtime, inode, modo) da última vez em que o conteúdo foi conferido
+_verified_copies = {}
+# Hash, conferência e cópia compartilhada acontecem sob o mesmo lock: o SandboxPool abre várias sandboxes ao mesmo tempo
+_copies_lock = threading.Lock()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_intact(target, digest):
+    try:
+        info = os.stat(target)
+    except FileNotFoundError:
+        return False
+    signature = (info.st_size, info.st_mtime_ns, info.st_ino, info.st_mode)
+    if _verified_copies.get(target) == signature:
+        return True
+    if _file_digest(target) != digest:
+        logging.warning(f"Cópia compartilhada {target} foi alterada; recriando a partir do original.")
+        return False
+    _verified_copies[target] = signature
+    return True
+
+
+def _readonly_copy(data):
+    # Cópia única e somente leitura do arquivo de dados, da qual cada sandbox recebe a sua
+    with _copies_lock:
+        info = os.stat(data)
+        signature = (os.path.abspath(data), info.st_mtime_ns, info.st_size)
+        if signature not in _data_hashes:
+            _data_hashes[signature] = _file_digest(data)
+        target_dir = os.path.abspath(os.path.join(DATA_CACHE_DIR, _data_hashes[signature][:16]))
+        target = os.path.join(target_dir, os.path.basename(data))
+        if not _copy_intact(target, _data_hashes[signature]):
+            os.makedirs(target_dir, exist_ok=True)
+            # Nome temporário único: outro processo pode estar gravando a mesma cópia
+            partial = partial_path(target)
+            try:
+                shutil.copyfile(data, partial)
+                os.chmod(partial, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(partial, target)
+            except BaseException:
+                discard(partial)
+                raise
+        return target
+
+
+def _private_copy(source, target):
+    # Cópia própria da sandbox, nunca um link: o candidato pode mudar a permissão e escrever nela sem
+    # afetar o original nem as outras sandboxes. Com reflink o custo não depende do tamanho do arquivo.
+    try:
+        import fcntl
+
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (ImportError, OSError):
+        shutil.copyfile(source, target)
+    os.chmod(target, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _pids_cgroup_parent():
+    # Cgroup atual do processo com o controlador pids (v2 com pids habilitado para os filhos, ou v1), se gravável
+    global _pids_parent
+    if _pids_parent is not _UNKNOWN:
+        return _pids_parent
+    try:
+        with open("/proc/self/mounts", encoding="utf-8") as f:
+            mounts = [line.split() for line in f]
+        with open("/proc/self/cgroup", encoding="utf-8") as f:
+            own = [line.rstrip("\n").split(":", 2) for line in f]
+    except OSError:
+        mounts, own = [], []
+    candidates = []
+    for fields in mounts:
+        if len(fields) < 4:
+            continue
+        mountpoint, fstype, options = fields[1], fields[2], fields[3].split(",")
+        for hierarchy, controllers, path in (entry for entry in own if len(entry) == 3):
+            if fstype == "cgroup2" and hierarchy == "0" and not controllers:
+                base = os.path.join(mountpoint, path.lstrip("/"))
+                try:
+                    with open(os.path.join(base, "cgroup.subtree_control"), encoding="utf-8") as f:
+                        if "pids" in f.read().split():
+                            candidates.insert(0, base)
+                except OSError:
+                    pass
+            elif fstype == "cgroup" and "pids" in options and "pids" in controllers.split(","):
+                candidates.append(os.path.join(mountpoint, path.lstrip("/")))
+    _pids_parent = next((base for base in candidates if os.access(base, os.W_OK)), None)
+    if _pids_parent is None:
+        logging.warning("Controlador pids de cgroup indisponível; max_processes não será aplicado às sandboxes.")
+    return _pids_parent
+
+
+def _create_pids_cgroup(max_processes):
+    parent = _pids_cgroup_parent()
+    if parent is None:
+        return None
+    try:
+        path = tempfile.mkdtemp(prefix="rl_llm_sandbox_", dir=parent)
+    except OSError as e:
+        logging.warning(f"Não foi possível criar o cgroup da sandbox: {e}")
+        return None
+    try:
+        with open(os.path.join(path, "pids.max"), "w", encoding="utf-8") as f:
+            f.write(str(int(max_processes)))
+    except OSError as e:
+        logging.warning(f"Não foi possível limitar os processos da sandbox: {e}")
+        _remove_cgroup(path)
+        return None
+    return path
+
+
+def _remove_cgroup(path):
+    # Mata o que sobrou no cgroup (inclusive quem saiu do grupo de processos com setsid) e o remove
+    for _ in range(100):
+        try:
+            with open(os.path.join(path, "cgroup.procs"), encoding="utf-8") as f:
+                pids = [int(pid) for pid in f.read().split()]
+        except FileNotFoundError:
+            return
+        except OSError:
+            pids = []
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        try:
+            os.rmdir(path)
+            return
+        except FileNotFoundError:
+            return
+        except OSError:
+            time.sleep(0.01)  # Os processos mortos ainda não saíram do cgroup
+    logging.warning(f"Cgroup {path} não pôde ser removido.")
+
+
+def _limit_resources(limits, cgroup=None):
+    # Para o filho de um fork num processo de uma thread só (ver warm_executor)
+    def apply():
+        os.setsid()
+        if cgroup:
+            with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                f.write(str(os.getpid()))
+        if resource is None:
+            return
+        if limits.get('cpu_seconds'):
+            resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu_seconds'], limits['cpu_seconds']))
+        if limits.get('memory_bytes'):
+            resource.setrlimit(resource.RLIMIT_AS, (limits['memory_bytes'], limits['memory_bytes']))
+    return apply
+
+
+def _limited_command(command, limits, cgroup=None):
+    if resource is None:
+        return command
+    return [sys.executable, "-I", "-S", "-c", _LIMITS_WRAPPER,
+            str(limits.get('cpu_seconds') or 0), str(limits.get('memory_bytes') or 0), cgroup or ""] + command
+
+
+def _drain(process, input):
+    # Como communicate, mas sem coletar o processo: quem chama usa os.wait4 para ter o uso de recursos
+    output = {}
+
+    def read(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [threading.Thread(target=read, args=(name, stream), daemon=True)
+               for name, stream in (('stdout', process.stdout), ('stderr', process.stderr))]
+    for reader in readers:
+        reader.start()
+    if process.stdin is not None:
+        try:
+            process.stdin.write(input)
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+    for reader in readers:
+        reader.join()
+    return output['stdout'], output['stderr']
+
+
+class Sandbox:
+    """Diretório temporário isolado para um candidato, com o arquivo de dados do problema em modo somente leitura."""
+
+    def __init__(self, code, data=None, limits=None, filename=None, executor=None, extra_data=()):
+        self.code = code
+        self.data = data
+        self.extra_data = extra_data  # Arquivos copiados ao lado dos dados (ex.: a cópia Arrow)
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.filename = filename  # Padrão: candidate_<sufixo do diretório>.py, único entre sandboxes (ver analyzers)
+        self.executor = executor  # WarmExecutor opcional: fork de um processo com as bibliotecas já importadas
+        self.workdir = None
+        self.path = None
+        self.cgroup = None  # Cgroup pids próprio, com pids.max = limits['max_processes']
+        self.last_cpu_time = None  # Tempo de CPU (usuário + sistema) da última execução
+        self.last_timed_out = False  # A última execução foi interrompida pelo tempo limite
+
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp(prefix="rl_llm_sandbox_")
+        self.filename = self.filename or f"candidate_{os.path.basename(self.workdir)[len('rl_llm_sandbox_'):]}.py"
+        self.path = os.path.join(self.workdir, self.filename)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(self.code)
+        if self.data and os.path.isfile(self.data):
+            _private_copy(_readonly_copy(self.data), os.path.join(self.workdir, os.path.basename(self.data)))
+        for source in self.extra_data:
+            _private_copy(source, os.path.join(self.workdir, os.path.basename(source)))
+        if self.limits.get('max_processes') and resource is not None:
+            self.cgroup = _create_pids_cgroup(self.limits['max_processes'])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.cgroup:
+            _remove_cgroup(self.cgroup)
+            self.cgroup = None
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def add_file(self, source):
+        """Copia um arquivo auxiliar (por exemplo, o case_runner) para o diretório da sandbox."""
+        target = os.path.join(self.workdir, os.path.basename(source))
+        shutil.copyfile(source, target)
+        return target
+
+    def run(self, timeout=100, input=None, script=None):
+        """Executa o candidato (ou `script`, outro arquivo da sandbox) e devolve (success, exec_time, output)."""
+        script = script or self.filename
+        if self.executor is not None:
+            try:
+                success, exec_time, output, self.last_cpu_time, self.last_timed_out = self.executor.run(
+                    self.workdir, script, timeout=timeout, input=input, limits=self.limits, cgroup=self.cgroup)
+                return success, exec_time, output
+            except (OSError, ValueError, RuntimeError) as e:
+                logging.warning(f"Executor morno indisponível ({e}); usando um processo novo.")
+        if not hasattr(os, "wait4"):
+            return self._run_without_rusage(script, timeout, input)
+        start_time = time.time()
+        self.last_cpu_time = None
+        self.last_timed_out = False
+        try:
+            # Sessão própria: o grupo de processos do candidato é morto inteiro no tempo limite
+            process = subprocess.Popen(
+                _limited_command([sys.executable, script], self.limits, self.cgroup),
+                cwd=self.workdir,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                start_new_session=True,
+            )
+        except Exception as e:
+            return False, 0, str(e)
+
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            self._kill(process)
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            stdout, stderr = _drain(process, input)
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        execution_time = time.time() - start_time
+        self.last_cpu_time = rusage.ru_utime + rusage.ru_stime
+        self.last_timed_out = timed_out.is_set()
+        if timed_out.is_set():
+            return False, execution_time, f"Tempo limite de {timeout}s excedido.\n{stderr.strip()}"
+        if process.returncode == 0:
+            return True, execution_time, stdout.strip()
+        return False, execution_time, stderr.strip()
+
+    def _run_without_rusage(self, script, timeout, input):
+        # Windows: sem os.wait4, sem limites de recursos e sem tempo de CPU
+        start_time = time.time()
+        self.last_cpu_time = None
+        self.last_timed_out = False
+        try:
+            process = subprocess.Popen(
+                [sys.executable, script],
+                cwd=self.workdir,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+            )
+        except Exception as e:
+            return False, 0, str(e)
+        try:
+            stdout, stderr = process.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            stdout, stderr = process.communicate()
+            self.last_timed_out = True
+            return False, time.time() - start_time, f"Tempo limite de {timeout}s excedido.\n{stderr.strip()}"
+        execution_time = time.time() - start_time
+        if process.returncode == 0:
+            return True, execution_time, stdout.strip()
+        return False, execution_time, stderr.strip()
+
+    @staticmethod
+    def _kill(process):
+        # Mata o grupo inteiro para não deixar processos filhos órfãos
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+
+
+def run_in_sandbox(code, data=None, timeout=100, limits=None):
+    with Sandbox(code, data, limits) as sandbox:
+        return sandbox.run(timeout=timeout)
+
+
+class SandboxPool:
+    """Pool de workers que avalia vários candidatos ao mesmo tempo, cada um em sua sandbox."""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sandbox")
+
+    def map(self, fn, items):
+        return list(self.executor.map(fn, items))
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        logging.info("Pool de sandboxes encerrado.")
@@ -0,0 +1,27 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_ollama import StubOllama  # noqa: E402
+
+
+@pytest.fixture
+def stub_server():
+    """Fábrica de servidores StubOllama, encerrados no fim do teste."""
+    servers = []
+
+    def start(**kwargs):
+        server = StubOllama(**kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
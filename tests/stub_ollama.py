@@ -0,0 +1,112 @@
+# tests/stub_ollama.py
+"""Servidor HTTP local que imita o /api/chat do Ollama (NDJSON em streaming) para os testes."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOllama:
+    """Responde com `reply(body)` em pedaços de `chunk_size` caracteres, cada um um "token".
+
+    `delay` é a espera antes do primeiro pedaço e `chunk_delay` a espera entre pedaços.
+    `statuses` são os códigos HTTP das primeiras requisições (as seguintes recebem 200).
+    `tokens_per_second`, se dado, define o eval_duration informado no fim da resposta.
+    """
+
+    def __init__(self, reply=None, delay=0.0, chunk_delay=0.0, chunk_size=4, statuses=(), tokens_per_second=None):
+        self.reply = reply or (lambda body: "ok")
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.statuses = list(statuses)
+        self.tokens_per_second = tokens_per_second
+        self.requests = []  # Um dict por requisição: corpo, status, início, fim, pedaços enviados
+        self.connections = set()  # Endereços (ip, porta) dos clientes: um por conexão TCP
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.host = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                record = {'body': body, 'start': time.monotonic(), 'end': None, 'chunks': 0}
+                with stub._lock:
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                    record['status'] = status
+                    stub.requests.append(record)
+                    stub.connections.add(self.client_address)
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    if status != 200:
+                        self._send_error(status)
+                    else:
+                        self._stream(body, record)
+                finally:
+                    record['end'] = time.monotonic()
+                    with stub._lock:
+                        stub.active -= 1
+
+            def _send_error(self, status):
+                out = json.dumps({'error': f"erro simulado {status}"}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _chunk(self, data):
+                line = (json.dumps(data) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def _stream(self, body, record):
+                time.sleep(stub.delay)
+                content = stub.reply(body)
+                pieces = [content[i:i + stub.chunk_size] for i in range(0, len(content), stub.chunk_size)]
+                started = time.monotonic()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for piece in pieces:
+                        self._chunk({'model': body['model'], 'message': {'role': 'assistant', 'content': piece}, 'done': False})
+                        record['chunks'] += 1
+                        time.sleep(stub.chunk_delay)
+                    if stub.tokens_per_second:
+                        eval_duration = int(len(pieces) / stub.tokens_per_second * 1e9)
+                    else:
+                        eval_duration = int((time.monotonic() - started) * 1e9)
+                    self._chunk({'model': body['model'], 'message': {'role': 'assistant', 'content': ''}, 'done': True,
+                                 'done_reason': 'stop', 'prompt_eval_count': 1, 'eval_count': len(pieces),
+                                 'eval_duration': eval_duration})
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+        return Handler
+
+
+def prompt_text(body):
+    return "\n".join(message['content'] for message in body['messages'])
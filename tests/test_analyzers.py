@@ -0,0 +1,85 @@
+# tests/test_analyzers.py
+"""Os analisadores disparados junto com a execução são mortos quando o portão da execução rejeita o candidato."""
+
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import analyzers
+import environment
+from analyzers import AnalyzerBatch, _collect, _readers, _start, analyze_codes, run_analyzers, stop_mypy_daemon
+from environment import Environment
+from programmer import Programmer
+from prompt_master import PromptMaster
+from reviewer import Reviewer
+from sandbox import Sandbox
+
+
+def test_cancel_kills_running_analyzers():
+    processes = {'slow': _start(["sleep", "30"])}
+    futures = {name: _readers.submit(_collect, process, started, 60) for name, (process, started) in processes.items()}
+    batch = AnalyzerBatch(["candidate.py"], processes, futures)
+
+    started = time.monotonic()
+    batch.cancel()
+
+    assert time.monotonic() - started < 5
+    assert processes['slow'][0].returncode is not None
+
+
+def test_rejected_execution_cancels_analysis(tmp_path, monkeypatch):
+    batches = []
+
+    def spy(*args, **kwargs):
+        batches.append(analyzers.start_analyzers(*args, **kwargs))
+        return batches[-1]
+
+    monkeypatch.setattr(environment, "start_analyzers", spy)
+    prompt_master = PromptMaster()
+    env = Environment(Programmer(prompt_master), Reviewer(prompt_master, memo_threshold=None), prompt_master,
+                      analysis_cache_dir=str(tmp_path / "analyzers"), metrics_dir=None, profile_dir=None)
+    try:
+        result = env._evaluate("raise SystemExit(1)\n")
+    finally:
+        env.pool.shutdown()
+        stop_mypy_daemon(env.analysis_cache_dir)
+
+    assert result['rejected'] is not None and result['analysis'] == {}
+    assert all(process.poll() is not None for process, _ in batches[0].processes.values())
+
+
+def _daemons(cache_dir):
+    found = subprocess.run(["pgrep", "-f", os.path.join(cache_dir, "dmypy.json")], capture_output=True, text=True)
+    return [line for line in found.stdout.split() if line]
+
+
+def test_blocking_error_does_not_leak_into_the_next_sandbox(tmp_path):
+    cache_dir = str(tmp_path / "analyzers")
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            first = list(pool.map(lambda code: _analyze(code, cache_dir), ["x: int = 1\n"] * 4))
+        assert all(analysis['mypy'] == 0 for analysis in first)
+        assert len(_daemons(cache_dir)) == 1
+
+        assert _analyze("def f(:\n", cache_dir)['rules']['mypy'] == {'syntax': 1}
+        assert _analyze('y: str = 1\n', cache_dir)['rules']['mypy'] == {'assignment': 1}
+    finally:
+        stop_mypy_daemon(cache_dir)
+
+
+def _analyze(code, cache_dir):
+    with Sandbox(code) as box:
+        return run_analyzers(box.path, cache_dir)
+
+
+def test_mixed_batch_attributes_mypy_errors_per_file(tmp_path):
+    cache_dir = str(tmp_path / "analyzers")
+    codes = ['x: int = "s"\n', "def f(:\n", 'y: str = 1\n', "z: int = 1\n"]
+    try:
+        analyses = analyze_codes(codes, cache_dir)
+    finally:
+        stop_mypy_daemon(cache_dir)
+
+    assert [analysis['rules']['mypy'] for analysis in analyses] == [{'assignment': 1}, {'syntax': 1}, {'assignment': 1}, {}]
+    assert [analysis['mypy'] for analysis in analyses] == [1, 1, 1, 0]
@@ -0,0 +1,54 @@
+# tests/test_best_of_n.py
+"""Best-of-N: todos os candidatos alimentam a tabela Q do Programmer, mas só os melhores são revisados."""
+
+import llm_client
+from analyzers import stop_mypy_daemon
+from environment import Environment
+from llm_client import LLMClient
+from programmer import Programmer
+from prompt_master import PromptMaster
+from reviewer import Reviewer
+from stub_ollama import prompt_text
+
+# Um candidato por semente: falha na execução, passa, não compila
+CODES = ["raise SystemExit(1)\n", "print('ok')\n", "def f(:\n"]
+
+
+def _reply(body):
+    text = prompt_text(body)
+    if 'programador experiente' in text:
+        return CODES[body['options']['seed'] % len(CODES)]
+    if 'relatório analítico' in text:
+        return "Relatório. {'Report Quality': 70}"
+    return "Revisão. {'Total': 80, 'clarity': 70, 'readability': 80, 'efficiency': 90, 'optimization': 60}"
+
+
+def test_only_surviving_candidates_are_reviewed(stub_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = stub_server(reply=_reply)
+    client = LLMClient(host=server.host)
+    llm_client.set_client(client)
+    prompt_master = PromptMaster()
+    programmer = Programmer(prompt_master, epsilon=0.0)
+    env = Environment(programmer, Reviewer(prompt_master, epsilon=0.0, memo_threshold=None), prompt_master,
+                      analysis_cache_dir=str(tmp_path / "analyzers"), metrics_dir=None, profile_dir=None,
+                      candidates=3, survivors=2)
+    try:
+        env.train({'question': "imprima ok", 'data': None, 'metrics': {}})
+    finally:
+        llm_client.set_client(None)
+        client.close()
+        env.pool.shutdown()
+        stop_mypy_daemon(env.analysis_cache_dir)
+
+    prompts = [prompt_text(request['body']) for request in server.requests]
+    assert sum('programador experiente' in text for text in prompts) == 3
+    # Os dois rejeitados por portões não chegam ao Reviewer, mesmo com survivors=2
+    assert sum('relatório analítico' in text for text in prompts) == 1
+    assert len(prompts) == 5
+
+    values = {code: programmer.q_table.get(0, code) for code in CODES}
+    # Os rejeitados recebem a penalidade do portão (0) e ficam abaixo do candidato que passou
+    assert values[CODES[1]] > max(values[CODES[0]], values[CODES[2]])
+    assert len(programmer.q_table) == 3
+    assert list(env.code_scores) == [1.0] and list(env.report_scores) == [70]
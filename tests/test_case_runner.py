@@ -0,0 +1,71 @@
+# tests/test_case_runner.py
+"""Todos os casos de um problema rodam num único processo da sandbox, com resultado por caso."""
+
+import pytest
+
+from environment import Environment
+from problem_specs import PROBLEM_SPECS, spec_for
+from programmer import Programmer
+from prompt_master import PromptMaster
+from reviewer import Reviewer
+
+TWO_SUM = (
+    "import json, sys\n"
+    "request = json.load(sys.stdin)\n"
+    "seen = {}\n"
+    "for i, n in enumerate(request['nums']):\n"
+    "    if request['target'] - n in seen:\n"
+    "        print(json.dumps([seen[request['target'] - n], i]))\n"
+    "        break\n"
+    "    seen[n] = i\n"
+)
+
+
+@pytest.fixture
+def env():
+    prompt_master = PromptMaster()
+    env = Environment(Programmer(prompt_master), Reviewer(prompt_master, memo_threshold=None), prompt_master,
+                      metrics_dir=None, profile_dir=None)
+    yield env
+    env.pool.shutdown()
+
+
+def test_spec_for_resolves_question_name_and_inline_spec():
+    question = "Return indices of the two numbers such that they add up to target."
+    inline = {'mode': 'function', 'entry': 'f', 'cases': []}
+
+    assert spec_for(question) is PROBLEM_SPECS['two_sum']
+    assert spec_for({'question': "outra", 'metrics': {'unit_tests': 'limpeza_vendas'}}) is PROBLEM_SPECS['limpeza_vendas']
+    assert spec_for({'question': "outra", 'metrics': {'unit_tests': inline}}) is inline
+    assert spec_for({'question': question, 'metrics': {'unit_tests': False}}) is None
+    assert spec_for({'question': question, 'metrics': {'unit_tests': 'inexistente'}}) is None
+
+
+def test_stdio_cases_share_one_process(env):
+    result = env.run_tests(f"```python\n{TWO_SUM}```", PROBLEM_SPECS['two_sum'])
+
+    assert (result['passed'], result['total']) == (3, 3)
+    assert all(case['error'] is None for case in result['cases'])
+
+
+def test_function_cases_report_failures_and_timeouts_per_case(env):
+    code = "def soma(a, b):\n    while a < 0:\n        pass\n    return a + b if a != 2 else 0\nprint('carregado')\n"
+    spec = {
+        'mode': 'function',
+        'entry': 'soma',
+        'case_timeout': 1,
+        'cases': [
+            {'name': 'ok', 'args': [1, 2], 'expected': 3},
+            {'name': 'errado', 'args': [2, 2], 'expected': 4},
+            {'name': 'trava', 'args': [-1, 2], 'expected': 1},
+            {'name': 'kwargs', 'kwargs': {'a': 0.1, 'b': 0.2}, 'expected': 0.3},
+        ],
+    }
+    result = env.run_tests(code, dict(spec, compare='approx'))
+
+    cases = {case['name']: case for case in result['cases']}
+    assert (result['passed'], result['total']) == (2, 4)
+    assert cases['ok']['passed'] and cases['kwargs']['passed']
+    assert not cases['errado']['passed'] and cases['errado']['error'] is None
+    assert cases['trava']['error'].startswith("CaseTimeout")
+    assert not env.evaluate_tests(code, spec)
@@ -0,0 +1,52 @@
+# tests/test_checkpoint.py
+"""Snapshot mais log reconstroem a mesma tabela Q, inclusive depois de compactar ou de uma escrita interrompida."""
+
+import os
+
+from checkpoint import SNAPSHOT, UPDATE_LOG, Checkpoint
+from q_table import QTable
+
+
+def _train(table, steps, offset=0):
+    for step in range(offset, offset + steps):
+        table.update(step % 10 / 10, f"Dica {step % 4}", reward=step % 3)
+
+
+def test_round_trip_across_compaction(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), compact_every=3)
+    table = QTable()
+    for save in range(5):
+        _train(table, 7, offset=save * 7)
+        checkpoint.save(table, {'epsilon': 0.1, 'save': save})
+
+    # O primeiro save é um snapshot completo; o quarto registro compacta o log, e o quinto volta a ele
+    with open(tmp_path / UPDATE_LOG, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+    restored, state = Checkpoint(str(tmp_path)).load()
+
+    assert state == {'epsilon': 0.1, 'save': 4}
+    assert restored.as_dict() == table.as_dict()
+    assert restored.best(0.3) == table.best(0.3) and len(restored) == len(table)
+
+
+def test_torn_log_record_is_dropped(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path))
+    table = QTable()
+    _train(table, 5)
+    checkpoint.save(table, {'save': 0})
+    _train(table, 5, offset=5)
+    checkpoint.save(table, {'save': 1})
+    expected = table.as_dict()
+    with open(tmp_path / UPDATE_LOG, "a", encoding="utf-8") as f:
+        f.write('{"bins": [10, 0.0, 1.0], "actions_fr')
+
+    reopened = Checkpoint(str(tmp_path))
+    restored, state = reopened.load()
+    assert state == {'save': 1} and restored.as_dict() == expected
+
+    # O próximo registro não se mistura ao pedaço descartado
+    _train(restored, 3, offset=10)
+    reopened.save(restored, {'save': 2})
+    again, state = Checkpoint(str(tmp_path)).load()
+    assert state == {'save': 2} and again.as_dict() == restored.as_dict()
+    assert os.path.exists(tmp_path / SNAPSHOT)
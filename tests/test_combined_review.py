@@ -0,0 +1,51 @@
+# tests/test_combined_review.py
+"""Modo combinado: revisão e relatório numa única resposta JSON, com zeros (e fora da memória) se faltar algo."""
+
+import json
+
+import pytest
+
+import llm_client
+from llm_client import LLMClient
+from prompt_master import PromptMaster
+from reviewer import Reviewer
+
+SCORES = {'Total': 80, 'clarity': 70, 'readability': 90, 'efficiency': 60, 'optimization': 50}
+ANSWER = {'review': " Código claro. ", 'scores': SCORES, 'report': "Relatório.", 'report_quality': 75}
+
+
+@pytest.fixture
+def reviewer():
+    return Reviewer(PromptMaster(), epsilon=0.0, combined=True)
+
+
+def test_extract_combined_parses_and_clamps(reviewer):
+    answer = dict(ANSWER, scores=dict(SCORES, Total=150, clarity="x"))
+
+    review, score, report, report_score, parsed = reviewer.extract_combined(json.dumps(answer))
+
+    assert (review, report, report_score, parsed) == ("Código claro.", "Relatório.", 75, True)
+    assert score == dict(SCORES, Total=100, clarity=0)
+
+
+@pytest.mark.parametrize("text", ["não é JSON", "[1, 2]", json.dumps({'review': "só a revisão", 'scores': SCORES})])
+def test_extract_combined_marks_incomplete_answers(reviewer, text):
+    review, score, report, report_score, parsed = reviewer.extract_combined(text)
+
+    assert not parsed and report_score == 0
+
+
+def test_one_call_per_code_and_complete_answers_are_memoized(stub_server, reviewer):
+    server = stub_server(reply=lambda body: json.dumps(ANSWER) + "   ")
+    client = LLMClient(host=server.host)
+    llm_client.set_client(client)
+    try:
+        first = reviewer.act_combined("print('ok')\n", training=False)
+        second = reviewer.act_combined("print('ok')  # igual\n", training=False)
+    finally:
+        llm_client.set_client(None)
+        client.close()
+
+    assert len(server.requests) == 1 and server.requests[0]['body']['format'] == 'json'
+    assert first[1:] == second[1:] == ("Código claro.", SCORES, "Relatório.", 75)
+    assert reviewer.last_memo == {'review': 'exact', 'report': 'exact'}
@@ -0,0 +1,36 @@
+# tests/test_dataset_profile.py
+"""Uma cópia colunar que falhou não fica registrada no perfil e é tentada de novo na próxima chamada."""
+
+import json
+import os
+
+import pandas as pd
+
+from dataset_profile import DatasetProfiler
+
+
+def test_failed_columnar_copy_is_retried(tmp_path, monkeypatch):
+    data = tmp_path / "dados.csv"
+    data.write_text("a,b\n1,x\n2,y\n")
+    attempts = []
+
+    def to_feather(frame, path, **kwargs):
+        attempts.append(path)
+        if len(attempts) == 1:
+            raise OSError("disco cheio")
+        with open(path, "wb") as f:
+            f.write(b"arrow")
+
+    monkeypatch.setattr(pd.DataFrame, "to_feather", to_feather)
+    profiler = DatasetProfiler(str(tmp_path / "profiles"))
+
+    profile = profiler.profile(str(data))
+    profile_path = os.path.join(profiler.cache_dir, profile['sha256'][:16], "profile.json")
+    with open(profile_path, encoding="utf-8") as f:
+        assert 'columnar' not in json.load(f)
+    # Tipos do leitor padrão do pandas, os mesmos que o candidato vê com pd.read_csv
+    assert [column['dtype'] for column in profile['columns']] == ['int64', 'object']
+
+    assert profiler.profile(str(data))['columnar'] == "dados.arrow"
+    assert DatasetProfiler(profiler.cache_dir).columnar_path(str(data)).endswith("dados.arrow")
+    assert len(attempts) == 2
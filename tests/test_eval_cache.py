@@ -0,0 +1,45 @@
+# tests/test_eval_cache.py
+"""Falhas só são servidas do cache depois de se repetirem; sucessos valem desde a primeira vez."""
+
+import sqlite3
+
+from eval_cache import EvalCache
+
+
+def test_success_is_cached_immediately(tmp_path):
+    cache = EvalCache(str(tmp_path / "cache.sqlite"))
+    key = cache.key("print('ok')")
+    cache.put(key, True, 0.1, "ok", {})
+
+    assert cache.get(key)['output'] == "ok"
+    cache.close()
+
+
+def test_failure_needs_to_repeat(tmp_path):
+    cache = EvalCache(str(tmp_path / "cache.sqlite"), failure_runs=2)
+    key = cache.key("open('x')")
+
+    cache.put(key, False, 0.1, "OSError", {})
+    assert cache.get(key) is None
+    cache.put(key, False, 0.1, "OSError", {})
+    assert cache.get(key)['success'] is False
+
+    cache.put(key, True, 0.1, "ok", {})
+    cache.put(key, False, 0.1, "OSError", {})
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+
+def test_old_cache_gets_run_counts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE results (key TEXT PRIMARY KEY, success INTEGER NOT NULL, exec_time REAL NOT NULL,"
+                 " output TEXT NOT NULL, analysis TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+    conn.execute("INSERT INTO results VALUES ('falha', 0, 0.1, 'Tempo limite', '{}', 10, 0)")
+    conn.commit()
+    conn.close()
+
+    cache = EvalCache(path)
+    assert cache.get('falha') is None
+    cache.close()
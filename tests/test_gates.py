@@ -0,0 +1,32 @@
+# tests/test_gates.py
+
+import pytest
+
+from gates import DEFAULT_GATES, GatePipeline
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = GatePipeline(DEFAULT_GATES)
+    for stage, seconds in (('analysis', 2.0), ('review', 1.0), ('report', 3.0)):
+        pipeline.observe(stage, seconds)
+    return pipeline
+
+
+def test_rejection_saves_the_mean_cost_of_skipped_stages(pipeline):
+    gate = pipeline.check('execution', {'success': False})
+    assert gate.name == 'execution'
+    assert pipeline.time_saved == pytest.approx(6.0)
+    assert pipeline.stats()['skipped'] == {'analysis': 1, 'review': 1, 'report': 1}
+
+
+def test_stages_already_started_are_not_counted_as_saved(pipeline):
+    # A análise especulativa já estava rodando quando o portão da execução rejeitou o candidato
+    pipeline.check('execution', {'success': False}, started=('analysis',))
+    assert pipeline.time_saved == pytest.approx(4.0)
+    assert pipeline.stats()['skipped']['analysis'] == 1
+
+
+def test_passing_candidate_saves_nothing(pipeline):
+    assert pipeline.check('execution', {'success': True}, started=('analysis',)) is None
+    assert pipeline.time_saved == 0.0 and pipeline.stats()['rejected'] == {}
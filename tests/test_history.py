@@ -0,0 +1,50 @@
+# tests/test_history.py
+"""len(), indexação e iteração do BoundedHistory veem as mesmas entradas, e o arquivo em disco se
+recupera de uma escrita interrompida."""
+
+import os
+
+from history import BoundedHistory, HistoryArchive
+
+
+def test_without_archive_only_recent_entries_are_visible():
+    history = BoundedHistory(maxlen=3)
+    for value in range(5):
+        history.append(value)
+
+    assert len(history) == len(list(history)) == 3
+    assert list(history) == [history[i] for i in range(len(history))] == [2, 3, 4]
+    assert history[-1] == 4 and history.count == 5
+
+
+def test_with_archive_sees_every_entry_of_this_run(tmp_path):
+    previous = BoundedHistory(maxlen=2, archive_path=str(tmp_path / "scores"))
+    for value in ("a", "b", "c"):
+        previous.append(value)
+
+    history = BoundedHistory(maxlen=2, archive_path=str(tmp_path / "scores"))
+    for value in range(5):
+        history.append(value)
+
+    assert len(history) == 5
+    assert list(history) == [history[i] for i in range(5)] == [0, 1, 2, 3, 4]
+    assert list(history.iter_all()) == ["a", 0, 1, 2, 3, 4]
+
+
+def test_archive_recovers_from_a_truncated_index(tmp_path):
+    archive = HistoryArchive(str(tmp_path / "codes"))
+    for value in ({'code': "print(1)"}, "b", 3):
+        archive.append(value)
+    # Queda entre o registro e o índice do quarto append: dados a mais e meia entrada de índice
+    with open(archive.data_path, "ab") as f:
+        f.write(b"lixo comprimido")
+    with open(archive.index_path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        f.write(b"\x00" * 5)
+
+    reopened = HistoryArchive(str(tmp_path / "codes"))
+    assert len(reopened) == 3 and list(reopened) == [{'code': "print(1)"}, "b", 3]
+
+    reopened.append("d")
+    assert list(HistoryArchive(str(tmp_path / "codes")).iter_from(2)) == [3, "d"]
+    assert reopened[-1] == "d"
@@ -0,0 +1,9 @@
+# tests/test_import_time.py
+
+from benchmark import IMPORT_BUDGET, import_time
+
+
+def test_environment_cold_import_stays_under_budget():
+    # Menor de 3 medições com -X importtime num interpretador novo
+    seconds = import_time('environment')
+    assert seconds < IMPORT_BUDGET, f"import environment levou {seconds:.3f}s (limite de {IMPORT_BUDGET}s)"
@@ -0,0 +1,168 @@
+# tests/test_llm_client.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+from ollama import ResponseError
+
+import llm_client
+from environment import Environment
+from llm_client import LLMClient
+from programmer import Programmer
+from prompt_master import PromptMaster
+from reviewer import Reviewer
+from stub_ollama import prompt_text
+
+MESSAGES = [{'role': 'user', 'content': 'escreva o código'}]
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(host, **kwargs):
+        kwargs.setdefault('backoff_base', 0.01)
+        client = LLMClient(host=host, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_concurrency_and_connection_limits(stub_server, make_client):
+    server = stub_server(reply=lambda body: "resposta", delay=0.1)
+    client = make_client(server.host, max_concurrency=2, max_connections=2)
+
+    requests = [client.submit('m', MESSAGES) for _ in range(6)]
+    wait(requests)
+
+    assert all(request.result()['message']['content'] == "resposta" for request in requests)
+    assert server.max_active == 2
+    # As conexões keep-alive do pool são reaproveitadas entre as requisições
+    assert len(server.connections) <= 2
+
+
+def test_keepalive_reuses_one_connection(stub_server, make_client):
+    server = stub_server(reply=lambda body: "resposta")
+    client = make_client(server.host)
+
+    for _ in range(4):
+        client.chat('m', MESSAGES)
+
+    assert len(server.requests) == 4
+    assert len(server.connections) == 1
+
+
+def test_stop_when_ends_the_stream_early(stub_server, make_client):
+    tail = " texto que não deveria ser gerado" * 20
+    server = stub_server(reply=lambda body: "Bom código. {'Total': 80}" + tail, chunk_delay=0.01)
+    client = make_client(server.host)
+
+    started = time.monotonic()
+    response = client.chat('m', MESSAGES, stop_when=lambda text: "}" in text)
+
+    assert response['done_reason'] == 'early_stop'
+    content = response['message']['content']
+    assert "{'Total': 80}" in content
+    assert len(content) < len("Bom código. {'Total': 80}") + 8
+    # O stream inteiro levaria mais de 1,5s
+    assert time.monotonic() - started < 0.7
+
+
+def test_retries_server_errors(stub_server, make_client):
+    server = stub_server(reply=lambda body: "ok", statuses=[500, 503])
+    client = make_client(server.host, max_retries=3)
+
+    assert client.chat('m', MESSAGES)['message']['content'] == "ok"
+    assert [request['status'] for request in server.requests] == [500, 503, 200]
+
+
+def test_gives_up_after_max_retries(stub_server, make_client):
+    server = stub_server(statuses=[500, 500, 500])
+    client = make_client(server.host, max_retries=2)
+
+    with pytest.raises(ResponseError):
+        client.chat('m', MESSAGES)
+    assert len(server.requests) == 3
+
+
+def test_does_not_retry_client_errors(stub_server, make_client):
+    server = stub_server(statuses=[400])
+    client = make_client(server.host, max_retries=3)
+
+    with pytest.raises(ResponseError) as error:
+        client.chat('m', MESSAGES)
+    assert error.value.status_code == 400
+    assert len(server.requests) == 1
+
+
+def _reviewer_reply(body):
+    text = prompt_text(body)
+    if 'relatório analítico' in text:
+        return "Relatório. {'Report Quality': 70}"
+    return "Revisão. {'Total': 80, 'clarity': 70, 'readability': 80, 'efficiency': 90, 'optimization': 60}"
+
+
+def test_review_and_report_overlap(stub_server, make_client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = stub_server(reply=_reviewer_reply, delay=0.3)
+    llm_client.set_client(make_client(server.host))
+    try:
+        prompt_master = PromptMaster()
+        env = Environment(Programmer(prompt_master), Reviewer(prompt_master, memo_threshold=None), prompt_master,
+                          gates=(), metrics_dir=None, profile_dir=None)
+        started = time.monotonic()
+        action, report_score, gate = env._review_step("print('ok')", training=False)
+        elapsed = time.monotonic() - started
+    finally:
+        llm_client.set_client(None)
+
+    assert gate is None and report_score == 70
+    report, review = sorted(server.requests, key=lambda request: 'relatório analítico' not in prompt_text(request['body']))
+    assert report['start'] < review['end'] and review['start'] < report['end']
+    # Em sequência seriam pelo menos 0,6s
+    assert elapsed < 0.55
+
+
+def test_hints_for_both_agents_overlap(stub_server, make_client):
+    server = stub_server(reply=lambda body: "Dica: <Valide os dados>\nÊnfase: <80>\n<{'clarity': 2}>", delay=0.3)
+    llm_client.set_client(make_client(server.host))
+    try:
+        prompt_master = PromptMaster()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            hints = [pool.submit(prompt_master.create_hint, stage, '', '', 50, {'clarity': 1}) for stage in ('CODE', 'REVIEW')]
+            hints = [hint.result() for hint in hints]
+    finally:
+        llm_client.set_client(None)
+
+    assert hints == [('Valide os dados', '80', {'clarity': 2})] * 2
+    assert prompt_master.action_values['CODE'] == prompt_master.action_values['REVIEW'] == {'Dica: Valide os dados': 80.0}
+    first, second = server.requests
+    assert first['start'] < second['end'] and second['start'] < first['end']
+
+
+@pytest.mark.parametrize("gates", [None, ()])
+def test_budget_exhausted_code_is_not_rewarded(stub_server, make_client, gates):
+    server = stub_server(reply=lambda body: "print('ok')\n" * 50, chunk_delay=0.02)
+    llm_client.set_client(make_client(server.host))
+    try:
+        prompt_master = PromptMaster()
+        kwargs = {'gates': gates} if gates is not None else {}
+        env = Environment(Programmer(prompt_master), Reviewer(prompt_master, memo_threshold=None), prompt_master,
+                          metrics_dir=None, profile_dir=None, time_budget=0.1, **kwargs)
+        with llm_client.episode_budget(env._new_budget()) as budget:
+            code = env._generate_step("some 1 e 1", training=False)
+            assert budget.expired()
+            evaluation = env._evaluate_step(code, None)
+    finally:
+        llm_client.set_client(None)
+        env.pool.shutdown()
+
+    # O código cortado pelo orçamento é descartado e o candidato vazio não chega à sandbox
+    assert code == ""
+    assert not evaluation['success'] and evaluation['code_score'] == 0.0 and 'run_code' not in evaluation['timings']
+    assert (evaluation['rejected'] is not None) == (gates is None)
+    assert env.calculate_reward(evaluation['code_score'], 0) == 0.0
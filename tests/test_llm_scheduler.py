@@ -0,0 +1,167 @@
+# tests/test_llm_scheduler.py
+
+import socket
+import time
+from concurrent.futures import wait
+
+import pytest
+from ollama import ResponseError
+
+from llm_client import make_client
+from llm_scheduler import SchedulingClient
+
+MESSAGES = [{'role': 'user', 'content': 'escreva o código'}]
+REPLY = "x" * 40  # 10 pedaços de 4 caracteres: 10 tokens por resposta
+
+
+@pytest.fixture
+def scheduler():
+    clients = []
+
+    def make(hosts, **kwargs):
+        kwargs.setdefault('backoff_base', 0.01)
+        client = SchedulingClient(hosts, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def _requests(client):
+    return {stats['host']: stats['requests'] for stats in client.stats()}
+
+
+def _warm_up(client):
+    # Uma resposta de cada endpoint para que as velocidades sejam conhecidas
+    requests = [client.submit('m', MESSAGES) for _ in client.endpoints]
+    wait(requests)
+
+
+def test_make_client_builds_a_scheduler_for_several_hosts(stub_server):
+    first, second = stub_server(), stub_server()
+    client = make_client(host=f"{first.host}, {second.host}")
+    try:
+        assert isinstance(client, SchedulingClient)
+        assert [endpoint.host for endpoint in client.endpoints] == [first.host, second.host]
+    finally:
+        client.close()
+
+
+def test_idle_requests_go_to_the_fastest_endpoint(stub_server, scheduler):
+    slow = stub_server(reply=lambda body: REPLY, tokens_per_second=20)
+    fast = stub_server(reply=lambda body: REPLY, tokens_per_second=200)
+    client = scheduler([slow.host, fast.host])
+    _warm_up(client)
+    assert {stats['host']: stats['tokens_per_second'] for stats in client.stats()} == pytest.approx({slow.host: 20, fast.host: 200})
+
+    before = _requests(client)
+    for _ in range(5):
+        client.chat('m', MESSAGES)
+    after = _requests(client)
+
+    assert after[fast.host] - before[fast.host] == 5
+    assert after[slow.host] == before[slow.host]
+
+
+def test_concurrent_requests_split_by_expected_wait(stub_server, scheduler):
+    slow = stub_server(reply=lambda body: REPLY, tokens_per_second=20, delay=0.3)
+    fast = stub_server(reply=lambda body: REPLY, tokens_per_second=45, delay=0.3)
+    client = scheduler([slow.host, fast.host], max_concurrency=8)
+    _warm_up(client)
+
+    before = _requests(client)
+    requests = [client.submit('m', MESSAGES) for _ in range(6)]
+    wait(requests)
+    after = _requests(client)
+
+    # (em andamento + 1) / tokens por segundo: 1/45, 2/45, 1/20, 3/45, 4/45, 2/20
+    assert after[fast.host] - before[fast.host] == 4
+    assert after[slow.host] - before[slow.host] == 2
+
+
+def test_role_stays_on_its_endpoint_within_slack(scheduler):
+    client = scheduler(["http://127.0.0.1:1", "http://127.0.0.1:2"], affinity_slack=0.5)
+    best, other = client.endpoints
+    best.tokens_per_second = 100.0
+    client.affinity['reviewer'] = other
+
+    other.tokens_per_second = 80.0  # Espera 25% maior que a do melhor: continua no mesmo endpoint
+    assert client._choose('reviewer', set()) is other
+    assert client._choose('programmer', set()) is best
+
+    other.tokens_per_second = 50.0  # Espera duas vezes maior: vai para o melhor
+    assert client._choose('reviewer', set()) is best
+
+
+def test_role_affinity_with_live_endpoints(stub_server, scheduler):
+    first = stub_server(reply=lambda body: REPLY, tokens_per_second=100)
+    second = stub_server(reply=lambda body: REPLY, tokens_per_second=80)
+    client = scheduler([first.host, second.host])
+    _warm_up(client)
+    client.affinity['reviewer'] = client.endpoints[1]
+
+    before = _requests(client)
+    for _ in range(4):
+        client.chat('m', MESSAGES, role='reviewer')
+    after = _requests(client)
+
+    assert after[second.host] - before[second.host] == 4
+
+
+def test_server_error_retries_elsewhere_and_cools_down(stub_server, scheduler):
+    failing = stub_server(reply=lambda body: "ok", statuses=[500])
+    healthy = stub_server(reply=lambda body: "ok")
+    client = scheduler([failing.host, healthy.host], cooldown=30)
+
+    assert client.chat('m', MESSAGES)['message']['content'] == "ok"
+    for _ in range(3):
+        client.chat('m', MESSAGES)
+
+    stats = {stats['host']: stats for stats in client.stats()}
+    assert stats[failing.host]['healthy'] is False
+    assert stats[failing.host]['failures'] == 1
+    assert len(failing.requests) == 1  # Em pausa: não recebe mais pedidos
+    assert len(healthy.requests) == 4
+
+
+def test_transport_error_retries_elsewhere(stub_server, scheduler):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        dead = f"http://127.0.0.1:{probe.getsockname()[1]}"
+    healthy = stub_server(reply=lambda body: "ok")
+    client = scheduler([dead, healthy.host])
+
+    assert client.chat('m', MESSAGES)['message']['content'] == "ok"
+    stats = {stats['host']: stats for stats in client.stats()}
+    assert stats[dead]['healthy'] is False
+    assert stats[dead]['failures'] == 1
+
+
+def test_client_errors_are_not_retried(stub_server, scheduler):
+    first = stub_server(statuses=[400])
+    second = stub_server()
+    client = scheduler([first.host, second.host])
+
+    with pytest.raises(ResponseError):
+        client.chat('m', MESSAGES)
+    assert len(first.requests) + len(second.requests) == 1
+    assert all(stats['healthy'] for stats in client.stats())
+
+
+def test_waits_for_cooldown_when_every_endpoint_failed(stub_server, scheduler):
+    first = stub_server(statuses=[500] * 5)
+    second = stub_server(statuses=[500] * 5)
+    client = scheduler([first.host, second.host], cooldown=0.4, max_retries=2)
+
+    started = time.monotonic()
+    with pytest.raises(ResponseError):
+        client.chat('m', MESSAGES)
+    elapsed = time.monotonic() - started
+
+    attempts = sorted(first.requests + second.requests, key=lambda request: request['start'])
+    assert len(attempts) == 3  # A primeira tentativa e max_retries repetições, sem laço apertado
+    # A terceira só sai quando o primeiro endpoint volta da pausa
+    assert attempts[2]['start'] - attempts[0]['end'] >= 0.35
+    assert elapsed >= 0.35
@@ -0,0 +1,61 @@
+# tests/test_metrics_log.py
+"""Cada MetricsLog grava numa execução própria; resume=True continua a mais recente e corta colunas
+deixadas pela metade por uma queda."""
+
+import numpy as np
+
+from metrics_log import COLUMNS, MetricsLog, downsample, runs
+
+
+def test_new_log_does_not_see_previous_runs(tmp_path):
+    first = MetricsLog(str(tmp_path))
+    first.append('train', code_score=1)
+    second = MetricsLog(str(tmp_path))
+    second.append('train', code_score=2)
+
+    assert len(runs(str(tmp_path))) == 2
+    assert len(first) == 1 and len(second) == 1
+
+
+def test_resume_continues_latest_run(tmp_path):
+    MetricsLog(str(tmp_path)).append('train', code_score=1)
+    latest = MetricsLog(str(tmp_path))
+    latest.append('train', code_score=2)
+
+    resumed = MetricsLog(str(tmp_path), resume=True)
+    resumed.append('train', code_score=3)
+
+    assert resumed.run == latest.run
+    assert len(resumed) == 2
+
+
+def test_reopening_cuts_a_torn_column(tmp_path):
+    log = MetricsLog(str(tmp_path))
+    for step in range(3):
+        log.append('train', code_score=step, report_score=10 * step, programmer_q=0.1, reviewer_q=0.2)
+    # Queda no meio do quarto append: a primeira coluna completa, a segunda com 3 bytes
+    with open(log._column_path(COLUMNS[0]), "ab") as f:
+        f.write(np.float64(0.0).tobytes())
+    with open(log._column_path(COLUMNS[1]), "ab") as f:
+        f.write(b"\x00\x01\x02")
+
+    resumed = MetricsLog(str(tmp_path), resume=True)
+    resumed.append('test', code_score=7, report_score=70)
+
+    columns = resumed.columns()
+    assert len(resumed) == 4
+    assert list(columns['code_score']) == [0, 1, 2, 7]
+    assert list(columns['phase']) == [0, 0, 0, 1]
+    assert np.isnan(columns['programmer_q'][-1])
+
+
+def test_downsample_keeps_window_extremes():
+    values = np.arange(10, dtype=float)
+    values[7] = 100
+
+    x, mean, low, high = downsample(values, max_points=4)
+
+    assert list(x) == [1, 4, 7, 9]
+    assert list(mean) == [1, 4, 38, 9] and list(low) == [0, 3, 6, 9] and list(high) == [2, 5, 100, 9]
+    # Séries curtas não são reduzidas
+    assert list(downsample(values, max_points=10)[1]) == list(values)
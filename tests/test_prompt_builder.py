@@ -0,0 +1,34 @@
+# tests/test_prompt_builder.py
+"""O prompt tem tamanho limitado e o prefixo (sistema e estágio) não muda entre chamadas."""
+
+from prompt_builder import PromptBuilder, ScoreHistory
+
+
+def test_history_keeps_a_window_and_a_summary_per_weight_vector():
+    history = ScoreHistory(window=3, summary_size=2)
+    for score, weights in [(10, {'a': 1}), (50, {'a': 2}), (30, {'a': 1}), (90, {'a': 3}), ("n/a", {'a': 4})]:
+        history.append(score, weights)
+
+    assert len(history) == 5 and history.last_score() == "n/a"
+    assert history.window_lines() == ["Pontuação: 30 Pesos: {'a': 1}", "Pontuação: 90 Pesos: {'a': 3}",
+                                      "Pontuação: n/a Pesos: {'a': 4}"]
+    # Pontuações não numéricas ficam na janela, mas fora do resumo; o resumo ordena pela melhor pontuação
+    assert history.summary_lines() == ["Pesos: {'a': 3} Usos: 1 Melhor: 90.00 Média: 90.00",
+                                       "Pesos: {'a': 2} Usos: 1 Melhor: 50.00 Média: 50.00"]
+    history.summary_size = 3
+    assert history.summary_lines()[-1] == "Pesos: {'a': 1} Usos: 2 Melhor: 30.00 Média: 20.00"
+
+
+def test_prompt_size_does_not_grow_with_training():
+    builder = PromptBuilder("texto fixo " * 50)
+    history = ScoreHistory(window=5, summary_size=5)
+    sizes = []
+    for step in range(200):
+        history.append(step % 100, {'clarity': step % 7})
+        messages = builder.build("CODE", [("Código:", "print(1)")], history)
+        sizes.append(builder.last_prompt_tokens)
+
+    assert messages[0] == {'role': 'system', 'content': builder.system_text}
+    assert messages[1]['content'].startswith("CODE\n\nHistórico de pesos e pontuações:")
+    assert messages[1]['content'].endswith("Código:\n\nprint(1)")
+    assert max(sizes[50:]) == max(sizes[100:])
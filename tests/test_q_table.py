@@ -0,0 +1,82 @@
+# tests/test_q_table.py
+"""A QTable reproduz a atualização do dicionário antigo e pode ser lida em uma thread enquanto outra a
+atualiza (Environment.train_many)."""
+
+import pickle
+import random
+import threading
+
+import pytest
+
+from q_table import QTable
+
+
+def test_reads_during_updates_see_whole_updates():
+    table = QTable(chunk=2)
+    done = threading.Event()
+    errors = []
+
+    def choose():
+        while not done.is_set():
+            try:
+                action = table.best(0.5)
+                assert action is None or action.startswith("Dica ")
+            except Exception as e:  # noqa: BLE001 - qualquer erro da leitura concorrente reprova o teste
+                errors.append(e)
+                return
+
+    reader = threading.Thread(target=choose)
+    reader.start()
+    for step in range(500):
+        table.update(0.5, f"Dica {step}", reward=step % 7)
+    done.set()
+    reader.join()
+
+    assert not errors
+    assert len(table) == 500
+
+
+def test_pickle_round_trip_keeps_a_working_lock():
+    table = QTable()
+    table.update(0.2, "Dica: valide os dados", reward=1.0)
+
+    restored = pickle.loads(pickle.dumps(table))
+    restored.update(0.2, "Dica: valide os dados", reward=1.0)
+
+    assert restored.best(0.2) == "Dica: valide os dados"
+    assert restored.get(0.2, "Dica: valide os dados") > table.get(0.2, "Dica: valide os dados")
+
+
+def _dict_update(table, state, action, reward, alpha=0.1, gamma=0.9):
+    # A atualização dos agentes antes da QTable, sobre {estado: {ação: valor}}
+    actions = table.setdefault(state, {})
+    actions.setdefault(action, 0.0)
+    max_future_q = max(actions.values())
+    actions[action] += alpha * (reward + gamma * max_future_q - actions[action])
+
+
+def test_updates_match_the_old_dict_table():
+    rng = random.Random(0)
+    table = QTable()
+    reference = {}
+    for _ in range(300):
+        state, action, reward = rng.randrange(10) / 10 + 0.05, f"Dica {rng.randrange(8)}", rng.uniform(-1, 1)
+        table.update(state, action, reward)
+        _dict_update(reference, table.state_index(state), action, reward)
+
+    table_dict = table.as_dict()
+    assert table_dict.keys() == reference.keys()
+    for row, actions in reference.items():
+        assert table_dict[row] == pytest.approx(actions)
+        # best acompanha o argmax mesmo quando a melhor ação piora
+        assert table.get(row / 10 + 0.05, table.best(row / 10 + 0.05)) == pytest.approx(max(actions.values()))
+    values = [value for actions in reference.values() for value in actions.values()]
+    assert table.mean() == pytest.approx(sum(values) / len(values)) and len(table) == len(values)
+
+
+def test_from_dict_merges_states_of_the_same_bin_by_mean():
+    table = QTable.from_dict({0.51: {"Dica A": 1.0}, 0.55: {"Dica A": 3.0, "Dica B": 0.5}, "x": {"Dica B": 4.0}})
+
+    assert table.get(0.5, "Dica A") == 2.0 and table.get(0.5, "Dica B") == 0.5
+    assert table.get(0.0, "Dica B") == 4.0  # Estado não numérico cai na primeira faixa
+    assert table.best(0.5) == "Dica A" and table.best(0.9) is None
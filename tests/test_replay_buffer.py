@@ -0,0 +1,55 @@
+# tests/test_replay_buffer.py
+"""Mini-lotes do buffer de experiência atualizam a tabela Q como a atualização online, e o buffer gravado
+em disco basta para reconstruir a política."""
+
+import numpy as np
+import pytest
+
+from q_table import QTable
+from replay_buffer import ReplayBuffer, retrain
+
+
+def test_single_transition_batch_matches_online_update():
+    online, batched = QTable(), QTable()
+    for table in (online, batched):
+        table.update(0.35, "Dica A", reward=1.0)
+    online.update(0.35, "Dica B", reward=0.5)
+    row = batched.state_index(0.35)
+    batched.update_batch([row], [batched.action_id("Dica B")], [0.5], [row])
+
+    assert batched.get(0.35, "Dica B") == pytest.approx(online.get(0.35, "Dica B"))
+    assert batched.best(0.35) == online.best(0.35) and batched.mean() == pytest.approx(online.mean())
+
+
+def test_repeated_cells_get_the_mean_step():
+    table = QTable()
+    action = table.action_id("Dica A")
+    table.update_batch([2, 2], [action, action], [1.0, 0.0], [9, 9], alpha=0.5, gamma=0.0)
+
+    assert table.get(0.25, "Dica A") == pytest.approx(0.25)
+
+
+def test_ring_links_next_states_and_wraps():
+    buffer = ReplayBuffer(capacity=3)
+    for step in range(5):
+        buffer.add(step / 10, f"Dica {step % 2}", reward=step)
+
+    assert len(buffer) == 3
+    order = [(buffer.position + offset) % 3 for offset in range(3)]
+    assert list(buffer.rewards[order]) == [2, 3, 4]
+    assert list(buffer.next_states[order][:2]) == [0.3, 0.4] and np.isnan(buffer.next_states[order][2])
+
+
+def test_retrain_from_disk_recovers_the_policy(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    buffer = ReplayBuffer(path, seed=0)
+    for step in range(40):
+        buffer.add(0.55, "Dica boa" if step % 2 else "Dica ruim", reward=1.0 if step % 2 else 0.0)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"state": 0.55, "act')
+
+    table = retrain(path, epochs=30, seed=0)
+
+    assert table.best(0.55) == "Dica boa"
+    assert table.get(0.55, "Dica boa") > table.get(0.55, "Dica ruim")
+    assert len(ReplayBuffer(path)) == 40
@@ -0,0 +1,48 @@
+# tests/test_review_memo.py
+"""Revisões são reaproveitadas para código igual ou quase igual, mas só dentro do mesmo contexto (dica e pesos)."""
+
+from review_memo import ReviewMemo
+
+CODE = """
+import pandas as pd
+
+df = pd.read_csv('vendas.csv')
+df = df.dropna()
+df = df.drop_duplicates()
+df['total'] = df['preco'] * df['quantidade']
+resumo = df.groupby('regiao')['total'].sum().sort_values(ascending=False)
+media = df.groupby('regiao')['total'].mean()
+print(resumo.head(10))
+print(media.describe())
+resumo.plot(kind='bar')
+"""
+
+
+def test_renamed_code_is_an_exact_hit():
+    memo = ReviewMemo()
+    memo.store('review', CODE, ("Boa revisão", {'Total': 80}), context="dica A")
+    renamed = CODE.replace("df", "vendas").replace("resumo", "por_regiao") + "# comentário\n"
+
+    assert memo.lookup('review', renamed, context="dica A") == (("Boa revisão", {'Total': 80}), 'exact')
+    assert memo.lookup('report', renamed, context="dica A") == (None, None)
+
+
+def test_near_duplicate_lookup_is_isolated_by_context():
+    memo = ReviewMemo(threshold=0.7)
+    memo.store('review', CODE, "revisão com a dica A", context="dica A")
+    near = CODE.replace("head(10)", "head(5)")
+
+    assert memo.lookup('review', near, context="dica A") == ("revisão com a dica A", 'near')
+    assert memo.lookup('review', near, context="dica B") == (None, None)
+    assert memo.lookup('review', CODE, context="dica B") == (None, None)
+    assert memo.lookup('review', "print('outro programa')\n", context="dica A") == (None, None)
+    assert memo.stats()['review']['near'] == 1 and memo.stats()['review']['miss'] == 3
+
+
+def test_eviction_drops_the_index_of_an_empty_context():
+    memo = ReviewMemo(max_entries=1)
+    memo.store('review', CODE, "antiga", context="dica A")
+    memo.store('review', "print(1)\n", "nova", context="dica B")
+
+    assert memo.lookup('review', CODE, context="dica A") == (None, None)
+    assert list(memo.indexes) == ["dica B"] and memo.stats()['entries'] == 1
@@ -0,0 +1,110 @@
+# tests/test_sandbox.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sandbox
+from sandbox import Sandbox
+
+posix_only = pytest.mark.skipif(not hasattr(os, "wait4"), reason="limites e tempo de CPU só em POSIX")
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(sandbox, "DATA_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "dados.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+    return str(path)
+
+
+def test_runs_candidate_and_reports_cpu_time():
+    with Sandbox("print(sum(range(10)))") as box:
+        success, exec_time, output = box.run(timeout=30)
+    assert success and output == "45"
+    if hasattr(os, "wait4"):
+        assert box.last_cpu_time is not None and box.last_cpu_time > 0
+
+
+def test_failure_returns_stderr():
+    with Sandbox("raise ValueError('falhou')") as box:
+        success, _, output = box.run(timeout=30)
+    assert not success and "ValueError: falhou" in output and not box.last_timed_out
+
+
+def test_timeout_kills_the_process_group():
+    code = "import subprocess, sys, time\nsubprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\ntime.sleep(60)\n"
+    with Sandbox(code) as box:
+        success, exec_time, output = box.run(timeout=1)
+    assert not success and "Tempo limite" in output and box.last_timed_out
+    assert exec_time < 10
+
+
+@posix_only
+def test_memory_limit_applies_to_the_candidate():
+    code = "x = bytearray(512 * 1024 * 1024)\nprint('alocou')"
+    with Sandbox(code, limits={'memory_bytes': 256 * 1024 ** 2}) as box:
+        success, _, output = box.run(timeout=30)
+    assert not success and "MemoryError" in output
+
+
+def test_candidate_cannot_corrupt_the_shared_data_copy(data_file):
+    code = ("import os\n"
+            "os.chmod('dados.csv', 0o644)\n"
+            "open('dados.csv', 'w').write('estragado')\n")
+    with Sandbox(code, data_file) as box:
+        assert box.run(timeout=30)[0]
+    with Sandbox("print(open('dados.csv').read())", data_file) as box:
+        success, _, output = box.run(timeout=30)
+    assert success and output == "a,b\n1,2"
+
+
+def test_altered_shared_copy_is_recreated(data_file):
+    shared = sandbox._readonly_copy(data_file)
+    os.chmod(shared, 0o644)
+    with open(shared, "w", encoding="utf-8") as f:
+        f.write("estragado")
+    with Sandbox("print(open('dados.csv').read())", data_file) as box:
+        success, _, output = box.run(timeout=30)
+    assert success and output == "a,b\n1,2"
+
+
+def test_concurrent_sandboxes_share_one_fresh_copy(data_file):
+    # Um arquivo grande deixa a cópia demorar o bastante para as sandboxes se sobreporem
+    with open(data_file, "a", encoding="utf-8") as f:
+        f.write("3,4\n" * 2_000_000)
+
+    def open_sandbox(_):
+        with Sandbox("print(sum(1 for _ in open('dados.csv')))", data_file) as box:
+            return box.run(timeout=30)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(open_sandbox, range(8)))
+
+    assert all(success and output == "2000002" for success, _, output in results)
+    copies = [name for _, _, names in os.walk(sandbox.DATA_CACHE_DIR) for name in names]
+    assert copies == ["dados.csv"]
+
+
+@pytest.mark.parametrize("warm", [False, True])
+def test_max_processes_caps_fork_bomb(warm):
+    if not hasattr(os, "wait4") or sandbox._pids_cgroup_parent() is None:
+        pytest.skip("controlador pids de cgroup indisponível")
+    from warm_executor import WarmExecutor
+
+    executor = WarmExecutor(preload=()) if warm else None
+    # Os filhos fecham stdout/stderr para não segurar os pipes até o tempo limite
+    code = ("import os, time\nfor _ in range(50):\n    if os.fork() == 0:\n"
+            "        os.close(1)\n        os.close(2)\n        time.sleep(60)\n        os._exit(0)\n")
+    try:
+        with Sandbox(code, limits={'max_processes': 8}, executor=executor) as box:
+            success, _, output = box.run(timeout=30)
+            cgroup = box.cgroup
+            with open(os.path.join(cgroup, "pids.current"), encoding="utf-8") as f:
+                assert int(f.read()) <= 8
+    finally:
+        if executor is not None:
+            executor.close()
+    assert not success and "BlockingIOError" in output and not box.last_timed_out
+    assert not os.path.exists(cgroup)  # Os filhos que sobraram foram mortos e o cgroup removido
@@ -0,0 +1,39 @@
+# tests/test_warm_executor.py
+
+import os
+import time
+
+import pytest
+
+import warm_executor
+from sandbox import Sandbox
+from warm_executor import WarmExecutor
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="o executor morno usa fork")
+
+
+@pytest.fixture
+def executor():
+    executor = WarmExecutor(preload=())
+    yield executor
+    executor.close()
+
+
+def test_runs_candidate_like_a_new_process(executor):
+    with Sandbox("print(sum(range(10)))", executor=executor) as box:
+        success, _, output = box.run(timeout=30)
+    assert success and output == "45"
+    assert box.last_cpu_time is not None and not box.last_timed_out
+
+
+def test_child_that_closes_its_pipes_still_times_out(executor, monkeypatch):
+    monkeypatch.setattr(warm_executor, "REPLY_GRACE", 0.5)
+    # Sem stdout/stderr abertos, só a resposta do servidor diz quando o filho termina
+    code = "import os, time\nos.close(1)\nos.close(2)\ntime.sleep(60)\n"
+    with Sandbox(code, executor=executor) as box:
+        started = time.monotonic()
+        success, _, output = box.run(timeout=1)
+        elapsed = time.monotonic() - started
+    assert not success and "Tempo limite" in output
+    assert box.last_timed_out and box.last_cpu_time is None
+    assert elapsed < 5
@@ -0,0 +1,240 @@
+# tracing.py
+
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+_current_episode = contextvars.ContextVar('episode', default=None)
+_episode_ids = itertools.count(1)
+
+# Contadores da resposta do Ollama copiados para os spans das chamadas ao LLM
+OLLAMA_COUNTERS = ('prompt_eval_count', 'eval_count', 'total_duration', 'load_duration',
+                   'prompt_eval_duration', 'eval_duration')
+
+
+class JsonlSink:
+    """Grava cada span como uma linha JSON."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, span):
+        line = json.dumps(span, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PrometheusSink:
+    """Agrega os spans em métricas no formato texto do Prometheus (arquivo e/ou endpoint HTTP)."""
+
+    def __init__(self, path=None, port=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.stage_seconds = defaultdict(float)
+        self.stage_count = defaultdict(int)
+        self.llm_tokens = defaultdict(int)
+        self.llm_eval_seconds = defaultdict(float)
+        self.cache_lookups = defaultdict(int)
+        self.subprocess_cpu_seconds = 0.0
+        self.gate_rejections = defaultdict(int)
+        self.stages_skipped = defaultdict(int)
+        self.gate_seconds_saved = 0.0
+        self._server = None
+        if port is not None:
+            self.serve(port)
+
+    def emit(self, span):
+        with self._lock:
+            name = span['name']
+            self.stage_seconds[name] += span['duration']
+            self.stage_count[name] += 1
+            attrs = span['attrs']
+            if name == 'llm.chat' and not attrs.get('cache_hit'):
+                # Respostas servidas do LLMStore não gastam tokens; os contadores gravados ficam só no JSONL
+                role = attrs.get('role') or 'unknown'
+                self.llm_tokens[(role, 'prompt')] += attrs.get('prompt_eval_count') or 0
+                self.llm_tokens[(role, 'eval')] += attrs.get('eval_count') or 0
+                self.llm_eval_seconds[role] += (attrs.get('eval_duration') or 0) / 1e9
+            if 'cache_hit' in attrs and attrs['cache_hit'] is not None:
+                self.cache_lookups[(name, 'hit' if attrs['cache_hit'] else 'miss')] += 1
+            self.subprocess_cpu_seconds += attrs.get('cpu_time') or 0.0
+            if name == 'gate':
+                self.gate_rejections[attrs['gate']] += 1
+                for stage in attrs['skipped']:
+                    self.stages_skipped[stage] += 1
+                self.gate_seconds_saved += attrs['time_saved']
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# TYPE rl_stage_seconds summary",
+                *[f'rl_stage_seconds_sum{{stage="{stage}"}} {value:.6f}' for stage, value in sorted(self.stage_seconds.items())],
+                *[f'rl_stage_seconds_count{{stage="{stage}"}} {value}' for stage, value in sorted(self.stage_count.items())],
+                "# TYPE rl_llm_tokens_total counter",
+                *[f'rl_llm_tokens_total{{role="{role}",kind="{kind}"}} {value}' for (role, kind), value in sorted(self.llm_tokens.items())],
+                "# TYPE rl_llm_eval_seconds_total counter",
+                *[f'rl_llm_eval_seconds_total{{role="{role}"}} {value:.6f}' for role, value in sorted(self.llm_eval_seconds.items())],
+                "# TYPE rl_llm_tokens_per_second gauge",
+                *[f'rl_llm_tokens_per_second{{role="{role}"}} {self.llm_tokens[(role, "eval")] / value:.3f}'
+                  for role, value in sorted(self.llm_eval_seconds.items()) if value > 0],
+                "# TYPE rl_cache_lookups_total counter",
+                *[f'rl_cache_lookups_total{{stage="{stage}",result="{result}"}} {value}' for (stage, result), value in sorted(self.cache_lookups.items())],
+                "# TYPE rl_subprocess_cpu_seconds_total counter",
+                f"rl_subprocess_cpu_seconds_total {self.subprocess_cpu_seconds:.6f}",
+                "# TYPE rl_gate_rejections_total counter",
+                *[f'rl_gate_rejections_total{{gate="{gate}"}} {value}' for gate, value in sorted(self.gate_rejections.items())],
+                "# TYPE rl_stages_skipped_total counter",
+                *[f'rl_stages_skipped_total{{stage="{stage}"}} {value}' for stage, value in sorted(self.stages_skipped.items())],
+                "# TYPE rl_gate_seconds_saved_total counter",
+                f"rl_gate_seconds_saved_total {self.gate_seconds_saved:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        if not self.path:
+            return
+        partial = self.path + ".tmp"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(partial, self.path)
+
+    def serve(self, port, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Métricas Prometheus em http://{host}:{self._server.server_port}/metrics")
+
+    def close(self):
+        self.write()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class Tracer:
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def record(self, name, start, duration, episode=None, **attrs):
+        if not self.sinks:
+            return
+        span = {
+            'name': name,
+            'episode': episode if episode is not None else _current_episode.get(),
+            'start': start,
+            'duration': duration,
+            'attrs': attrs,
+        }
+        for sink in self.sinks:
+            sink.emit(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Mede o bloco; atributos podem ser acrescentados ao dicionário devolvido."""
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(name, start, time.perf_counter() - started, **attrs)
+
+    def flush(self):
+        for sink in self.sinks:
+            if isinstance(sink, PrometheusSink):
+                sink.write()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def configure_tracing(jsonl_path=None, prometheus_path=None, prometheus_port=None):
+    """Liga a exportação dos spans: JSONL, arquivo Prometheus e/ou endpoint /metrics."""
+    global _tracer
+    sinks = []
+    if jsonl_path:
+        sinks.append(JsonlSink(jsonl_path))
+    if prometheus_path or prometheus_port is not None:
+        sinks.append(PrometheusSink(prometheus_path, prometheus_port))
+    _tracer.close()
+    _tracer = Tracer(sinks)
+    return _tracer
+
+
+def span(name, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def new_episode_id():
+    return next(_episode_ids)
+
+
+@contextlib.contextmanager
+def episode(episode_id=None):
+    """Associa os spans criados nesta thread a um episódio."""
+    token = _current_episode.set(episode_id if episode_id is not None else new_episode_id())
+    try:
+        yield _current_episode.get()
+    finally:
+        _current_episode.reset(token)
+
+
+def current_episode():
+    return _current_episode.get()
+
+
+def trace_llm_request(request, role, model, cache_hit=None):
+    """Registra um span 'llm.chat' quando o Future da chamada terminar."""
+    episode_id = _current_episode.get()
+    start = time.time()
+    started = time.perf_counter()
+
+    def done(future):
+        attrs = {'role': role, 'model': model, 'cache_hit': cache_hit}
+        if future.exception() is not None:
+            attrs['error'] = repr(future.exception())
+        else:
+            response = future.result()
+            attrs['done_reason'] = response.get('done_reason')
+            attrs.update({key: response.get(key) for key in OLLAMA_COUNTERS if key in response})
+        _tracer.record('llm.chat', start, time.perf_counter() - started, episode=episode_id, **attrs)
+
+    request.add_done_callback(done)
+    return request
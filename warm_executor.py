@@ -0,0 +1,315 @@
+# warm_executor.py
+"""Executor "morno" para os candidatos: um processo servidor com pandas/numpy/matplotlib já importados
+faz um fork por candidato, no estilo do forkserver do multiprocessing.
+
+O cliente (Sandbox.run com executor=WarmExecutor) cria os pipes de stdin/stdout/stderr e os envia
+ao servidor por um socket Unix junto com o pedido; o filho herda esses pipes, entra na sandbox
+(diretório, limites de recursos, grupo de processos próprio) e roda o arquivo como __main__.
+O servidor devolve o pid logo após o fork e, quando o filho termina, o código de saída e o tempo de CPU.
+"""
+
+import json
+import logging
+import os
+import runpy
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from sandbox import _limit_resources
+
+DEFAULT_PRELOAD = ('numpy', 'pandas', 'matplotlib.pyplot')
+MAX_MESSAGE = 64 * 1024
+REPLY_GRACE = 5.0  # Segundos além do tempo limite para o servidor informar o término do filho
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _decode(parts):
+    return b"".join(parts).decode("utf-8", errors="replace")
+
+
+def _run_child(request):
+    # Executado no filho logo após o fork; nunca retorna
+    code = 1
+    try:
+        _limit_resources(request['limits'], request.get('cgroup'))()
+        os.chdir(request['workdir'])
+        sys.path[0] = request['workdir']
+        sys.argv = [request['filename']]
+        path = os.path.join(request['workdir'], request['filename'])
+        try:
+            runpy.run_path(path, run_name='__main__')
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, (int, type(None))):
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            # Omite os quadros do runpy e do servidor: o traceback fica igual ao de `python candidate.py`
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != path:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(socket_path, preload=DEFAULT_PRELOAD):
+    """Laço do servidor: aceita pedidos, faz fork por candidato e informa o término de cada filho."""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    for module in preload:
+        try:
+            __import__(module)
+        except ImportError as e:
+            logging.warning(f"Módulo {module} não pré-carregado: {e}")
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+
+    # SIGCHLD acorda o select pelo wakeup fd; a coleta dos filhos acontece no próprio laço
+    wakeup_read, wakeup_write = socket.socketpair()
+    wakeup_read.setblocking(False)
+    wakeup_write.setblocking(False)
+    signal.set_wakeup_fd(wakeup_write.fileno())
+    signal.signal(signal.SIGCHLD, lambda *args: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, 'accept')
+    selector.register(wakeup_read, selectors.EVENT_READ, 'wakeup')
+    # EOF no stdin significa que o processo que iniciou o servidor terminou
+    selector.register(sys.stdin, selectors.EVENT_READ, 'parent')
+    children = {}
+
+    print("ready", flush=True)
+    while True:
+        for key, _ in selector.select():
+            if key.data == 'accept':
+                conn, _ = listener.accept()
+                with conn:
+                    pid = _fork_child(conn)
+                    if pid is not None:
+                        children[pid] = conn.detach()
+            elif key.data == 'parent':
+                if not os.read(0, 4096):
+                    listener.close()
+                    os.unlink(socket_path)
+                    os.rmdir(os.path.dirname(socket_path))
+                    return
+            elif key.data == 'wakeup':
+                try:
+                    wakeup_read.recv(4096)
+                except BlockingIOError:
+                    pass
+        _reap(children)
+
+
+def _fork_child(conn):
+    message, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 3)
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        return None
+    request = json.loads(message.decode("utf-8"))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        # Socket do servidor e conexões de outros pedidos não passam para o candidato;
+        # os objetos continuam vivos na pilha do servidor até o os._exit, então nada os fecha de novo
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        _run_child(request)
+    for fd in fds:
+        os.close(fd)
+    _send(conn, {'pid': pid})
+    return pid
+
+
+def _reap(children):
+    while children:
+        try:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        fd = children.pop(pid, None)
+        if fd is None:
+            continue
+        with socket.socket(fileno=fd) as conn:
+            try:
+                _send(conn, {
+                    'returncode': os.waitstatus_to_exitcode(status),
+                    'cpu_time': rusage.ru_utime + rusage.ru_stime,
+                })
+            except OSError:
+                pass
+
+
+class WarmExecutor:
+    """Cliente do servidor de fork; roda candidatos com o mesmo contrato de Sandbox.run."""
+
+    def __init__(self, preload=DEFAULT_PRELOAD):
+        self.preload = tuple(preload)
+        self._lock = threading.Lock()
+        self._server = None
+        self._socket_dir = None
+        self.socket_path = None
+
+    def _ensure_server(self):
+        with self._lock:
+            if self._server is not None and self._server.poll() is None:
+                return
+            if self._server is not None:
+                logging.warning("Servidor do executor morno encerrou; reiniciando.")
+                self._cleanup()
+            self._socket_dir = tempfile.mkdtemp(prefix="rl_llm_forkserver_")
+            self.socket_path = os.path.join(self._socket_dir, "server.sock")
+            self._server = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), self.socket_path, *self.preload],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                start_new_session=True,
+            )
+            ready = self._server.stdout.readline().strip()
+            if ready != "ready":
+                self._cleanup()
+                raise RuntimeError("Servidor do executor morno não iniciou.")
+            logging.info(f"Executor morno pronto (pré-carregados: {', '.join(self.preload)})")
+
+    def run(self, workdir, filename, timeout=100, input=None, limits=None, cgroup=None):
+        """Devolve (success, exec_time, output, cpu_time, timed_out); cpu_time é None se o filho não foi coletado."""
+        self._ensure_server()
+        start_time = time.time()
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        replies = conn.makefile("r", encoding="utf-8")
+        try:
+            conn.connect(self.socket_path)
+            request = {'workdir': workdir, 'filename': filename, 'limits': limits or {}, 'cgroup': cgroup}
+            socket.send_fds(conn, [json.dumps(request).encode("utf-8")], [stdin_read, stdout_write, stderr_write])
+            reply = replies.readline()
+            if not reply:
+                raise RuntimeError("Servidor do executor morno não respondeu ao pedido.")
+        except BaseException:
+            replies.close()
+            conn.close()
+            for fd in (stdin_write, stdout_read, stderr_read):
+                os.close(fd)
+            raise
+        finally:
+            for fd in (stdin_read, stdout_write, stderr_write):
+                os.close(fd)
+        try:
+            pid = json.loads(reply)['pid']
+            if input:
+                threading.Thread(target=self._write_input, args=(stdin_write, input), daemon=True).start()
+            else:
+                os.close(stdin_write)
+            stdout, stderr, timed_out = self._read_outputs(stdout_read, stderr_read, start_time + timeout)
+            if timed_out:
+                self._kill(pid)
+            # O filho pode fechar stdout/stderr e continuar rodando: o término também tem prazo
+            conn.settimeout(max(0.0, start_time + timeout - time.time()) + REPLY_GRACE)
+            try:
+                status = json.loads(replies.readline() or 'null')
+            except TimeoutError:
+                timed_out = True
+                self._kill(pid)
+                status = None
+            status = status or {'returncode': None, 'cpu_time': None}
+        finally:
+            replies.close()
+            conn.close()
+
+        execution_time = time.time() - start_time
+        if timed_out:
+            return False, execution_time, f"Tempo limite de {timeout}s excedido.\n{stderr.strip()}", status['cpu_time'], True
+        if status['returncode'] == 0:
+            return True, execution_time, stdout.strip(), status['cpu_time'], False
+        return False, execution_time, stderr.strip(), status['cpu_time'], False
+
+    @staticmethod
+    def _write_input(fd, input):
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(input)
+        except BrokenPipeError:
+            pass
+
+    @staticmethod
+    def _read_outputs(stdout_fd, stderr_fd, deadline):
+        # Lê stdout e stderr até o fim (inclusive de netos que herdaram os pipes) ou até o prazo
+        chunks = {stdout_fd: [], stderr_fd: []}
+        selector = selectors.DefaultSelector()
+        for fd in chunks:
+            selector.register(fd, selectors.EVENT_READ)
+        timed_out = False
+        try:
+            while selector.get_map():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        chunks[key.fd].append(data)
+                    else:
+                        selector.unregister(key.fd)
+        finally:
+            selector.close()
+            os.close(stdout_fd)
+            os.close(stderr_fd)
+        return _decode(chunks[stdout_fd]), _decode(chunks[stderr_fd]), timed_out
+
+    @staticmethod
+    def _kill(pid):
+        # O filho chamou setsid: o grupo inteiro é dele
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _cleanup(self):
+        if self._server is not None:
+            if self._server.poll() is None:
+                self._server.kill()
+            self._server.wait()
+            self._server.stdin.close()
+            self._server.stdout.close()
+            self._server = None
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def close(self):
+        with self._lock:
+            self._cleanup()
+        logging.info("Executor morno encerrado.")
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], sys.argv[2:])